@@ -0,0 +1,339 @@
+"""
+Índice ANN - Búsqueda aproximada de vecinos más cercanos (IVF-Flat)
+Particiona los embeddings con k-means y solo explora las listas más cercanas
+"""
+
+import os
+import threading
+from typing import List, Dict, Tuple, Iterable, Optional
+import numpy as np
+import logging
+
+from app.vector_index import VectorIndex
+
+class IVFFlatIndex:
+    """Índice de archivo invertido (IVF) con vectores float32 sin comprimir"""
+
+    def __init__(self, nlist: int = 0, nprobe: int = 8, niter: int = 20,
+                 train_size_per_list: int = 64, seed: int = 42,
+                 retrain_ratio: float = 2.0, exact_candidates: int = 2048):
+        """
+        Inicializar el índice
+
+        Args:
+            nlist: Número de listas/centroides (0 = 4 * sqrt(n) al construir)
+            nprobe: Listas exploradas por consulta (más = mejor recall, más latencia)
+            niter: Iteraciones de k-means
+            train_size_per_list: Muestras de entrenamiento por centroide
+            seed: Semilla para reproducibilidad
+            retrain_ratio: Reentrenar los centroides cuando el índice crece más
+                de este factor respecto al tamaño con el que se entrenó
+            exact_candidates: Con candidate_ids de este tamaño o menor se
+                puntúan todos los candidatos, no solo los de las listas exploradas
+        """
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.niter = niter
+        self.train_size_per_list = train_size_per_list
+        self.seed = seed
+        self.retrain_ratio = retrain_ratio
+        self.exact_candidates = exact_candidates
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.RLock()
+        self._reset(0)
+
+    def _reset(self, dimension: int):
+        """Vaciar el índice"""
+        self.dimension = dimension
+        self.centroids = np.zeros((0, dimension), dtype=np.float32)
+        # Cada lista reserva capacidad extra; solo las primeras _list_sizes filas son válidas
+        self._list_ids: List[np.ndarray] = []
+        self._list_vectors: List[np.ndarray] = []
+        self._list_sizes: List[int] = []
+        self._assignments: Dict[int, int] = {}
+        self._trained_size = 0
+
+    def __len__(self) -> int:
+        return len(self._assignments)
+
+    def is_empty(self) -> bool:
+        """Verificar si el índice no tiene vectores"""
+        return not self._assignments
+
+    def is_trained(self) -> bool:
+        """Verificar si hay centroides entrenados"""
+        return self.centroids.shape[0] > 0
+
+    def _members(self, list_no: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Ids y vectores válidos de una lista"""
+        size = self._list_sizes[list_no]
+        return self._list_ids[list_no][:size], self._list_vectors[list_no][:size]
+
+    def _append(self, list_no: int, ids: np.ndarray, vectors: np.ndarray):
+        """Agregar filas a una lista duplicando su capacidad si hace falta"""
+        size = self._list_sizes[list_no]
+        required = size + len(ids)
+        capacity = len(self._list_ids[list_no])
+        if required > capacity:
+            new_capacity = max(required, capacity * 2, 16)
+            list_ids = np.zeros(new_capacity, dtype=np.int64)
+            list_vectors = np.zeros((new_capacity, self.dimension), dtype=np.float32)
+            list_ids[:size] = self._list_ids[list_no][:size]
+            list_vectors[:size] = self._list_vectors[list_no][:size]
+            self._list_ids[list_no] = list_ids
+            self._list_vectors[list_no] = list_vectors
+
+        self._list_ids[list_no][size:required] = ids
+        self._list_vectors[list_no][size:required] = vectors
+        self._list_sizes[list_no] = required
+
+    def _all_vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Todos los ids y vectores indexados, lista por lista"""
+        members = [self._members(list_no) for list_no in range(len(self._list_sizes))]
+        if not members:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, self.dimension), dtype=np.float32)
+        return (
+            np.concatenate([ids for ids, _ in members]),
+            np.concatenate([vectors for _, vectors in members])
+        )
+
+    def _assign(self, vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 8192) -> np.ndarray:
+        """Asignar cada vector al centroide más similar (por bloques)"""
+        assignments = np.empty(vectors.shape[0], dtype=np.int64)
+        for start in range(0, vectors.shape[0], chunk_size):
+            block = vectors[start:start + chunk_size]
+            assignments[start:start + chunk_size] = np.argmax(block @ centroids.T, axis=1)
+        return assignments
+
+    def _train(self, vectors: np.ndarray) -> np.ndarray:
+        """Entrenar centroides con k-means esférico"""
+        n = vectors.shape[0]
+        nlist = self.nlist or int(4 * np.sqrt(n))
+        nlist = max(1, min(nlist, n))
+
+        rng = np.random.default_rng(self.seed)
+        max_train = nlist * self.train_size_per_list
+        train = vectors if n <= max_train else vectors[rng.choice(n, max_train, replace=False)]
+        centroids = train[rng.choice(train.shape[0], nlist, replace=False)].copy()
+
+        for _ in range(self.niter):
+            assignments = self._assign(train, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, train)
+            counts = np.bincount(assignments, minlength=nlist)
+
+            # Reiniciar centroides vacíos con puntos aleatorios
+            empty = np.flatnonzero(counts == 0)
+            if len(empty):
+                sums[empty] = train[rng.choice(train.shape[0], len(empty), replace=False)]
+
+            centroids = VectorIndex.normalize(sums)
+
+        return centroids
+
+    def build(self, ids: Iterable[int], embeddings: np.ndarray):
+        """
+        Entrenar centroides y construir las listas invertidas
+
+        Args:
+            ids: Identificadores de los documentos
+            embeddings: Matriz (n, d) de embeddings sin normalizar
+        """
+        ids = np.asarray(list(ids), dtype=np.int64)
+        with self._lock:
+            if len(ids) == 0:
+                self._reset(self.dimension)
+                return
+
+            vectors = VectorIndex.normalize(embeddings)
+            centroids = self._train(vectors)
+            assignments = self._assign(vectors, centroids)
+
+            self._reset(vectors.shape[1])
+            self.centroids = centroids
+            order = np.argsort(assignments, kind="stable")
+            bounds = np.searchsorted(assignments[order], np.arange(centroids.shape[0] + 1))
+            for list_no in range(centroids.shape[0]):
+                members = order[bounds[list_no]:bounds[list_no + 1]]
+                self._list_ids.append(ids[members].copy())
+                self._list_vectors.append(vectors[members].copy())
+                self._list_sizes.append(len(members))
+            self._assignments = {int(doc_id): int(list_no) for doc_id, list_no in zip(ids, assignments)}
+            self._trained_size = len(ids)
+
+        self.logger.info(
+            f"Índice IVF construido: {len(ids)} documentos en {centroids.shape[0]} listas"
+        )
+
+    def add(self, ids: Iterable[int], embeddings: np.ndarray):
+        """
+        Agregar o reemplazar vectores asignándolos a la lista más cercana
+
+        Si el índice no está entrenado se construye con estos vectores; si
+        creció más de retrain_ratio veces desde el último entrenamiento se
+        reentrenan los centroides con todos los vectores.
+        """
+        ids = [int(doc_id) for doc_id in ids]
+        if not ids:
+            return
+
+        with self._lock:
+            if not self.is_trained():
+                self.build(ids, embeddings)
+                return
+
+            vectors = VectorIndex.normalize(embeddings)
+            if vectors.shape[1] != self.dimension:
+                raise ValueError(
+                    f"Dimensión de embedding inválida: {vectors.shape[1]} (esperada {self.dimension})"
+                )
+
+            self.remove(ids)
+            id_array = np.asarray(ids, dtype=np.int64)
+            assignments = self._assign(vectors, self.centroids)
+            for list_no in np.unique(assignments):
+                members = np.flatnonzero(assignments == list_no)
+                self._append(int(list_no), id_array[members], vectors[members])
+            for doc_id, list_no in zip(ids, assignments):
+                self._assignments[doc_id] = int(list_no)
+
+            if len(self) > self.retrain_ratio * max(self._trained_size, 1):
+                self.build(*self._all_vectors())
+
+    def remove(self, ids: Iterable[int]):
+        """Eliminar vectores de sus listas invertidas (una pasada por lista afectada)"""
+        with self._lock:
+            by_list: Dict[int, List[int]] = {}
+            for doc_id in ids:
+                list_no = self._assignments.pop(int(doc_id), None)
+                if list_no is not None:
+                    by_list.setdefault(list_no, []).append(int(doc_id))
+
+            for list_no, removed in by_list.items():
+                list_ids, list_vectors = self._members(list_no)
+                keep = ~np.isin(list_ids, removed)
+                size = int(keep.sum())
+                self._list_ids[list_no][:size] = list_ids[keep]
+                self._list_vectors[list_no][:size] = list_vectors[keep]
+                self._list_sizes[list_no] = size
+
+    def search(self, query_embedding: np.ndarray, top_k: int = 3,
+               nprobe: Optional[int] = None,
+               candidate_ids: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        Buscar vecinos aproximados explorando las `nprobe` listas más cercanas
+
+        Args:
+            query_embedding: Embedding de la consulta (sin normalizar)
+            top_k: Número de resultados
+            nprobe: Listas a explorar (por defecto self.nprobe)
+            candidate_ids: Si se indica, solo se puntúan estos ids; si son
+                exact_candidates o menos se revisan todas sus listas (búsqueda
+                exacta), si no solo las exploradas
+
+        Returns:
+            Lista de tuplas (id, similitud coseno) ordenada de mayor a menor
+        """
+        query = VectorIndex.normalize(query_embedding)[0]
+        with self._lock:
+            if self.is_empty() or top_k <= 0:
+                return []
+
+            nlist = self.centroids.shape[0]
+            nprobe = max(1, min(nprobe or self.nprobe, nlist))
+            if candidate_ids is not None and len(candidate_ids) <= self.exact_candidates:
+                # Pocos candidatos: se revisan sus listas aunque no estén entre las más cercanas
+                probes = sorted({
+                    self._assignments[doc_id] for doc_id in np.asarray(candidate_ids).tolist()
+                    if doc_id in self._assignments
+                })
+            elif nprobe < nlist:
+                probes = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+            else:
+                probes = np.arange(nlist)
+
+            members = [self._members(p) for p in probes]
+            if candidate_ids is not None:
+                candidate_ids = np.asarray(candidate_ids, dtype=np.int64)
+                masks = [np.isin(list_ids, candidate_ids) for list_ids, _ in members]
+                members = [(list_ids[m], list_vectors[m]) for (list_ids, list_vectors), m in zip(members, masks)]
+            if not members:
+                return []
+            ids = np.concatenate([list_ids for list_ids, _ in members])
+            if len(ids) == 0:
+                return []
+            scores = np.concatenate([list_vectors @ query for _, list_vectors in members])
+
+        k = min(top_k, len(ids))
+        if k < len(ids):
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(len(ids))
+        ordered = candidates[np.argsort(-scores[candidates])]
+
+        return [(int(ids[i]), float(scores[i])) for i in ordered]
+
+    def save(self, path: str, fingerprint: str = ""):
+        """
+        Persistir el índice en disco (escritura atómica)
+
+        Args:
+            path: Ruta del archivo .npz
+            fingerprint: Huella de los datos indexados para validar al cargar
+        """
+        with self._lock:
+            sizes = np.array(self._list_sizes, dtype=np.int64)
+            ids, vectors = self._all_vectors()
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    centroids=self.centroids,
+                    sizes=sizes,
+                    ids=ids,
+                    vectors=vectors,
+                    nprobe=np.int64(self.nprobe),
+                    trained_size=np.int64(self._trained_size),
+                    fingerprint=np.array(fingerprint)
+                )
+            os.replace(tmp_path, path)
+
+    def load(self, path: str, fingerprint: Optional[str] = None) -> bool:
+        """
+        Cargar el índice desde disco
+
+        Args:
+            path: Ruta del archivo .npz
+            fingerprint: Si se indica, el archivo solo se usa si coincide
+
+        Returns:
+            True si el índice se cargó
+        """
+        if not os.path.exists(path):
+            return False
+
+        with np.load(path) as data:
+            if fingerprint is not None and str(data["fingerprint"]) != fingerprint:
+                return False
+
+            centroids = data["centroids"]
+            sizes = data["sizes"]
+            ids = data["ids"]
+            vectors = data["vectors"]
+            trained_size = int(data["trained_size"]) if "trained_size" in data.files else len(ids)
+
+        with self._lock:
+            self._reset(centroids.shape[1])
+            self.centroids = centroids
+            offsets = np.concatenate([[0], np.cumsum(sizes)])
+            for list_no in range(len(sizes)):
+                start, end = offsets[list_no], offsets[list_no + 1]
+                self._list_ids.append(ids[start:end].copy())
+                self._list_vectors.append(vectors[start:end].copy())
+                self._list_sizes.append(int(sizes[list_no]))
+                for doc_id in ids[start:end]:
+                    self._assignments[int(doc_id)] = list_no
+            self._trained_size = trained_size
+
+        self.logger.info(f"Índice IVF cargado desde {path} ({len(ids)} documentos)")
+        return True
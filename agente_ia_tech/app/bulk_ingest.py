@@ -0,0 +1,177 @@
+"""
+Ingesta Masiva - Carga de documentos en formato NDJSON
+Procesa el flujo de entrada de forma incremental e inserta y codifica por lotes
+"""
+
+import json
+import time
+from typing import AsyncIterator, Dict, Any, List, Optional
+import logging
+
+from app.inference_pool import InferenceOverloadedError
+
+REQUIRED_FIELDS = ("title", "content", "category")
+
+class BulkIngestor:
+    """Ingesta incremental de NDJSON con inserciones y embeddings por lote"""
+
+    def __init__(self, knowledge_base, embedding_service, batch_size: int = 500,
+                 max_errors: int = 100, max_line_bytes: int = 1 << 20):
+        """
+        Inicializar la ingesta
+
+        Args:
+            knowledge_base: Base de conocimiento destino
+            embedding_service: Servicio de embeddings (se omite si no está disponible)
+            batch_size: Documentos por transacción y por llamada a encode_batch
+            max_errors: Máximo de errores de línea detallados en el reporte
+            max_line_bytes: Tamaño máximo de una línea; las más largas se
+                descartan y se reportan como error
+        """
+        self.knowledge_base = knowledge_base
+        self.embedding_service = embedding_service
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.max_line_bytes = max_line_bytes
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    async def iter_lines(chunks: AsyncIterator[bytes],
+                         max_line_bytes: int = 1 << 20) -> AsyncIterator[Optional[bytes]]:
+        """
+        Dividir un flujo de bytes en líneas sin cargarlo completo en memoria
+
+        Los fragmentos se acumulan en un bytearray y el salto de línea se
+        busca solo en los bytes nuevos. Una línea de más de max_line_bytes se
+        descarta hasta el siguiente salto y en su lugar se produce None.
+        """
+        buffer = bytearray()
+        scanned = 0
+        skipping = False
+        async for chunk in chunks:
+            buffer += chunk
+            start = 0
+            while (newline := buffer.find(b"\n", max(start, scanned))) >= 0:
+                if skipping:
+                    skipping = False
+                elif newline - start > max_line_bytes:
+                    yield None
+                else:
+                    yield bytes(buffer[start:newline])
+                start = newline + 1
+            del buffer[:start]
+            scanned = len(buffer)
+
+            if scanned > max_line_bytes:
+                if not skipping:
+                    yield None
+                    skipping = True
+                buffer.clear()
+                scanned = 0
+        if buffer and not skipping:
+            yield bytes(buffer) if len(buffer) <= max_line_bytes else None
+
+    def _parse_line(self, line: bytes) -> Dict[str, str]:
+        """Validar una línea NDJSON y devolver el documento"""
+        record = json.loads(line)
+        if not isinstance(record, dict):
+            raise ValueError("cada línea debe ser un objeto JSON")
+
+        item = {}
+        for field in REQUIRED_FIELDS:
+            value = record.get(field)
+            if not isinstance(value, str) or not value.strip():
+                raise ValueError(f"campo '{field}' requerido")
+            item[field] = value
+        return item
+
+    async def ingest(self, chunks: AsyncIterator[bytes], embed: bool = True) -> Dict[str, Any]:
+        """
+        Ingerir documentos NDJSON ({"title", "content", "category"} por línea)
+
+        Args:
+            chunks: Flujo de bytes de entrada
+            embed: Codificar los pasajes de cada lote al insertarlo
+
+        Returns:
+            Reporte con totales, métricas por lote y errores de línea
+        """
+        embed = embed and self.embedding_service.is_available()
+        report: Dict[str, Any] = {"inserted": 0, "merged": 0, "linked": 0, "rejected": 0,
+                                  "passages": 0, "embedded": 0, "deferred": 0,
+                                  "failed": 0, "batches": [], "errors": []}
+        batch: List[Dict[str, str]] = []
+        started = time.perf_counter()
+        line_number = 0
+
+        async for line in self.iter_lines(chunks, self.max_line_bytes):
+            line_number += 1
+            if line is not None and not line.strip():
+                continue
+
+            try:
+                if line is None:
+                    raise ValueError(f"línea de más de {self.max_line_bytes} bytes")
+                batch.append(self._parse_line(line))
+            except ValueError as e:  # incluye json.JSONDecodeError
+                report["failed"] += 1
+                if len(report["errors"]) < self.max_errors:
+                    report["errors"].append({"line": line_number, "error": str(e)})
+                continue
+
+            if len(batch) >= self.batch_size:
+                await self._flush(batch, embed, report)
+                batch = []
+
+        if batch:
+            await self._flush(batch, embed, report)
+
+        report["seconds"] = round(time.perf_counter() - started, 4)
+        report["items_per_second"] = round(report["inserted"] / report["seconds"], 2) if report["seconds"] else None
+        self.logger.info(
+            f"Ingesta masiva: {report['inserted']} documentos en {len(report['batches'])} lotes"
+        )
+        return report
+
+    async def _flush(self, batch: List[Dict[str, str]], embed: bool, report: Dict[str, Any]):
+        """Insertar un lote en una transacción y codificar sus pasajes"""
+        kb = self.knowledge_base
+
+        start = time.perf_counter()
+        outcome = await kb.add_items_bulk(batch)
+        insert_seconds = time.perf_counter() - start
+
+        # Filas nuevas y originales reemplazados con DEDUP_POLICY=merge (sin repetir)
+        item_ids = list(dict.fromkeys(item_id for item_id in outcome["ids"] if item_id is not None))
+        for key in ("merged", "linked", "rejected"):
+            report[key] += outcome[key]
+
+        passages = await kb.get_passages_for_items(item_ids)
+        embed_seconds = 0.0
+        if embed and passages:
+            start = time.perf_counter()
+            try:
+                embeddings = await self.embedding_service.encode_batch_async([p["text"] for p in passages])
+            except InferenceOverloadedError as e:
+                # Los documentos ya están guardados; el backfill codificará sus pasajes
+                embeddings = None
+                report["deferred"] += len(passages)
+                self.logger.warning(f"Codificación del lote pospuesta al backfill: {e}")
+            if embeddings is not None:
+                await kb.update_passage_embeddings(
+                    [p["id"] for p in passages], embeddings, self.embedding_service.model_name
+                )
+                report["embedded"] += len(passages)
+            embed_seconds = time.perf_counter() - start
+
+        total_seconds = insert_seconds + embed_seconds
+        report["inserted"] += outcome["inserted"]
+        report["passages"] += len(passages)
+        report["batches"].append({
+            "batch": len(report["batches"]) + 1,
+            "items": len(item_ids),
+            "passages": len(passages),
+            "insert_seconds": round(insert_seconds, 4),
+            "embed_seconds": round(embed_seconds, 4),
+            "items_per_second": round(len(item_ids) / total_seconds, 2) if total_seconds else None
+        })
@@ -0,0 +1,94 @@
+"""
+Enrutador por Categoría - Selección de particiones de la base de conocimiento
+Usa las probabilidades del clasificador para buscar solo en las categorías
+probables y amplía la búsqueda cuando la clasificación es dudosa
+"""
+
+import unicodedata
+from typing import Dict, Any, List, Tuple
+import logging
+
+def normalize_category(name: str) -> str:
+    """
+    Clave de categoría comparable con las etiquetas del clasificador
+
+    "Recursos Humanos" -> "recursos_humanos", "Tecnología" -> "tecnologia"
+    """
+    decomposed = unicodedata.normalize("NFKD", name.strip().lower())
+    without_accents = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return "_".join(without_accents.split())
+
+class CategoryRouter:
+    """Decide en qué particiones (categorías) buscar para cada pregunta"""
+
+    def __init__(self, classifier, min_confidence: float = 0.5, coverage: float = 0.8,
+                 max_categories: int = 3, enabled: bool = True):
+        """
+        Inicializar el enrutador
+
+        Args:
+            classifier: MLClassifier con get_class_probabilities
+            min_confidence: Por debajo de esta probabilidad se amplía la búsqueda
+            coverage: Probabilidad acumulada a cubrir al ampliar
+            max_categories: Máximo de particiones consultadas
+            enabled: False para buscar siempre en toda la base
+        """
+        self.classifier = classifier
+        self.min_confidence = min_confidence
+        self.coverage = coverage
+        self.max_categories = max_categories
+        self.enabled = enabled
+        self.logger = logging.getLogger(__name__)
+
+    def route(self, question: str) -> Dict[str, Any]:
+        """
+        Elegir las categorías a consultar
+
+        Args:
+            question: Pregunta del usuario
+
+        Returns:
+            Diccionario con 'categories' (None = toda la base), 'confidence'
+            de la categoría principal y 'widened' (se consultó más de una)
+        """
+        if not self.enabled:
+            return {"categories": None, "confidence": None, "widened": False}
+        return self.route_probabilities(self.classifier.get_class_probabilities(question))
+
+    def route_probabilities(self, ranked: List[Tuple[str, float]]) -> Dict[str, Any]:
+        """
+        Elegir las categorías a partir de probabilidades ya calculadas
+
+        Permite clasificar una sola vez y usar el mismo resultado para la
+        categoría de la respuesta y para el enrutado.
+
+        Args:
+            ranked: Salida de get_class_probabilities (de mayor a menor)
+
+        Returns:
+            El mismo diccionario que route
+        """
+        if not self.enabled or not ranked:
+            return {"categories": None, "confidence": None, "widened": False}
+
+        top_label, top_probability = ranked[0]
+        categories: List[str] = [top_label]
+        cumulative = top_probability
+
+        # Clasificación dudosa: agregar las categorías vecinas más probables
+        if top_probability < self.min_confidence:
+            for label, probability in ranked[1:]:
+                if cumulative >= self.coverage or len(categories) >= self.max_categories:
+                    break
+                categories.append(label)
+                cumulative += probability
+
+            # Distribución casi uniforme: ninguna partición es fiable
+            if cumulative < self.coverage:
+                return {"categories": None, "confidence": top_probability, "widened": True}
+
+        return {
+            "categories": categories,
+            "confidence": top_probability,
+            "widened": len(categories) > 1
+        }
@@ -0,0 +1,93 @@
+"""
+Fragmentación de Documentos - División en pasajes para la recuperación
+Divide el contenido por encabezados y viñetas en pasajes con solapamiento
+"""
+
+import re
+from typing import List, Dict, Optional
+
+# Líneas que abren una sección: "# Título" o "**Semana 1:**" sin texto adicional
+HEADING_PATTERN = re.compile(r"^\s*(?:#{1,6}\s+(?P<md>.+?)|\*\*(?P<bold>[^*]+?)\*\*:?)\s*$")
+
+class PassageChunker:
+    """Divide documentos en pasajes por secciones con solapamiento entre pasajes"""
+
+    def __init__(self, max_chars: int = 500, overlap_units: int = 1):
+        """
+        Inicializar el fragmentador
+
+        Args:
+            max_chars: Tamaño máximo aproximado de cada pasaje
+            overlap_units: Líneas (viñetas/párrafos) repetidas entre pasajes
+                consecutivos de una misma sección
+        """
+        self.max_chars = max_chars
+        self.overlap_units = overlap_units
+
+    @staticmethod
+    def _parse_heading(line: str) -> Optional[str]:
+        """Obtener el texto del encabezado o None si la línea no lo es"""
+        match = HEADING_PATTERN.match(line)
+        if not match:
+            return None
+        return (match.group("md") or match.group("bold")).strip().rstrip(":")
+
+    def _sections(self, content: str) -> List[Dict]:
+        """Agrupar las líneas no vacías bajo su encabezado"""
+        sections = [{"heading": None, "units": []}]
+        for line in content.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+
+            heading = self._parse_heading(line)
+            if heading is not None:
+                sections.append({"heading": heading, "units": []})
+            else:
+                sections[-1]["units"].append(line)
+
+        return [section for section in sections if section["units"] or section["heading"]]
+
+    def _format(self, heading: Optional[str], units: List[str]) -> str:
+        """Texto del pasaje con su encabezado como prefijo"""
+        body = "\n".join(units)
+        return f"{heading}:\n{body}" if heading else body
+
+    def split(self, content: str) -> List[Dict]:
+        """
+        Dividir un documento en pasajes
+
+        Args:
+            content: Contenido del documento
+
+        Returns:
+            Lista de pasajes con 'ordinal', 'heading' y 'content'
+        """
+        passages = []
+        for section in self._sections(content):
+            heading, units = section["heading"], section["units"]
+            if not units:
+                # Encabezado sin cuerpo: se conserva como pasaje propio
+                units = [heading]
+                heading = None
+
+            current: List[str] = []
+            for unit in units:
+                candidate = current + [unit]
+                if current and len(self._format(heading, candidate)) > self.max_chars:
+                    passages.append((heading, self._format(heading, current)))
+                    overlap = current[-self.overlap_units:] if self.overlap_units else []
+                    current = overlap + [unit]
+                    # Si el solapamiento no cabe, el pasaje empieza en la unidad nueva
+                    if len(self._format(heading, current)) > self.max_chars:
+                        current = [unit]
+                else:
+                    current = candidate
+
+            if current:
+                passages.append((heading, self._format(heading, current)))
+
+        return [
+            {"ordinal": ordinal, "heading": heading, "content": text}
+            for ordinal, (heading, text) in enumerate(passages)
+        ]
@@ -0,0 +1,135 @@
+"""
+Ensamblado de Contexto - Selección de fragmentos dentro de un presupuesto de tokens
+Ordena los documentos recuperados por score y los agrega al contexto del prompt
+hasta agotar el presupuesto, recortando en límites de oración
+"""
+
+import math
+import re
+from typing import List, Dict, Any
+import logging
+
+# Fin de oración (seguido de espacio) o de línea: puntos donde se puede recortar
+SENTENCE_END = re.compile(r"[.!?…](?=\s)|\n")
+
+# Scores por los que se ordenan los fragmentos, en orden de preferencia
+SCORE_KEYS = ("rerank_score", "fusion_score", "similarity_score")
+
+class ContextPacker:
+    """Arma el contexto del prompt respetando la ventana del modelo"""
+
+    def __init__(self, context_window: int = 4096, max_context_tokens: int = 1500,
+                 reserve_tokens: int = 64, chars_per_token: float = 4.0,
+                 min_snippet_tokens: int = 24, separator: str = "\n"):
+        """
+        Inicializar el ensamblador
+
+        Args:
+            context_window: Tokens de la ventana de contexto del modelo
+            max_context_tokens: Tope de tokens de contexto aunque la ventana
+                permita más (prompts más cortos = menos latencia)
+            reserve_tokens: Margen para mensajes de sistema y error de estimación
+            chars_per_token: Caracteres por token de la estimación
+            min_snippet_tokens: No se agregan recortes más cortos que esto
+            separator: Separador entre fragmentos
+        """
+        self.context_window = context_window
+        self.max_context_tokens = max_context_tokens
+        self.reserve_tokens = reserve_tokens
+        self.chars_per_token = chars_per_token
+        self.min_snippet_tokens = min_snippet_tokens
+        self.separator = separator
+        self.logger = logging.getLogger(__name__)
+
+    def estimate_tokens(self, text: str) -> int:
+        """Estimar los tokens de un texto (aproximación por caracteres)"""
+        return math.ceil(len(text) / self.chars_per_token) if text else 0
+
+    def budget_for(self, template_info: Dict[str, Any], question: str) -> int:
+        """
+        Tokens disponibles para el contexto con un template dado
+
+        Args:
+            template_info: Template con 'template' y 'max_tokens'
+            question: Pregunta del usuario
+
+        Returns:
+            Ventana del modelo menos la respuesta (max_tokens), el resto del
+            prompt y el margen, con tope max_context_tokens
+        """
+        overhead = self.estimate_tokens(template_info["template"].format(question=question, context=""))
+        available = (self.context_window - template_info.get("max_tokens", 400)
+                     - overhead - self.reserve_tokens)
+        return max(0, min(self.max_context_tokens, available))
+
+    def _trim(self, text: str, max_tokens: int) -> str:
+        """Prefijo más largo del texto que termina en una oración y cabe en max_tokens"""
+        cut = 0
+        for match in SENTENCE_END.finditer(text):
+            if self.estimate_tokens(text[:match.end()]) > max_tokens:
+                break
+            cut = match.end()
+        return text[:cut].rstrip()
+
+    @staticmethod
+    def _score(doc: Dict[str, Any]) -> float:
+        """Score con el que se ordena un documento"""
+        for key in SCORE_KEYS:
+            if doc.get(key) is not None:
+                return doc[key]
+        return 0.0
+
+    def pack(self, docs: List[Dict[str, Any]], budget: int) -> Dict[str, Any]:
+        """
+        Llenar el presupuesto con los fragmentos de mayor score
+
+        Los fragmentos que no caben completos se recortan en el último fin de
+        oración que entra; si ni eso cabe se descartan y se prueba el siguiente.
+
+        Args:
+            docs: Documentos recuperados (con 'content' y algún score)
+            budget: Tokens disponibles para el contexto
+
+        Returns:
+            Diccionario con 'context', 'documents' (los documentos que entraron
+            en el contexto, en orden) y el reporte: 'budget_tokens',
+            'used_tokens', 'included' (título, tokens, recortado) y 'dropped'
+        """
+        separator_tokens = self.estimate_tokens(self.separator)
+        snippets: List[str] = []
+        documents: List[Dict[str, Any]] = []
+        included: List[Dict[str, Any]] = []
+        dropped: List[str] = []
+        used = 0
+
+        for doc in sorted(docs, key=self._score, reverse=True):
+            content = doc.get("content", "").strip()
+            title = doc.get("title", "")
+            remaining = budget - used - (separator_tokens if snippets else 0)
+            tokens = self.estimate_tokens(content)
+            trimmed = False
+
+            if tokens > remaining:
+                content = self._trim(content, remaining) if remaining >= self.min_snippet_tokens else ""
+                tokens = self.estimate_tokens(content)
+                trimmed = True
+            if not content:
+                dropped.append(title)
+                continue
+
+            used += tokens + (separator_tokens if snippets else 0)
+            snippets.append(content)
+            documents.append(doc)
+            included.append({"title": title, "tokens": tokens, "trimmed": trimmed})
+
+        if dropped:
+            self.logger.info(f"Contexto: {len(dropped)} fragmentos descartados por presupuesto ({budget} tokens)")
+
+        return {
+            "context": self.separator.join(snippets),
+            "documents": documents,
+            "budget_tokens": budget,
+            "used_tokens": used,
+            "included": included,
+            "dropped": dropped
+        }
@@ -0,0 +1,195 @@
+"""
+Capa de Acceso a Datos - SQLite asíncrono sin bloquear el event loop
+Pool acotado de conexiones de lectura y un único escritor serializado sobre WAL
+"""
+
+import asyncio
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, List, Optional
+import logging
+
+# Formato único de las marcas de tiempo guardadas: UTC con milisegundos, el
+# mismo que strftime('%Y-%m-%d %H:%M:%f', 'now') en SQLite, para que ordenen
+# correctamente como texto
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def utc_timestamp(moment: Optional[datetime] = None) -> str:
+    """
+    Marca de tiempo en el formato de la base (UTC, milisegundos)
+
+    Args:
+        moment: Instante a convertir (por defecto ahora); sin zona horaria se
+            interpreta como UTC
+
+    Returns:
+        Texto 'YYYY-MM-DD HH:MM:SS.fff'
+    """
+    if moment is None:
+        moment = datetime.now(timezone.utc)
+    elif moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    moment = moment.astimezone(timezone.utc)
+    return f"{moment.strftime(TIMESTAMP_FORMAT)}.{moment.microsecond // 1000:03d}"
+
+class Database:
+    """
+    Acceso asíncrono a SQLite
+
+    Cada hilo del pool de lectura tiene su propia conexión (solo lectura); todas
+    las escrituras pasan por un executor de un solo hilo con una conexión
+    dedicada, de modo que nunca compiten entre sí. Con WAL los lectores no
+    bloquean al escritor ni el escritor a los lectores.
+    """
+
+    def __init__(self, path: str, readers: int = 4, busy_timeout_ms: int = 5000,
+                 cache_size_kb: int = 16384, mmap_size: int = 268435456,
+                 cached_statements: int = 256):
+        """
+        Inicializar la capa de datos
+
+        Args:
+            path: Ruta del archivo SQLite
+            readers: Conexiones (e hilos) de lectura concurrentes
+            busy_timeout_ms: Espera máxima ante un bloqueo antes de fallar
+            cache_size_kb: Caché de páginas por conexión (KiB)
+            mmap_size: Bytes del archivo mapeados en memoria por conexión
+            cached_statements: Sentencias preparadas reutilizadas por conexión
+        """
+        self.path = path
+        self.readers = readers
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+        self.logger = logging.getLogger(__name__)
+        self._reader_executor: Optional[ThreadPoolExecutor] = None
+        self._writer_executor: Optional[ThreadPoolExecutor] = None
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._writer: Optional[sqlite3.Connection] = None
+
+    def is_open(self) -> bool:
+        """Verificar si la capa de datos está abierta"""
+        return self._writer is not None
+
+    def _connect(self, read_only: bool) -> sqlite3.Connection:
+        """Abrir una conexión con los pragmas de rendimiento aplicados"""
+        # Cada conexión se usa solo desde su hilo; check_same_thread=False
+        # permite cerrarlas todas desde close()
+        connection = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout_ms / 1000,
+            cached_statements=self.cached_statements,
+            check_same_thread=False
+        )
+        connection.row_factory = sqlite3.Row
+        connection.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        connection.execute("PRAGMA foreign_keys = ON")
+        connection.execute("PRAGMA temp_store = MEMORY")
+        connection.execute(f"PRAGMA cache_size = {-int(self.cache_size_kb)}")
+        connection.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        if read_only:
+            connection.execute("PRAGMA query_only = ON")
+
+        with self._connections_lock:
+            self._connections.append(connection)
+        return connection
+
+    def _open_writer(self):
+        """Crear la conexión de escritura (en el hilo del escritor) y activar WAL"""
+        self._writer = self._connect(read_only=False)
+        mode = self._writer.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+        if mode.lower() != "wal":
+            self.logger.warning(f"WAL no disponible, journal_mode={mode}")
+
+    def _reader(self) -> sqlite3.Connection:
+        """Conexión de lectura del hilo actual (se crea al primer uso)"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._connect(read_only=True)
+            self._local.connection = connection
+        return connection
+
+    async def open(self):
+        """Crear los executors y la conexión de escritura"""
+        if self.is_open():
+            return
+
+        self._writer_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-writer")
+        self._reader_executor = ThreadPoolExecutor(max_workers=self.readers, thread_name_prefix="sqlite-reader")
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._writer_executor, self._open_writer)
+        self.logger.info(f"Base de datos abierta en modo WAL ({self.readers} lectores)")
+
+    def _run_read(self, fn: Callable[..., Any], args: tuple) -> Any:
+        """Ejecutar fn con la conexión de lectura del hilo actual"""
+        return fn(self._reader(), *args)
+
+    def _run_write(self, fn: Callable[..., Any], args: tuple) -> Any:
+        """Ejecutar fn en una transacción: confirma al terminar, revierte si falla"""
+        try:
+            result = fn(self._writer, *args)
+            self._writer.commit()
+            return result
+        except Exception:
+            self._writer.rollback()
+            raise
+
+    async def read(self, fn: Callable[..., Any], *args) -> Any:
+        """
+        Ejecutar fn(conexión, *args) en el pool de lectura
+
+        Args:
+            fn: Función síncrona que solo consulta la base de datos
+            *args: Argumentos adicionales para fn
+
+        Returns:
+            Resultado de fn
+        """
+        if not self.is_open():
+            raise RuntimeError("Base de datos no inicializada")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._reader_executor, self._run_read, fn, args)
+
+    async def write(self, fn: Callable[..., Any], *args) -> Any:
+        """
+        Ejecutar fn(conexión, *args) en el escritor serializado, en una transacción
+
+        Args:
+            fn: Función síncrona que modifica la base de datos
+            *args: Argumentos adicionales para fn
+
+        Returns:
+            Resultado de fn
+        """
+        if not self.is_open():
+            raise RuntimeError("Base de datos no inicializada")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer_executor, self._run_write, fn, args)
+
+    async def close(self):
+        """Esperar las operaciones en curso y cerrar todas las conexiones"""
+        if not self.is_open():
+            return
+
+        loop = asyncio.get_running_loop()
+        # Punto de control para que el archivo -wal no crezca entre reinicios
+        await loop.run_in_executor(
+            self._writer_executor, self._writer.execute, "PRAGMA wal_checkpoint(TRUNCATE)"
+        )
+        self._reader_executor.shutdown(wait=True)
+        self._writer_executor.shutdown(wait=True)
+
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+        self._local = threading.local()
+        self._writer = None
+        self._reader_executor = None
+        self._writer_executor = None
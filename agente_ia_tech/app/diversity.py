@@ -0,0 +1,61 @@
+"""
+Diversidad de Resultados - Maximal Marginal Relevance (MMR)
+Elige documentos relevantes que no repitan el contenido de los ya elegidos
+"""
+
+from typing import List, Tuple, Dict, Sequence
+import numpy as np
+
+from app.vector_index import VectorIndex
+
+def maximal_marginal_relevance(hits: Sequence[Tuple[int, float]], embeddings: Dict[int, np.ndarray],
+                               top_k: int, lambda_: float = 0.7,
+                               normalize_scores: bool = False) -> List[Tuple[int, float]]:
+    """
+    Seleccionar top_k resultados con Maximal Marginal Relevance
+
+    En cada paso se elige el candidato que maximiza
+    lambda * relevancia - (1 - lambda) * max(similitud con los ya elegidos).
+    La redundancia se mide con los embeddings ya calculados de los candidatos;
+    los que no tienen embedding no penalizan ni son penalizados.
+
+    Args:
+        hits: Candidatos (id, score) ordenados de mejor a peor
+        embeddings: Embedding de cada candidato por id
+        top_k: Número de resultados
+        lambda_: 1.0 = solo relevancia, 0.0 = solo diversidad
+        normalize_scores: Llevar los scores a [0, 1] (min-max) si no son
+            similitudes coseno, p. ej. scores de fusión
+
+    Returns:
+        Los candidatos elegidos (id, score original) en orden de selección
+    """
+    if len(hits) <= 1 or top_k <= 0:
+        return list(hits[:top_k])
+
+    relevance = np.array([score for _, score in hits], dtype=np.float32)
+    if normalize_scores:
+        low, high = relevance.min(), relevance.max()
+        relevance = (relevance - low) / (high - low) if high > low else np.ones_like(relevance)
+
+    dimension = next((len(e) for e in embeddings.values()), 0)
+    matrix = np.zeros((len(hits), dimension), dtype=np.float32)
+    for i, (doc_id, _) in enumerate(hits):
+        if doc_id in embeddings:
+            matrix[i] = embeddings[doc_id]
+    matrix = VectorIndex.normalize(matrix)
+    similarity = matrix @ matrix.T
+
+    selected = [0]
+    redundancy = similarity[0].copy()
+    remaining = np.ones(len(hits), dtype=bool)
+    remaining[0] = False
+    while len(selected) < min(top_k, len(hits)):
+        marginal = lambda_ * relevance - (1.0 - lambda_) * redundancy
+        marginal[~remaining] = -np.inf
+        best = int(np.argmax(marginal))
+        selected.append(best)
+        remaining[best] = False
+        np.maximum(redundancy, similarity[best], out=redundancy)
+
+    return [hits[i] for i in selected]
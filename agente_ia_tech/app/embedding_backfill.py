@@ -0,0 +1,148 @@
+"""
+Backfill de Embeddings - Codificación en segundo plano
+Calcula en lotes los embeddings de pasajes faltantes u obsoletos para que
+nunca se codifiquen documentos durante una consulta
+"""
+
+import asyncio
+import time
+from typing import Dict, Any, Optional
+import logging
+
+from app.inference_pool import InferenceOverloadedError
+
+class EmbeddingBackfillWorker:
+    """Tarea asíncrona que completa los embeddings de la base de conocimiento"""
+
+    def __init__(self, knowledge_base, embedding_service, batch_size: int = 256,
+                 poll_interval: float = 30.0, rebuild_ratio: float = 0.5):
+        """
+        Inicializar el worker
+
+        Args:
+            knowledge_base: Base de conocimiento a completar
+            embedding_service: Servicio usado para encode_batch
+            batch_size: Pasajes codificados por lote (una transacción por lote)
+            poll_interval: Segundos entre revisiones si nadie avisa de cambios
+            rebuild_ratio: Si una pasada agrega más de esta fracción del índice,
+                se reconstruye el índice completo al terminar
+        """
+        self.knowledge_base = knowledge_base
+        self.embedding_service = embedding_service
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.rebuild_ratio = rebuild_ratio
+        self.logger = logging.getLogger(__name__)
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._progress: Dict[str, Any] = {
+            "running": False,
+            "owner": None,
+            "pending": 0,
+            "processed": 0,
+            "batches": 0,
+            "last_batch_seconds": None,
+            "last_run_at": None,
+            "last_error": None
+        }
+
+    def is_running(self) -> bool:
+        """Verificar si la tarea de fondo está activa"""
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        """Lanzar la tarea de fondo"""
+        if self.is_running() or not self.embedding_service.is_available():
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Detener la tarea de fondo (el lote en curso se descarta sin guardar)"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def notify(self):
+        """Avisar de que hay pasajes nuevos para codificar"""
+        self._wakeup.set()
+
+    def get_progress(self) -> Dict[str, Any]:
+        """Obtener el estado del backfill"""
+        return dict(self._progress)
+
+    async def _run(self):
+        """Bucle principal: procesar pendientes y esperar aviso o intervalo"""
+        while True:
+            self._wakeup.clear()
+            try:
+                await self.run_once()
+            except InferenceOverloadedError as e:
+                # Se cede el pool a las peticiones; se reintenta en la siguiente ronda
+                self._progress["last_error"] = str(e)
+                self.logger.warning(f"Backfill de embeddings pospuesto: {e}")
+            except Exception as e:
+                self._progress["last_error"] = str(e)
+                self.logger.error(f"Error en backfill de embeddings: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_once(self) -> int:
+        """
+        Procesar todos los pasajes pendientes en lotes
+
+        Returns:
+            Número de pasajes codificados
+        """
+        kb = self.knowledge_base
+        model_name = self.embedding_service.model_name
+        
+        # Con el almacén compartido solo un worker codifica y republica
+        self._progress["owner"] = kb.owns_embedding_backfill()
+        if not self._progress["owner"]:
+            return 0
+        
+        await kb.chunk_missing_items()
+        pending = await kb.count_passages_needing_embeddings(model_name)
+        self._progress.update(pending=pending, last_run_at=time.time())
+        if pending == 0:
+            # Embeddings guardados por otras vías (p. ej. ingesta masiva en otro worker)
+            await kb.publish_embeddings()
+            return 0
+
+        self._progress["running"] = True
+        index_size = len(kb.vector_index)
+        processed = 0
+        try:
+            while True:
+                batch = await kb.get_passages_needing_embeddings(model_name, self.batch_size)
+                if not batch:
+                    break
+
+                start = time.perf_counter()
+                # Comparte el pool acotado con las peticiones en línea
+                embeddings = await self.embedding_service.encode_batch_async([p["text"] for p in batch])
+                await kb.update_passage_embeddings([p["id"] for p in batch], embeddings, model_name)
+
+                processed += len(batch)
+                self._progress["processed"] += len(batch)
+                self._progress["batches"] += 1
+                self._progress["pending"] = max(0, self._progress["pending"] - len(batch))
+                self._progress["last_batch_seconds"] = round(time.perf_counter() - start, 4)
+                self._progress["last_error"] = None
+        finally:
+            self._progress["running"] = False
+
+        if processed > self.rebuild_ratio * max(index_size, 1):
+            await kb.rebuild_vector_index()
+        await kb.publish_embeddings()
+
+        self.logger.info(f"Backfill de embeddings: {processed} pasajes codificados")
+        return processed
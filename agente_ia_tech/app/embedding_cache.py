@@ -0,0 +1,177 @@
+"""
+Caché de Embeddings - LRU en memoria con segundo nivel persistente en SQLite
+Evita volver a ejecutar el modelo para textos ya codificados (preguntas
+repetidas) durante la vida del proceso y entre reinicios
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+import numpy as np
+import logging
+
+from app.embedding_codec import encode_embedding, decode_embedding
+
+class EmbeddingCache:
+    """Caché de dos niveles: LRU acotado en memoria y tabla SQLite en disco"""
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float = 0,
+                 disk_path: Optional[str] = None, disk_max_entries: int = 100000):
+        """
+        Inicializar la caché
+
+        Args:
+            max_entries: Embeddings en memoria (LRU)
+            ttl_seconds: Vigencia de cada entrada; 0 = sin vencimiento
+            disk_path: Archivo SQLite del segundo nivel; None = solo memoria
+            disk_max_entries: Entradas máximas en disco (se eliminan las más antiguas)
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_path = disk_path
+        self.disk_max_entries = disk_max_entries
+        self.logger = logging.getLogger(__name__)
+        self._memory: "OrderedDict[str, Tuple[np.ndarray, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk: Optional[sqlite3.Connection] = None
+        self._disk_writes = 0
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "expired": 0}
+
+        if disk_path:
+            try:
+                self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+                self._disk.execute("PRAGMA journal_mode = WAL")
+                self._disk.execute("PRAGMA synchronous = NORMAL")
+                self._disk.execute("""
+                    CREATE TABLE IF NOT EXISTS embedding_cache (
+                        key TEXT PRIMARY KEY,
+                        embedding BLOB NOT NULL,
+                        created_at REAL NOT NULL
+                    )
+                """)
+                self._disk.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_embedding_cache_created ON embedding_cache(created_at)"
+                )
+                self._disk.commit()
+            except sqlite3.Error as e:
+                self.logger.error(f"Caché de embeddings en disco no disponible: {e}")
+                self._disk = None
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> str:
+        """Hash de (modelo, texto normalizado en Unicode NFC y espacios)"""
+        normalized = " ".join(unicodedata.normalize("NFC", text).split())
+        return hashlib.sha1(f"{model_name}\0{normalized}".encode("utf-8")).hexdigest()
+
+    def _expired(self, created_at: float) -> bool:
+        """Verificar si una entrada superó el TTL"""
+        return self.ttl_seconds > 0 and time.time() - created_at > self.ttl_seconds
+
+    def _remember(self, key: str, embedding: np.ndarray, created_at: float):
+        """Guardar en el nivel de memoria desalojando la entrada menos usada"""
+        self._memory[key] = (embedding, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, model_name: str, text: str) -> Optional[np.ndarray]:
+        """
+        Buscar el embedding de un texto
+
+        Args:
+            model_name: Modelo con el que se codificó
+            text: Texto original
+
+        Returns:
+            Embedding (solo lectura) o None si no está o venció
+        """
+        key = self.make_key(model_name, text)
+        with self._lock:
+            entry = self._memory.get(key)
+            expired = False
+            if entry is not None:
+                if not self._expired(entry[1]):
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return entry[0]
+                del self._memory[key]
+                expired = True
+
+            if self._disk is not None:
+                row = self._disk.execute(
+                    "SELECT embedding, created_at FROM embedding_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and not self._expired(row[1]):
+                    embedding = decode_embedding(row[0])
+                    embedding.setflags(write=False)
+                    self._remember(key, embedding, row[1])
+                    self._stats["disk_hits"] += 1
+                    return embedding
+                expired = expired or row is not None
+
+            self._stats["expired"] += int(expired)
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, model_name: str, text: str, embedding: np.ndarray) -> np.ndarray:
+        """
+        Guardar un embedding en ambos niveles
+
+        Returns:
+            El embedding guardado (copia de solo lectura)
+        """
+        key = self.make_key(model_name, text)
+        stored = np.array(embedding, dtype=np.float32)
+        stored.setflags(write=False)
+        created_at = time.time()
+
+        with self._lock:
+            self._remember(key, stored, created_at)
+            if self._disk is not None:
+                try:
+                    self._disk.execute(
+                        "INSERT OR REPLACE INTO embedding_cache (key, embedding, created_at) VALUES (?, ?, ?)",
+                        (key, encode_embedding(stored), created_at)
+                    )
+                    self._disk_writes += 1
+                    # Recortar el nivel de disco cada cierto número de escrituras
+                    if self._disk_writes % 1000 == 0:
+                        self._trim_disk()
+                    self._disk.commit()
+                except sqlite3.Error as e:
+                    self.logger.error(f"Error escribiendo caché de embeddings: {e}")
+        return stored
+
+    def _trim_disk(self):
+        """Eliminar las entradas vencidas y las más antiguas por encima del máximo"""
+        if self.ttl_seconds > 0:
+            self._disk.execute(
+                "DELETE FROM embedding_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+        self._disk.execute("""
+            DELETE FROM embedding_cache WHERE key IN (
+                SELECT key FROM embedding_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.disk_max_entries,))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obtener aciertos por nivel, fallos y ocupación"""
+        lookups = self._stats["memory_hits"] + self._stats["disk_hits"] + self._stats["misses"]
+        hits = lookups - self._stats["misses"]
+        return dict(
+            self._stats,
+            hit_rate=round(hits / lookups, 4) if lookups else None,
+            memory_entries=len(self._memory),
+            disk_enabled=self._disk is not None
+        )
+
+    def close(self):
+        """Cerrar el archivo del nivel de disco"""
+        with self._lock:
+            if self._disk is not None:
+                self._disk.close()
+                self._disk = None
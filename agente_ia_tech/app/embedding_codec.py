@@ -0,0 +1,68 @@
+"""
+Codec de Embeddings - Serialización binaria para SQLite
+Almacena embeddings como BLOB con cabecera de tipo y dimensión
+"""
+
+import json
+import struct
+from typing import List, Union
+import numpy as np
+
+# Cabecera: magia (2 bytes), versión, código de dtype, dimensión (uint32)
+HEADER_FORMAT = "<2sBBI"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+MAGIC = b"EV"
+VERSION = 1
+
+DTYPE_CODES = {
+    np.dtype(np.float32): 1,
+    np.dtype(np.float16): 2,
+    np.dtype(np.int8): 3,
+}
+CODE_DTYPES = {code: dtype for dtype, code in DTYPE_CODES.items()}
+
+def encode_embedding(embedding: Union[np.ndarray, List[float]], dtype=np.float32) -> bytes:
+    """
+    Serializar un embedding como BLOB binario
+
+    Args:
+        embedding: Vector de embedding
+        dtype: Tipo de dato del payload (float32 por defecto)
+
+    Returns:
+        Bytes con cabecera + payload little-endian
+    """
+    dtype = np.dtype(dtype)
+    if dtype not in DTYPE_CODES:
+        raise ValueError(f"Tipo de dato no soportado para embeddings: {dtype}")
+
+    vector = np.asarray(embedding, dtype=dtype.newbyteorder("<")).ravel()
+    header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, DTYPE_CODES[dtype], vector.shape[0])
+    return header + vector.tobytes()
+
+def is_encoded_embedding(value) -> bool:
+    """Verificar si un valor de la columna es un BLOB con el formato binario"""
+    return isinstance(value, (bytes, memoryview)) and bytes(value[:2]) == MAGIC
+
+def decode_embedding(value: Union[bytes, str]) -> np.ndarray:
+    """
+    Deserializar un embedding almacenado
+
+    El payload binario se expone sin copia (vista de solo lectura sobre el BLOB).
+    Los valores JSON heredados se decodifican para compatibilidad.
+
+    Args:
+        value: BLOB binario o texto JSON
+
+    Returns:
+        Vector de embedding
+    """
+    if isinstance(value, str):
+        return np.asarray(json.loads(value), dtype=np.float32)
+
+    magic, version, dtype_code, dimension = struct.unpack_from(HEADER_FORMAT, value)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Formato de embedding binario no reconocido")
+
+    dtype = CODE_DTYPES[dtype_code].newbyteorder("<")
+    return np.frombuffer(value, dtype=dtype, count=dimension, offset=HEADER_SIZE)
@@ -3,53 +3,212 @@ Servicio de Embeddings - Modelo GenAI basado en embeddings
 Implementa recuperación semántica usando sentence-transformers
 """
 
-from sentence_transformers import SentenceTransformer
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import logging
 import os
+import time
+
+from app.embedding_cache import EmbeddingCache
+from app.inference_pool import InferencePool
 
 class EmbeddingService:
     """Servicio para generar embeddings y realizar búsqueda semántica"""
     
     def __init__(self):
-        """Inicializar el servicio de embeddings"""
+        """
+        Inicializar el servicio de embeddings
+        
+        El modelo no se carga aquí: load() importa sentence-transformers/torch
+        y lo carga, y se llama durante el arranque fuera del event loop.
+        """
         self.model_name = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+        self.backend = os.getenv("EMBEDDING_BACKEND", "torch")
         self.model = None
+        self.load_timings: Dict[str, float] = {}
         self.logger = logging.getLogger(__name__)
+        self.cache = self._create_cache()
+        self.inference = InferencePool(
+            workers=int(os.getenv("INFERENCE_WORKERS", 2)),
+            max_pending=int(os.getenv("INFERENCE_MAX_PENDING", 64)),
+            queue_timeout=float(os.getenv("INFERENCE_QUEUE_TIMEOUT", 2))
+        )
+    
+    def load(self):
+        """
+        Cargar el modelo de embeddings (bloqueante)
+        
+        Registra en load_timings el tiempo de importación y el de carga.
+        
+        Raises:
+            RuntimeError: Si no se pudo cargar ningún backend
+        """
+        if self.model is not None:
+            return
+        
+        if self.backend == "onnx":
+            # Backend onnxruntime; si no se puede cargar se usa PyTorch
+            self.model = self._load_onnx_model()
+            if self.model is not None:
+                return
+            self.backend = "torch"
         
         try:
+            start = time.perf_counter()
+            from sentence_transformers import SentenceTransformer
+            self.load_timings["import"] = round(time.perf_counter() - start, 4)
+            
             # Cargar modelo de sentence-transformers
+            start = time.perf_counter()
             self.model = SentenceTransformer(self.model_name)
+            self.load_timings["load"] = round(time.perf_counter() - start, 4)
             self.logger.info(f"Modelo de embeddings cargado: {self.model_name}")
         except Exception as e:
             self.logger.error(f"Error cargando modelo de embeddings: {e}")
+            raise RuntimeError(f"Modelo de embeddings no disponible: {e}") from e
+    
+    def _load_onnx_model(self):
+        """
+        Cargar el backend onnxruntime o None si no está disponible
+        
+        Los embeddings se registran como '<modelo>+onnx-int8', de modo que los
+        pasajes codificados con PyTorch se recalculan en segundo plano.
+        """
+        try:
+            start = time.perf_counter()
+            from app.onnx_backend import OnnxEmbeddingModel
+            self.load_timings["import"] = round(time.perf_counter() - start, 4)
+            
+            start = time.perf_counter()
+            model = OnnxEmbeddingModel(
+                self.model_name,
+                cache_dir=os.getenv("ONNX_CACHE_DIR", "./models/onnx"),
+                quantize=os.getenv("ONNX_QUANTIZE", "true").lower() == "true",
+                threads=int(os.getenv("ONNX_THREADS", 0)),
+                parity_threshold=float(os.getenv("ONNX_PARITY_THRESHOLD", 0.99))
+            )
+            self.load_timings["load"] = round(time.perf_counter() - start, 4)
+            self.model_name = model.model_id
+            return model
+        except Exception as e:
+            self.logger.error(f"Backend ONNX no disponible, se usa PyTorch: {e}")
+            return None
+    
+    def _create_cache(self) -> Optional[EmbeddingCache]:
+        """Crear la caché de embeddings (EMBEDDING_CACHE_SIZE=0 la desactiva)"""
+        max_entries = int(os.getenv("EMBEDDING_CACHE_SIZE", 2048))
+        if max_entries <= 0:
+            return None
+        
+        return EmbeddingCache(
+            max_entries=max_entries,
+            ttl_seconds=float(os.getenv("EMBEDDING_CACHE_TTL", 0)),
+            disk_path=os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.db") or None,
+            disk_max_entries=int(os.getenv("EMBEDDING_CACHE_DISK_SIZE", 100000))
+        )
     
     def is_available(self) -> bool:
         """Verificar si el servicio está disponible"""
         return self.model is not None
     
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Obtener aciertos y fallos de la caché de embeddings"""
+        if self.cache is None:
+            return {"enabled": False}
+        return dict(self.cache.get_stats(), enabled=True)
+    
+    def get_inference_stats(self) -> Dict[str, Any]:
+        """Obtener ocupación del pool de inferencia"""
+        return self.inference.get_stats()
+    
+    def close(self):
+        """Detener el pool de inferencia y liberar la caché en disco"""
+        self.inference.close()
+        if self.cache is not None:
+            self.cache.close()
+    
+    async def encode_text_async(self, text: str) -> np.ndarray:
+        """encode_text en el pool de inferencia (no bloquea el event loop)"""
+        return await self.inference.run(self.encode_text, text)
+    
+    async def encode_texts_async(self, texts: List[str]) -> List[np.ndarray]:
+        """encode_texts en el pool de inferencia"""
+        return await self.inference.run(self.encode_texts, texts)
+    
+    async def encode_batch_async(self, texts: List[str]) -> np.ndarray:
+        """encode_batch en el pool de inferencia (backfill e ingesta masiva)"""
+        return await self.inference.run(self.encode_batch, texts)
+    
+    async def calculate_similarity_async(self, text1: str, text2: str) -> float:
+        """calculate_similarity en el pool de inferencia"""
+        return await self.inference.run(self.calculate_similarity, text1, text2)
+    
+    async def calculate_confidence_async(self, query: str, retrieved_docs: List[Dict[str, Any]]) -> float:
+        """calculate_confidence en el pool de inferencia (puede codificar documentos sin score)"""
+        return await self.inference.run(self.calculate_confidence, query, retrieved_docs)
+    
     def encode_text(self, text: str) -> np.ndarray:
         """
         Generar embedding para un texto
         
+        Los resultados se guardan en la caché (memoria y disco), de modo que
+        un mismo texto solo pasa por el modelo una vez.
+        
         Args:
             text: Texto a codificar
-            
+        
         Returns:
-            Vector de embedding
+            Vector de embedding (de solo lectura si proviene de la caché)
         """
         if not self.model:
             raise RuntimeError("Modelo de embeddings no disponible")
         
+        if self.cache is not None:
+            cached = self.cache.get(self.model_name, text)
+            if cached is not None:
+                return cached
+        
         try:
             # Generar embedding
             embedding = self.model.encode(text, convert_to_numpy=True)
+            if self.cache is not None:
+                embedding = self.cache.put(self.model_name, text, embedding)
             return embedding
         except Exception as e:
             self.logger.error(f"Error generando embedding: {e}")
             raise
     
+    def encode_texts(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        Generar embeddings de consultas en una sola llamada al modelo
+        
+        Igual que encode_text pero para varios textos: los que ya están en la
+        caché no pasan por el modelo y el resto se codifica en un lote (lo usa
+        EncodingScheduler para agrupar consultas concurrentes).
+        
+        Args:
+            texts: Textos a codificar
+        
+        Returns:
+            Un vector de embedding por texto, en el mismo orden
+        """
+        if not self.model:
+            raise RuntimeError("Modelo de embeddings no disponible")
+        
+        results: List[Optional[np.ndarray]] = [None] * len(texts)
+        if self.cache is not None:
+            for i, text in enumerate(texts):
+                results[i] = self.cache.get(self.model_name, text)
+        
+        missing = [i for i, embedding in enumerate(results) if embedding is None]
+        if missing:
+            embeddings = self.encode_batch([texts[i] for i in missing])
+            for i, embedding in zip(missing, embeddings):
+                if self.cache is not None:
+                    embedding = self.cache.put(self.model_name, texts[i], embedding)
+                results[i] = embedding
+        return results
+    
     def encode_batch(self, texts: List[str]) -> np.ndarray:
         """
         Generar embeddings para múltiples textos
@@ -101,6 +260,9 @@ class EmbeddingService:
         """
         Encontrar documentos más similares a una consulta
         
+        Los documentos sin embedding se omiten: nunca se codifican documentos
+        durante una consulta (los calcula EmbeddingBackfillWorker).
+        
         Args:
             query: Consulta de búsqueda
             documents: Lista de documentos con embeddings
@@ -115,18 +277,19 @@ class EmbeddingService:
             
             # Calcular similitudes
             similarities = []
+            skipped = 0
             for doc in documents:
-                if 'embedding' in doc:
+                if doc.get('embedding') is not None:
                     doc_embedding = np.array(doc['embedding'])
                     similarity = np.dot(query_embedding, doc_embedding) / (
                         np.linalg.norm(query_embedding) * np.linalg.norm(doc_embedding)
                     )
                     similarities.append((similarity, doc))
                 else:
-                    # Si no tiene embedding, generarlo
-                    doc_text = doc.get('content', '') + ' ' + doc.get('title', '')
-                    similarity = self.calculate_similarity(query, doc_text)
-                    similarities.append((similarity, doc))
+                    skipped += 1
+            
+            if skipped:
+                self.logger.warning(f"{skipped} documentos sin embedding omitidos en la búsqueda")
             
             # Ordenar por similitud descendente
             similarities.sort(key=lambda x: x[0], reverse=True)
@@ -0,0 +1,210 @@
+"""
+Almacén de Embeddings Mapeado en Memoria - Matriz compartida entre workers
+Exporta los embeddings normalizados a un archivo que todos los procesos mapean
+en solo lectura, de modo que el sistema operativo comparte las páginas
+"""
+
+import os
+import struct
+import time
+from contextlib import contextmanager
+from typing import Optional, Tuple
+import numpy as np
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+# Cabecera: magia, versión, dimensión, número de filas, longitud de la huella
+HEADER_FORMAT = "<8sIIQH"
+HEADER_SIZE = 256
+MAGIC = b"KBEMB001"
+VERSION = 1
+ALIGNMENT = 64
+
+class MmapEmbeddingStore:
+    """Archivo de ids int64 + matriz float32 normalizada, mapeado en solo lectura"""
+
+    def __init__(self, path: str, refresh_interval: float = 5.0):
+        """
+        Inicializar el almacén
+
+        Args:
+            path: Ruta del archivo de embeddings
+            refresh_interval: Segundos mínimos entre comprobaciones de cambios en disco
+        """
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.logger = logging.getLogger(__name__)
+        self._file_id: Optional[Tuple[int, int]] = None
+        self._last_check = 0.0
+        self._owner_file = None
+
+    @staticmethod
+    def _payload_offset(count: int) -> int:
+        """Desplazamiento alineado de la matriz tras la cabecera y los ids"""
+        offset = HEADER_SIZE + count * 8
+        return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+    def _read_header(self, path: Optional[str] = None) -> Optional[Tuple[int, int, str]]:
+        """Leer (dimensión, filas, huella) o None si el archivo no es válido"""
+        path = path or self.path
+        try:
+            with open(path, "rb") as f:
+                header = f.read(HEADER_SIZE)
+        except FileNotFoundError:
+            return None
+
+        if len(header) < HEADER_SIZE:
+            return None
+
+        magic, version, dimension, count, fp_length = struct.unpack_from(HEADER_FORMAT, header)
+        if magic != MAGIC or version != VERSION:
+            return None
+
+        start = struct.calcsize(HEADER_FORMAT)
+        fingerprint = header[start:start + fp_length].decode("utf-8")
+        return dimension, count, fingerprint
+
+    def matches(self, fingerprint: str) -> bool:
+        """Verificar si el archivo en disco corresponde a la huella indicada"""
+        header = self._read_header()
+        return header is not None and header[2] == fingerprint
+
+    @contextmanager
+    def lock(self):
+        """Bloqueo exclusivo entre procesos para reconstruir el archivo"""
+        if fcntl is None:
+            yield
+            return
+
+        with open(f"{self.path}.lock", "a+") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def try_acquire_owner(self) -> bool:
+        """
+        Intentar ser el proceso que mantiene el archivo, sin esperar
+        
+        El bloqueo del archivo de dueño se conserva hasta release_owner() o
+        hasta que el proceso termina; entonces otro worker puede tomarlo.
+        
+        Returns:
+            True si este proceso es (o ya era) el dueño
+        """
+        if self._owner_file is not None or fcntl is None:
+            return True
+        
+        owner_file = open(f"{self.path}.owner", "a+")
+        try:
+            fcntl.flock(owner_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            owner_file.close()
+            return False
+        self._owner_file = owner_file
+        self.logger.info(f"Este proceso mantiene el almacén de embeddings {self.path}")
+        return True
+    
+    def release_owner(self):
+        """Liberar el bloqueo de dueño"""
+        if self._owner_file is not None:
+            fcntl.flock(self._owner_file.fileno(), fcntl.LOCK_UN)
+            self._owner_file.close()
+            self._owner_file = None
+    
+    @contextmanager
+    def writer(self, count: int, dimension: int, fingerprint: str):
+        """
+        Crear un archivo nuevo y publicarlo atómicamente al terminar
+
+        Produce (ids, matriz) como memmaps escribibles; el llamador los rellena
+        con ids ordenados ascendentemente y vectores normalizados.
+
+        Args:
+            count: Número de filas
+            dimension: Dimensión de los embeddings
+            fingerprint: Huella de los datos exportados
+        """
+        fp_bytes = fingerprint.encode("utf-8")
+        if struct.calcsize(HEADER_FORMAT) + len(fp_bytes) > HEADER_SIZE:
+            raise ValueError("Huella demasiado larga para la cabecera")
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        payload_offset = self._payload_offset(count)
+        total_size = payload_offset + count * dimension * 4
+
+        with open(tmp_path, "wb") as f:
+            header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, dimension, count, len(fp_bytes)) + fp_bytes
+            f.write(header.ljust(HEADER_SIZE, b"\0"))
+            f.truncate(total_size)
+
+        try:
+            if count:
+                ids = np.memmap(tmp_path, dtype=np.int64, mode="r+", offset=HEADER_SIZE, shape=(count,))
+                matrix = np.memmap(
+                    tmp_path, dtype=np.float32, mode="r+", offset=payload_offset, shape=(count, dimension)
+                )
+            else:
+                ids = np.zeros(0, dtype=np.int64)
+                matrix = np.zeros((0, dimension), dtype=np.float32)
+
+            yield ids, matrix
+
+            if count:
+                ids.flush()
+                matrix.flush()
+                del ids, matrix
+            with open(tmp_path, "rb+") as f:
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        self.logger.info(f"Almacén de embeddings exportado: {count} filas en {self.path}")
+
+    def open(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Mapear el archivo en solo lectura
+
+        Returns:
+            (ids, matriz) respaldados por el archivo, sin copia en memoria
+        """
+        header = self._read_header()
+        if header is None:
+            raise FileNotFoundError(f"Almacén de embeddings no válido: {self.path}")
+
+        dimension, count, _ = header
+        stat = os.stat(self.path)
+        self._file_id = (stat.st_ino, stat.st_mtime_ns)
+        self._last_check = time.monotonic()
+
+        if count == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, dimension), dtype=np.float32)
+
+        ids = np.memmap(self.path, dtype=np.int64, mode="r", offset=HEADER_SIZE, shape=(count,))
+        matrix = np.memmap(
+            self.path, dtype=np.float32, mode="r", offset=self._payload_offset(count), shape=(count, dimension)
+        )
+        return ids, matrix
+
+    def has_changed(self) -> bool:
+        """
+        Verificar (como máximo cada `refresh_interval` segundos) si otro proceso
+        publicó un archivo nuevo
+        """
+        now = time.monotonic()
+        if self._file_id is None or now - self._last_check < self.refresh_interval:
+            return False
+
+        self._last_check = now
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        return (stat.st_ino, stat.st_mtime_ns) != self._file_id
@@ -0,0 +1,145 @@
+"""
+Planificador de Codificación - Micro-lotes dinámicos de embeddings
+Agrupa las consultas concurrentes que llegan dentro de una ventana de pocos
+milisegundos en una sola llamada al modelo y reparte los resultados
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+import logging
+
+from app.micro_batcher import MicroBatcher
+
+class EncodingScheduler:
+    """
+    Cola de textos a codificar que se vacía en lotes con encode_texts
+
+    Mantiene hasta `max_concurrency` lotes en vuelo, por defecto uno por hilo
+    del pool de inferencia, para que ENCODE_BATCH_SIZE limite el tamaño de cada
+    llamada al modelo y no la concurrencia total.
+    """
+
+    def __init__(self, embedding_service, max_batch_size: int = 32, max_wait_ms: float = 5.0,
+                 max_queue: int = 1000, window: int = 1000,
+                 max_concurrency: Optional[int] = None):
+        """
+        Inicializar el planificador
+
+        Args:
+            embedding_service: Servicio de embeddings que codifica cada lote
+            max_batch_size: Textos máximos por llamada al modelo
+            max_wait_ms: Milisegundos que el primer texto de un lote espera a otros
+            max_queue: Textos pendientes máximos; si se supera se codifica sin agrupar
+            window: Esperas recientes usadas para los percentiles de las métricas
+            max_concurrency: Lotes codificándose a la vez (por defecto, los
+                hilos del pool de inferencia del servicio)
+        """
+        self.embedding_service = embedding_service
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        if max_concurrency is None:
+            inference = getattr(embedding_service, "inference", None)
+            max_concurrency = getattr(inference, "workers", 1)
+        self.max_concurrency = max(1, max_concurrency)
+        self.logger = logging.getLogger(__name__)
+        self._batcher = MicroBatcher(
+            self._encode, self.max_batch_size, self.max_wait, max_queue,
+            concurrency=self.max_concurrency
+        )
+        self._waits = deque(maxlen=window)
+        self._stats: Dict[str, Any] = {
+            "requests": 0,
+            "batches": 0,
+            "encoded": 0,
+            "largest_batch": 0,
+            "overflow": 0,
+            "errors": 0,
+            "last_batch_ms": None
+        }
+
+    def is_running(self) -> bool:
+        """Verificar si la tarea de fondo está activa"""
+        return self._batcher.is_running()
+
+    async def start(self):
+        """Lanzar la tarea de fondo"""
+        await self._batcher.start()
+
+    async def stop(self):
+        """Detener la tarea de fondo y codificar lo que quede en la cola"""
+        await self._batcher.stop()
+
+    async def encode(self, text: str) -> np.ndarray:
+        """
+        Codificar un texto dentro del próximo lote
+
+        Si la tarea de fondo no está activa o la cola está llena, el texto se
+        codifica directamente en el pool de inferencia.
+
+        Args:
+            text: Texto a codificar
+
+        Returns:
+            Vector de embedding
+        """
+        self._stats["requests"] += 1
+        if not self.is_running():
+            return await self.embedding_service.encode_text_async(text)
+
+        future = asyncio.get_running_loop().create_future()
+        if not self._batcher.submit((text, future, time.perf_counter())):
+            self._stats["overflow"] += 1
+            return await self.embedding_service.encode_text_async(text)
+        return await future
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obtener tamaño de los lotes y tiempos de espera en cola (ms)"""
+        waits = np.array(self._waits) * 1000 if self._waits else None
+        batches = self._stats["batches"]
+        return dict(
+            self._stats,
+            running=self.is_running(),
+            pending=self._batcher.pending(),
+            in_flight=self._batcher.in_flight(),
+            max_batch_size=self.max_batch_size,
+            max_concurrency=self.max_concurrency,
+            max_wait_ms=self.max_wait * 1000,
+            avg_batch_size=round(self._stats["encoded"] / batches, 2) if batches else None,
+            queue_wait_ms={
+                "avg": round(float(waits.mean()), 3),
+                "p95": round(float(np.percentile(waits, 95)), 3),
+                "max": round(float(waits.max()), 3)
+            } if waits is not None else None
+        )
+
+    async def _encode(self, batch: List[Tuple[str, asyncio.Future, float]]):
+        """Codificar un lote en el pool de inferencia y resolver los futures de quienes esperan"""
+        if not batch:
+            return
+
+        start = time.perf_counter()
+        self._waits.extend(start - enqueued_at for _, _, enqueued_at in batch)
+        # Textos repetidos dentro del lote se codifican una sola vez
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+        try:
+            embeddings = await self.embedding_service.encode_texts_async(texts)
+        except Exception as e:
+            self._stats["errors"] += 1
+            self.logger.error(f"Error codificando lote de {len(texts)} textos: {e}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        by_text = dict(zip(texts, embeddings))
+        for text, future, _ in batch:
+            if not future.done():
+                future.set_result(by_text[text])
+
+        self._stats["batches"] += 1
+        self._stats["encoded"] += len(batch)
+        self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+        self._stats["last_batch_ms"] = round((time.perf_counter() - start) * 1000, 3)
@@ -0,0 +1,108 @@
+"""
+Pool de Inferencia - Ejecución de los modelos fuera del event loop
+Pool de hilos dedicado con límite de trabajos pendientes, para que los picos
+de inferencia no congelen al resto de las peticiones
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+import logging
+
+class InferenceOverloadedError(RuntimeError):
+    """El pool tiene demasiados trabajos pendientes (se responde 503)"""
+
+class InferencePool:
+    """
+    Executor de hilos para llamadas síncronas y costosas en CPU
+
+    Cada trabajo ocupa un cupo desde que se encola hasta que termina; si no hay
+    cupo libre dentro de queue_timeout se rechaza con InferenceOverloadedError
+    en lugar de acumular latencia sin límite.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 64, queue_timeout: float = 2.0):
+        """
+        Inicializar el pool
+
+        Args:
+            workers: Hilos de inferencia (torch y numpy liberan el GIL al calcular)
+            max_pending: Trabajos admitidos a la vez, en ejecución o en cola
+            queue_timeout: Segundos máximos esperando un cupo antes de rechazar
+        """
+        self.workers = max(1, workers)
+        self.max_pending = max(self.workers, max_pending)
+        self.queue_timeout = queue_timeout
+        self.logger = logging.getLogger(__name__)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots = asyncio.Semaphore(self.max_pending)
+        self._pending = 0
+        self._stats: Dict[str, Any] = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "max_pending_seen": 0,
+            "last_latency_ms": None
+        }
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Crear el executor al primer uso"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """
+        Ejecutar fn(*args) en el pool
+
+        Args:
+            fn: Función síncrona (codificación, similitud, ...)
+            *args: Argumentos posicionales
+
+        Returns:
+            Resultado de fn
+
+        Raises:
+            InferenceOverloadedError: Si no se obtuvo cupo dentro de queue_timeout
+        """
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._stats["rejected"] += 1
+            raise InferenceOverloadedError(
+                f"Inferencia saturada ({self.max_pending} trabajos pendientes)"
+            ) from None
+
+        self._pending += 1
+        self._stats["submitted"] += 1
+        self._stats["max_pending_seen"] = max(self._stats["max_pending_seen"], self._pending)
+        try:
+            start = time.perf_counter()
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._get_executor(), fn, *args)
+            self._stats["completed"] += 1
+            self._stats["last_latency_ms"] = round((time.perf_counter() - start) * 1000, 3)
+            return result
+        except Exception:
+            self._stats["failed"] += 1
+            raise
+        finally:
+            self._pending -= 1
+            self._slots.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obtener ocupación y contadores del pool"""
+        return dict(
+            self._stats,
+            workers=self.workers,
+            max_pending=self.max_pending,
+            pending=self._pending
+        )
+
+    def close(self):
+        """Detener los hilos (los trabajos en curso terminan)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
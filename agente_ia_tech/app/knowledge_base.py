@@ -4,32 +4,135 @@ Implementa almacenamiento y búsqueda de información organizacional
 """
 
 import sqlite3
+import asyncio
+import base64
+import itertools
 import json
 import os
-from typing import List, Dict, Any, Optional
+import re
+import shutil
+import tempfile
+from typing import List, Dict, Any, AsyncIterator, Optional, Set, Tuple, Union
 import logging
 from datetime import datetime
+import numpy as np
+
+from app.database import Database, utc_timestamp
+from app.vector_index import VectorIndex
+from app.ann_index import IVFFlatIndex
+from app.quantized_index import QuantizedVectorIndex, rerank_exact, recall_report
+from app.two_stage_index import TwoStageIndex
+from app.embedding_store import MmapEmbeddingStore
+from app.embedding_codec import encode_embedding, decode_embedding
+from app.rank_fusion import reciprocal_rank_fusion, weighted_score_fusion
+from app.diversity import maximal_marginal_relevance
+from app.chunking import PassageChunker
+from app.category_router import normalize_category
+from app.near_duplicates import MinHasher, DuplicateItemError, DEDUP_POLICIES
+from app.snapshot import SnapshotFile
+
+# Versión del esquema (PRAGMA user_version)
+SCHEMA_VERSION = 4
+
+# Pesos BM25 por columna del índice FTS5 (title, content, category)
+BM25_WEIGHTS = (3.0, 1.0, 0.5)
+
+SEARCH_MODES = ("semantic", "lexical", "hybrid", "keyword")
+
+# Columnas de knowledge_items que se pueden proyectar en los listados
+ITEM_FIELDS = ("id", "title", "content", "category", "embedding", "created_at", "updated_at")
+DEFAULT_ITEM_FIELDS = tuple(field for field in ITEM_FIELDS if field != "embedding")
+
+# Pasajes pendientes de codificar: sin embedding o codificados con otro modelo
+STALE_EMBEDDING_CONDITION = (
+    "(p.embedding IS NULL OR (p.embedding_model IS NOT NULL AND p.embedding_model != ?))"
+)
 
 class KnowledgeBase:
     """Gestión de la base de conocimiento organizacional"""
     
-    def __init__(self):
-        """Inicializar la base de conocimiento"""
+    def __init__(self, embedding_service=None, encoding_scheduler=None):
+        """
+        Inicializar la base de conocimiento
+        
+        Args:
+            embedding_service: Servicio de embeddings para la búsqueda semántica (opcional)
+            encoding_scheduler: EncodingScheduler que agrupa en lotes los embeddings
+                de consultas concurrentes (opcional)
+        """
         self.db_path = os.getenv("DATABASE_PATH", "./knowledge_base.db")
+        self.search_mode = os.getenv("SEARCH_MODE", "semantic")
+        self.hybrid_fusion = os.getenv("HYBRID_FUSION", "rrf")
+        self.hybrid_lexical_candidates = int(os.getenv("HYBRID_LEXICAL_CANDIDATES", 20))
+        self.hybrid_semantic_candidates = int(os.getenv("HYBRID_SEMANTIC_CANDIDATES", 20))
+        self.hybrid_rrf_k = int(os.getenv("HYBRID_RRF_K", 60))
+        self.hybrid_semantic_weight = float(os.getenv("HYBRID_SEMANTIC_WEIGHT", 0.5))
+        self.mmr_lambda = float(os.getenv("MMR_LAMBDA", 0.7))
+        self.mmr_candidates = int(os.getenv("MMR_CANDIDATES", 20))
+        self.routing_min_score = float(os.getenv("ROUTING_MIN_SCORE", 0.3))
         self.logger = logging.getLogger(__name__)
-        self.connection = None
+        self.db = Database(
+            self.db_path,
+            readers=int(os.getenv("DB_READERS", 4)),
+            busy_timeout_ms=int(os.getenv("DB_BUSY_TIMEOUT_MS", 5000)),
+            cache_size_kb=int(os.getenv("DB_CACHE_SIZE_KB", 16384)),
+            mmap_size=int(os.getenv("DB_MMAP_SIZE", 268435456))
+        )
+        self.fts_available = False
+        self.embedding_service = embedding_service
+        self.encoding_scheduler = encoding_scheduler
+        self.chunker = PassageChunker(
+            max_chars=int(os.getenv("CHUNK_MAX_CHARS", 500)),
+            overlap_units=int(os.getenv("CHUNK_OVERLAP", 1))
+        )
+        self.passage_oversample = int(os.getenv("PASSAGE_OVERSAMPLE", 4))
+        self.vector_index_type = os.getenv("VECTOR_INDEX", "flat")
+        self.vector_index_path = os.getenv(
+            "VECTOR_INDEX_PATH", f"{os.path.splitext(self.db_path)[0]}.{self.vector_index_type}.npz"
+        )
+        self.quantized_rerank = int(os.getenv("QUANTIZED_RERANK", 4))
+        self.dedup_policy = os.getenv("DEDUP_POLICY", "link")
+        if self.dedup_policy not in DEDUP_POLICIES:
+            raise ValueError(f"Política de duplicados desconocida: {self.dedup_policy}")
+        self.dedup_threshold = float(os.getenv("DEDUP_THRESHOLD", 0.85))
+        # Buckets LSH más grandes (contenido vacío o plantillas) no se comparan
+        self.dedup_max_bucket_size = int(os.getenv("DEDUP_MAX_BUCKET_SIZE", 1000))
+        self.minhasher = MinHasher(
+            num_perm=int(os.getenv("MINHASH_PERMUTATIONS", 128)),
+            bands=int(os.getenv("MINHASH_BANDS", 16))
+        )
+        self.vector_index = self._create_vector_index()
+        self.embedding_store = self._create_embedding_store()
+        self._snapshot: Optional[SnapshotFile] = None
+        self._index_dirty = False
+        self._vector_index_loaded = False
+        # Particiones por categoría: ids de pasajes indexados de cada categoría
+        self._partitions: Dict[str, Set[int]] = {}
+        self._partition_arrays: Dict[str, np.ndarray] = {}
+        self._category_names: Dict[str, Set[str]] = {}
     
     async def initialize(self):
         """Inicializar la base de datos y crear tablas"""
         try:
-            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
-            self.connection.row_factory = sqlite3.Row
+            await self.db.open()
             
             # Crear tablas
-            await self._create_tables()
+            await self.db.write(self._create_tables)
+            
+            # Migrar esquemas anteriores
+            await self.db.write(self._migrate_schema)
             
             # Poblar con datos iniciales si está vacía
-            await self._populate_initial_data()
+            await self.db.write(self._populate_initial_data)
+            
+            # Firmas MinHash de los documentos que aún no la tienen
+            await self.db.write(self._backfill_signatures)
+            
+            # Cargar embeddings en el índice vectorial
+            await self._build_vector_index()
+            
+            # Agrupar los pasajes indexados por categoría
+            self._set_partitions(await self.db.read(self._load_partitions))
             
             self.logger.info("Base de conocimiento inicializada correctamente")
             
@@ -39,11 +142,11 @@ class KnowledgeBase:
     
     def is_available(self) -> bool:
         """Verificar si la base de conocimiento está disponible"""
-        return self.connection is not None
+        return self.db.is_open()
     
-    async def _create_tables(self):
+    def _create_tables(self, connection: sqlite3.Connection):
         """Crear tablas de la base de datos"""
-        cursor = self.connection.cursor()
+        cursor = connection.cursor()
         
         # Tabla de documentos de conocimiento
         cursor.execute("""
@@ -52,12 +155,49 @@ class KnowledgeBase:
                 title TEXT NOT NULL,
                 content TEXT NOT NULL,
                 category TEXT NOT NULL,
-                embedding TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                embedding BLOB,
+                created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+                updated_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
             )
         """)
         
+        # Índices para el listado paginado por (updated_at, id)
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_knowledge_items_updated ON knowledge_items(updated_at, id)"
+        )
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_knowledge_items_category_updated
+            ON knowledge_items(category, updated_at, id)
+        """)
+        
+        # Pasajes de cada documento (unidad de recuperación semántica)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS knowledge_passages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                item_id INTEGER NOT NULL REFERENCES knowledge_items(id) ON DELETE CASCADE,
+                ordinal INTEGER NOT NULL,
+                heading TEXT,
+                content TEXT NOT NULL,
+                embedding BLOB,
+                embedding_model TEXT,
+                updated_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+            )
+        """)
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_knowledge_passages_item ON knowledge_passages(item_id)"
+        )
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_knowledge_passages_missing
+            ON knowledge_passages(id) WHERE embedding IS NULL
+        """)
+        # Al cambiar el texto de un documento sus pasajes se regeneran
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS knowledge_items_passages_update
+            AFTER UPDATE OF title, content ON knowledge_items BEGIN
+                DELETE FROM knowledge_passages WHERE item_id = old.id;
+            END
+        """)
+        
         # Tabla de consultas y respuestas (para aprendizaje)
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS query_history (
@@ -67,7 +207,7 @@ class KnowledgeBase:
                 confidence REAL,
                 sources TEXT,
                 classification TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
             )
         """)
         
@@ -77,15 +217,164 @@ class KnowledgeBase:
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 name TEXT UNIQUE NOT NULL,
                 description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+            )
+        """)
+        
+        # Firmas MinHash y buckets LSH para detectar casi duplicados
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS item_signatures (
+                item_id INTEGER PRIMARY KEY REFERENCES knowledge_items(id) ON DELETE CASCADE,
+                signature BLOB NOT NULL
             )
         """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS item_lsh_buckets (
+                bucket INTEGER NOT NULL,
+                item_id INTEGER NOT NULL REFERENCES knowledge_items(id) ON DELETE CASCADE
+            )
+        """)
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_item_lsh_buckets_bucket ON item_lsh_buckets(bucket)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_item_lsh_buckets_item ON item_lsh_buckets(item_id)"
+        )
+        
+        # Documentos casi duplicados enlazados a su original
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS item_duplicates (
+                item_id INTEGER PRIMARY KEY REFERENCES knowledge_items(id) ON DELETE CASCADE,
+                duplicate_of INTEGER NOT NULL REFERENCES knowledge_items(id) ON DELETE CASCADE,
+                similarity REAL,
+                created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+            )
+        """)
+        
+        # Índice de texto completo (FTS5) sincronizado por triggers
+        self._create_fts_index(cursor)
+    
+    def _create_fts_index(self, cursor: sqlite3.Cursor):
+        """Crear la tabla virtual FTS5 sobre knowledge_items y sus triggers"""
+        try:
+            cursor.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS knowledge_items_fts USING fts5(
+                    title, content, category,
+                    content='knowledge_items',
+                    content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            """)
+        except sqlite3.OperationalError as e:
+            self.logger.warning(f"FTS5 no disponible, búsqueda léxica deshabilitada: {e}")
+            self.fts_available = False
+            return
+        
+        cursor.executescript("""
+            CREATE TRIGGER IF NOT EXISTS knowledge_items_fts_insert
+            AFTER INSERT ON knowledge_items BEGIN
+                INSERT INTO knowledge_items_fts(rowid, title, content, category)
+                VALUES (new.id, new.title, new.content, new.category);
+            END;
+            
+            CREATE TRIGGER IF NOT EXISTS knowledge_items_fts_delete
+            AFTER DELETE ON knowledge_items BEGIN
+                INSERT INTO knowledge_items_fts(knowledge_items_fts, rowid, title, content, category)
+                VALUES ('delete', old.id, old.title, old.content, old.category);
+            END;
+            
+            CREATE TRIGGER IF NOT EXISTS knowledge_items_fts_update
+            AFTER UPDATE OF title, content, category ON knowledge_items BEGIN
+                INSERT INTO knowledge_items_fts(knowledge_items_fts, rowid, title, content, category)
+                VALUES ('delete', old.id, old.title, old.content, old.category);
+                INSERT INTO knowledge_items_fts(rowid, title, content, category)
+                VALUES (new.id, new.title, new.content, new.category);
+            END;
+        """)
+        self.fts_available = True
+    
+    def _migrate_schema(self, connection: sqlite3.Connection):
+        """Aplicar migraciones pendientes según PRAGMA user_version"""
+        cursor = connection.cursor()
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        
+        if version < 1:
+            self._migrate_embeddings_to_blob(connection)
+        
+        if version < 2 and self.fts_available:
+            # Indexar en FTS5 las filas existentes antes de los triggers
+            cursor.execute("INSERT INTO knowledge_items_fts(knowledge_items_fts) VALUES ('rebuild')")
+        
+        if version < 3:
+            columns = [row["name"] for row in cursor.execute("PRAGMA table_info(knowledge_passages)")]
+            if "embedding_model" not in columns:
+                cursor.execute("ALTER TABLE knowledge_passages ADD COLUMN embedding_model TEXT")
+        
+        if version < 4:
+            self._migrate_timestamps_to_utc(connection)
+        
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    
+    def _migrate_timestamps_to_utc(self, connection: sqlite3.Connection):
+        """
+        Llevar las marcas de tiempo existentes al formato único (UTC con milisegundos)
         
-        self.connection.commit()
+        Los valores por defecto de SQLite (CURRENT_TIMESTAMP, sin fracción) ya
+        están en UTC; los escritos antes desde Python (datetime.now() con
+        microsegundos) estaban en hora local del servidor y se convierten.
+        """
+        columns = {
+            "knowledge_items": ("created_at", "updated_at"),
+            "knowledge_passages": ("updated_at",),
+            "query_history": ("created_at",),
+            "categories": ("created_at",),
+            "item_duplicates": ("created_at",)
+        }
+        for table, names in columns.items():
+            assignments = ", ".join(
+                f"""{name} = CASE
+                    WHEN length({name}) > 19 THEN strftime('%Y-%m-%d %H:%M:%f', {name}, 'utc')
+                    ELSE strftime('%Y-%m-%d %H:%M:%f', {name})
+                END"""
+                for name in names
+            )
+            connection.execute(f"UPDATE {table} SET {assignments}")
     
-    async def _populate_initial_data(self):
+    def _migrate_embeddings_to_blob(self, connection: sqlite3.Connection, batch_size: int = 1000):
+        """
+        Convertir embeddings JSON (TEXT) a BLOB float32 (dentro de la transacción del escritor)
+        
+        Args:
+            connection: Conexión de escritura
+            batch_size: Filas leídas por iteración
+        """
+        cursor = connection.cursor()
+        
+        converted = 0
+        while True:
+            # Las filas convertidas dejan de cumplir el filtro
+            rows = cursor.execute(
+                "SELECT id, embedding FROM knowledge_items WHERE typeof(embedding) = 'text' LIMIT ?",
+                (batch_size,)
+            ).fetchall()
+            if not rows:
+                break
+            cursor.executemany(
+                "UPDATE knowledge_items SET embedding = ? WHERE id = ?",
+                [(encode_embedding(json.loads(row["embedding"])), row["id"]) for row in rows]
+            )
+            converted += len(rows)
+            
+        if converted:
+            self.logger.info(f"Migrados {converted} embeddings de JSON a BLOB")
+    
+    def _populate_initial_data(self, connection: sqlite3.Connection):
         """Poblar la base de datos con datos iniciales"""
-        cursor = self.connection.cursor()
+        cursor = connection.cursor()
+        
+        # Bloqueo de escritura antes de contar: varios workers pueden arrancar
+        # a la vez sobre la misma base y solo uno debe sembrarla
+        cursor.execute("BEGIN IMMEDIATE")
         
         # Verificar si ya hay datos
         cursor.execute("SELECT COUNT(*) FROM knowledge_items")
@@ -267,61 +556,1496 @@ Responsable: Departamento de RRHH""",
                 (item["title"], item["content"], item["category"])
             )
         
-        self.connection.commit()
         self.logger.info("Datos iniciales cargados en la base de conocimiento")
     
-    async def add_item(self, title: str, content: str, category: str, embedding: Optional[List[float]] = None) -> int:
-        """Agregar nuevo elemento a la base de conocimiento"""
-        cursor = self.connection.cursor()
+    def _semantic_search_available(self) -> bool:
+        """Verificar si se puede usar la búsqueda semántica"""
+        return (
+            self.embedding_service is not None
+            and self.embedding_service.is_available()
+        )
+    
+    @staticmethod
+    def _document_text(title: str, content: str) -> str:
+        """Texto que se codifica como embedding de un documento"""
+        return f"{title} {content}"
+    
+    async def _build_vector_index(self):
+        """
+        Cargar en el índice vectorial los embeddings de pasajes ya calculados
+        
+        No se codifica nada aquí: los pasajes sin embedding (o de otro modelo)
+        los procesa en segundo plano EmbeddingBackfillWorker. Con un índice
+        persistente (IVF) se reutiliza el archivo en disco si corresponde a los
+        datos actuales.
+        """
+        if not self._semantic_search_available():
+            self.logger.warning("Servicio de embeddings no disponible, índice vectorial pendiente")
+            return
+        
+        if self.embedding_store is not None:
+            await self._attach_embedding_store()
+        else:
+            await self.db.read(self._load_vector_index)
+        self._vector_index_loaded = True
+    
+    async def load_vector_index(self):
+        """
+        Cargar el índice vectorial si initialize() no pudo hacerlo
         
-        embedding_json = json.dumps(embedding) if embedding else None
+        Cuando el modelo de embeddings termina de cargar después de la base
+        (arranque en paralelo), el índice (archivo compartido, índice
+        persistido o snapshot) se carga aquí en lugar de quedar vacío.
+        """
+        if self._vector_index_loaded:
+            return
+        
+        await self._build_vector_index()
+        if self._vector_index_loaded:
+            self._set_partitions(await self.db.read(self._load_partitions))
+    
+    def _load_vector_index(self, connection: sqlite3.Connection):
+        """Usar el índice persistido si corresponde a los datos o reconstruirlo"""
+        fingerprint = self._index_fingerprint(connection)
+        if self._vector_index_persistent() and self.vector_index.load(self.vector_index_path, fingerprint):
+            return
+        
+        if self._load_snapshot_embeddings(fingerprint):
+            return
+        
+        self._rebuild_from_database(connection, fingerprint)
+    
+    def _load_snapshot_embeddings(self, fingerprint: str) -> bool:
+        """Usar la matriz del snapshot restaurado (mapeada en memoria) si corresponde a los datos"""
+        if self._snapshot is None or not self._snapshot.has("embeddings"):
+            return False
+        if self._snapshot.manifest()["fingerprint"] != fingerprint:
+            return False
         
+        ids = self._snapshot.array("ids")
+        matrix = self._snapshot.array("embeddings")
+        if hasattr(self.vector_index, "attach"):
+            # Índice flat: la matriz del snapshot es el segmento base, sin copiarla
+            self.vector_index.attach(ids, matrix)
+        else:
+            self.vector_index.build(ids, matrix)
+            if self._vector_index_persistent():
+                self.vector_index.save(self.vector_index_path, fingerprint)
+        self._index_dirty = False
+        self.logger.info(f"Índice vectorial cargado desde el snapshot ({len(ids)} pasajes)")
+        return True
+    
+    def _rebuild_from_database(self, connection: sqlite3.Connection, fingerprint: Optional[str] = None):
+        """Reconstruir el índice en memoria desde los embeddings de la base"""
+        fingerprint = fingerprint or self._index_fingerprint(connection)
+        cursor = connection.cursor()
+        cursor.execute("SELECT id, embedding FROM knowledge_passages WHERE embedding IS NOT NULL")
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        
+        self.vector_index.build(
+            [row["id"] for row in rows],
+            np.stack([decode_embedding(row["embedding"]) for row in rows])
+        )
+        
+        if self._vector_index_persistent():
+            self.vector_index.save(self.vector_index_path, fingerprint)
+        self._index_dirty = False
+    
+    async def rebuild_vector_index(self):
+        """
+        Reconstruir el índice vectorial completo (p. ej. tras un backfill masivo)
+        
+        Con el almacén compartido se reexporta el archivo y se descarta el
+        segmento en memoria; con IVF se reentrenan los centroides.
+        """
+        if not self._semantic_search_available():
+            return
+        
+        if self.embedding_store is not None:
+            await self.db.read(self._publish_embedding_store)
+            ids, matrix = self.embedding_store.open()
+            self.vector_index.attach(ids, matrix, keep_delta=False)
+            self._index_dirty = False
+        else:
+            await self.db.read(self._rebuild_from_database)
+        
+        self._set_partitions(await self.db.read(self._load_partitions))
+    
+    def _load_partitions(self, connection: sqlite3.Connection) -> Dict[str, Set[int]]:
+        """Agrupar los ids de pasajes con embedding por la categoría de su documento"""
+        partitions: Dict[str, Set[int]] = {
+            row[0]: set() for row in connection.execute("SELECT DISTINCT category FROM knowledge_items")
+        }
+        cursor = connection.execute("""
+            SELECT p.id, k.category
+            FROM knowledge_passages p JOIN knowledge_items k ON k.id = p.item_id
+            WHERE p.embedding IS NOT NULL
+        """)
+        for passage_id, category in cursor:
+            partitions.setdefault(category, set()).add(passage_id)
+        return partitions
+    
+    def _set_partitions(self, partitions: Dict[str, Set[int]]):
+        """Reemplazar las particiones y el mapa de claves normalizadas"""
+        self._partitions = partitions
+        self._partition_arrays = {}
+        self._category_names = {}
+        for category in partitions:
+            self._register_category(category)
+    
+    def _register_category(self, category: str):
+        """Asociar una categoría a su clave normalizada (etiqueta del clasificador)"""
+        self._partitions.setdefault(category, set())
+        self._category_names.setdefault(normalize_category(category), set()).add(category)
+    
+    def _add_to_partitions(self, rows: List[Tuple[int, str]]):
+        """Agregar pasajes recién indexados a la partición de su categoría"""
+        for passage_id, category in rows:
+            self._register_category(category)
+            self._partitions[category].add(passage_id)
+            self._partition_arrays.pop(category, None)
+    
+    def _resolve_categories(self, categories: Optional[List[str]]) -> Optional[List[str]]:
+        """
+        Traducir categorías o etiquetas del clasificador a los nombres de la base
+        
+        Devuelve None (buscar en toda la base) si ninguna corresponde a una
+        categoría existente o si sus particiones no tienen pasajes indexados
+        y el índice vectorial sí los tiene.
+        """
+        if not categories:
+            return None
+        
+        names = sorted({
+            name for category in categories
+            for name in self._category_names.get(normalize_category(category), ())
+        })
+        if not names:
+            return None
+        if not self.vector_index.is_empty() and not any(self._partitions.get(name) for name in names):
+            return None
+        return names
+    
+    def _partition_candidates(self, categories: List[str]) -> np.ndarray:
+        """Ids de pasajes (ordenados por partición) de las categorías indicadas"""
+        arrays = []
+        for category in categories:
+            array = self._partition_arrays.get(category)
+            if array is None:
+                array = np.sort(np.fromiter(self._partitions.get(category, ()), dtype=np.int64))
+                self._partition_arrays[category] = array
+            arrays.append(array)
+        return np.concatenate(arrays) if arrays else np.zeros(0, dtype=np.int64)
+    
+    def _store_signature(self, cursor: sqlite3.Cursor, item_id: int, signature: np.ndarray):
+        """Guardar (o reemplazar) la firma MinHash de un documento y sus buckets LSH"""
+        cursor.execute(
+            "INSERT OR REPLACE INTO item_signatures (item_id, signature) VALUES (?, ?)",
+            (item_id, MinHasher.to_blob(signature))
+        )
+        cursor.execute("DELETE FROM item_lsh_buckets WHERE item_id = ?", (item_id,))
+        cursor.executemany(
+            "INSERT INTO item_lsh_buckets (bucket, item_id) VALUES (?, ?)",
+            [(bucket, item_id) for bucket in self.minhasher.band_keys(signature)]
+        )
+    
+    def _backfill_signatures(self, connection: sqlite3.Connection, batch_size: int = 500) -> int:
+        """
+        Calcular las firmas que faltan o que se generaron con otro número de permutaciones
+        
+        Returns:
+            Número de firmas calculadas
+        """
+        cursor = connection.cursor()
+        computed = 0
+        while True:
+            # Las filas procesadas dejan de cumplir el filtro
+            rows = cursor.execute("""
+                SELECT k.id, k.content
+                FROM knowledge_items k LEFT JOIN item_signatures s ON s.item_id = k.id
+                WHERE s.item_id IS NULL OR length(s.signature) != ?
+                LIMIT ?
+            """, (self.minhasher.num_perm * 4, batch_size)).fetchall()
+            if not rows:
+                break
+            for row in rows:
+                signature = self.minhasher.signature(row["content"])
+                self._store_signature(cursor, row["id"], signature)
+            computed += len(rows)
+        
+        if computed:
+            self.logger.info(f"Calculadas {computed} firmas MinHash")
+        return computed
+    
+    def _load_signatures(self, connection: sqlite3.Connection, item_ids: List[int]) -> Dict[int, np.ndarray]:
+        """Firmas guardadas de los documentos indicados, por id"""
+        if not item_ids:
+            return {}
+        
+        placeholders = ",".join("?" for _ in item_ids)
+        rows = connection.execute(
+            f"SELECT item_id, signature FROM item_signatures WHERE item_id IN ({placeholders})",
+            list(item_ids)
+        ).fetchall()
+        return {row[0]: MinHasher.from_blob(row[1]) for row in rows}
+    
+    def _find_duplicate(self, connection: sqlite3.Connection,
+                        signature: np.ndarray) -> Optional[Tuple[int, float]]:
+        """
+        Buscar el documento existente más parecido que supere DEDUP_THRESHOLD
+        
+        Solo se comparan los documentos que comparten algún bucket LSH de
+        como máximo DEDUP_MAX_BUCKET_SIZE documentos.
+        
+        Returns:
+            (id, similitud estimada) o None
+        """
+        buckets = self.minhasher.band_keys(signature)
+        placeholders = ",".join("?" for _ in buckets)
+        candidates = [row[0] for row in connection.execute(f"""
+            SELECT DISTINCT item_id FROM item_lsh_buckets WHERE bucket IN (
+                SELECT bucket FROM item_lsh_buckets WHERE bucket IN ({placeholders})
+                GROUP BY bucket HAVING COUNT(*) <= ?
+            )
+        """, [*buckets, self.dedup_max_bucket_size])]
+        
+        best = None
+        for item_id, other in self._load_signatures(connection, candidates).items():
+            similarity = MinHasher.similarity(signature, other)
+            if similarity >= self.dedup_threshold and (best is None or similarity > best[1]):
+                best = (item_id, similarity)
+        return best
+    
+    def _indexed_passage_ids(self, connection: sqlite3.Connection, item_ids: List[int]) -> List[int]:
+        """Ids de los pasajes con embedding de los documentos indicados"""
+        if not item_ids:
+            return []
+        
+        placeholders = ",".join("?" for _ in item_ids)
+        return [row[0] for row in connection.execute(
+            f"SELECT id FROM knowledge_passages WHERE item_id IN ({placeholders}) AND embedding IS NOT NULL",
+            list(item_ids)
+        )]
+    
+    def _remove_from_index(self, passage_ids: List[int]):
+        """Quitar pasajes eliminados del índice vectorial y de sus particiones"""
+        if not passage_ids:
+            return
+        
+        self.vector_index.remove(passage_ids)
+        removed = set(passage_ids)
+        for category, members in self._partitions.items():
+            if members & removed:
+                members -= removed
+                self._partition_arrays.pop(category, None)
+        self._index_dirty = True
+    
+    def _insert_passages(self, cursor: sqlite3.Cursor, item_id: int, content: str) -> int:
+        """Fragmentar un documento e insertar sus pasajes (sin confirmar)"""
+        passages = self.chunker.split(content)
+        cursor.executemany(
+            "INSERT INTO knowledge_passages (item_id, ordinal, heading, content) VALUES (?, ?, ?, ?)",
+            [(item_id, p["ordinal"], p["heading"], p["content"]) for p in passages]
+        )
+        return len(passages)
+    
+    async def chunk_missing_items(self) -> int:
+        """
+        Fragmentar los documentos que todavía no tienen pasajes
+        
+        Returns:
+            Número de pasajes creados
+        """
+        def chunk(connection: sqlite3.Connection) -> Tuple[int, int]:
+            cursor = connection.cursor()
+            cursor.execute("""
+                SELECT k.id, k.content FROM knowledge_items k
+                WHERE NOT EXISTS (SELECT 1 FROM knowledge_passages p WHERE p.item_id = k.id)
+            """)
+            items = cursor.fetchall()
+            return len(items), sum(self._insert_passages(cursor, row["id"], row["content"]) for row in items)
+        
+        chunked, total = await self.db.write(chunk)
+        if not chunked:
+            return 0
+        
+        self.logger.info(f"{chunked} documentos fragmentados en {total} pasajes")
+        return total
+    
+    async def count_passages_needing_embeddings(self, model_name: str) -> int:
+        """Contar pasajes sin embedding o codificados con otro modelo"""
+        def count(connection: sqlite3.Connection) -> int:
+            return connection.execute(
+                f"SELECT COUNT(*) FROM knowledge_passages p WHERE {STALE_EMBEDDING_CONDITION}", (model_name,)
+            ).fetchone()[0]
+        
+        return await self.db.read(count)
+    
+    async def get_passages_needing_embeddings(self, model_name: str, limit: int) -> List[Dict[str, Any]]:
+        """
+        Obtener un lote de pasajes sin embedding o codificados con otro modelo
+        
+        Args:
+            model_name: Modelo de embeddings vigente
+            limit: Tamaño del lote
+            
+        Returns:
+            Lista de pasajes con 'id' y 'text' (texto a codificar)
+        """
+        def fetch(connection: sqlite3.Connection) -> List[Dict[str, Any]]:
+            cursor = connection.execute(f"""
+                SELECT p.id, k.title, p.content
+                FROM knowledge_passages p JOIN knowledge_items k ON k.id = p.item_id
+                WHERE {STALE_EMBEDDING_CONDITION}
+                ORDER BY p.id
+                LIMIT ?
+            """, (model_name, limit))
+            return [
+                {"id": row["id"], "text": self._document_text(row["title"], row["content"])}
+                for row in cursor.fetchall()
+            ]
+        
+        return await self.db.read(fetch)
+    
+    async def update_passage_embeddings(self, passage_ids: List[int], embeddings: np.ndarray, model_name: str):
+        """
+        Guardar embeddings de pasajes en una sola transacción y agregarlos al índice
+        
+        Args:
+            passage_ids: Ids de los pasajes
+            embeddings: Matriz (n, d) de embeddings
+            model_name: Modelo con el que se codificaron
+        """
+        now = utc_timestamp()
+        
+        def update(connection: sqlite3.Connection) -> List[Tuple[int, str]]:
+            connection.executemany(
+                "UPDATE knowledge_passages SET embedding = ?, embedding_model = ?, updated_at = ? WHERE id = ?",
+                [(encode_embedding(emb), model_name, now, passage_id)
+                 for passage_id, emb in zip(passage_ids, embeddings)]
+            )
+            placeholders = ",".join("?" for _ in passage_ids)
+            return connection.execute(f"""
+                SELECT p.id, k.category
+                FROM knowledge_passages p JOIN knowledge_items k ON k.id = p.item_id
+                WHERE p.id IN ({placeholders})
+            """, list(passage_ids)).fetchall()
+        
+        rows = await self.db.write(update)
+        # Los pasajes borrados entre la lectura y la escritura no entran al índice
+        existing = {row[0] for row in rows}
+        keep = [i for i, passage_id in enumerate(passage_ids) if passage_id in existing]
+        if not keep:
+            return
+        if len(keep) < len(passage_ids):
+            passage_ids = [passage_ids[i] for i in keep]
+            embeddings = np.asarray(embeddings)[keep]
+        self.vector_index.add(passage_ids, embeddings)
+        self._add_to_partitions([(row[0], row[1]) for row in rows])
+        self._index_dirty = True
+        
+        # Índice de dos etapas: reajustar la proyección si el corpus derivó
+        if self.vector_index_type == "pca" and self.vector_index.needs_refit():
+            await asyncio.to_thread(self.vector_index.refit)
+        
+        # Índice int8: el rango ajustado ya no cubre los vectores nuevos. Los
+        # códigos saturados no conservan el valor original, así que se
+        # reconstruye desde la base; en el escritor serializado, para que
+        # ninguna escritura confirmada quede fuera ni se pierda un add posterior
+        if self.vector_index_type == "int8" and self.vector_index.needs_refit():
+            clipped = self.vector_index.clipped_fraction()
+            await self.db.write(self._rebuild_from_database)
+            self.logger.info(f"Rango del índice int8 reajustado ({clipped:.1%} de componentes saturados)")
+    
+    def _create_vector_index(self):
+        """Crear el índice vectorial configurado en VECTOR_INDEX (flat, ivf, int8 o pca)"""
+        if self.vector_index_type == "ivf":
+            return IVFFlatIndex(
+                nlist=int(os.getenv("IVF_NLIST", 0)),
+                nprobe=int(os.getenv("IVF_NPROBE", 8)),
+                retrain_ratio=float(os.getenv("IVF_RETRAIN_RATIO", 2.0)),
+                exact_candidates=int(os.getenv("IVF_EXACT_CANDIDATES", 2048))
+            )
+        if self.vector_index_type == "int8":
+            return QuantizedVectorIndex(clip_tolerance=float(os.getenv("INT8_CLIP_TOLERANCE", 0.01)))
+        if self.vector_index_type == "pca":
+            return TwoStageIndex(
+                components=int(os.getenv("PCA_DIM", 96)),
+                candidates=int(os.getenv("PCA_CANDIDATES", 256))
+            )
+        if self.vector_index_type != "flat":
+            raise ValueError(f"Tipo de índice vectorial desconocido: {self.vector_index_type}")
+        return VectorIndex()
+    
+    def _create_embedding_store(self) -> Optional[MmapEmbeddingStore]:
+        """Crear el almacén mapeado en memoria si EMBEDDING_STORE=mmap (solo índice flat)"""
+        if os.getenv("EMBEDDING_STORE", "memory") != "mmap":
+            return None
+        if self.vector_index_type != "flat":
+            self.logger.warning("EMBEDDING_STORE=mmap solo aplica al índice flat; se ignora")
+            return None
+        
+        return MmapEmbeddingStore(
+            os.getenv("EMBEDDING_STORE_PATH", f"{os.path.splitext(self.db_path)[0]}.emb"),
+            refresh_interval=float(os.getenv("EMBEDDING_STORE_REFRESH", 5))
+        )
+    
+    async def _attach_embedding_store(self):
+        """
+        Mapear el archivo de embeddings compartido como base del índice
+        
+        Solo un proceso a la vez (bloqueo de archivo) reexporta el archivo si no
+        corresponde a la base de datos; el resto solo lee la cabecera y mapea
+        el archivo publicado.
+        """
+        await self.db.read(self._publish_embedding_store)
+        
+        ids, matrix = self.embedding_store.open()
+        self.vector_index.attach(ids, matrix)
+    
+    def _publish_embedding_store(self, connection: sqlite3.Connection) -> bool:
+        """
+        Reexportar el archivo compartido (con bloqueo entre procesos) si está desactualizado
+        
+        Returns:
+            True si se publicó un archivo nuevo
+        """
+        with self.embedding_store.lock():
+            fingerprint = self._index_fingerprint(connection)
+            if self.embedding_store.matches(fingerprint):
+                return False
+            self._export_embedding_store(connection, fingerprint)
+            return True
+    
+    def owns_embedding_backfill(self) -> bool:
+        """
+        Verificar si este proceso debe completar los embeddings
+        
+        Con el almacén compartido solo el worker que obtiene el bloqueo de
+        dueño ejecuta el backfill y republica el archivo; los demás lo
+        vuelven a mapear al detectar el cambio. Sin almacén, siempre.
+        """
+        return self.embedding_store is None or self.embedding_store.try_acquire_owner()
+    
+    async def publish_embeddings(self):
+        """
+        Republicar el archivo compartido con los embeddings nuevos (tras cada pasada del backfill)
+        
+        El segmento en memoria de este proceso queda incluido en el archivo y
+        se descarta.
+        """
+        if self.embedding_store is None or not self._vector_index_loaded:
+            return
+        
+        if await self.db.read(self._publish_embedding_store):
+            ids, matrix = self.embedding_store.open()
+            self.vector_index.attach(ids, matrix, keep_delta=False)
+            self._index_dirty = False
+    
+    def _export_embedding_store(self, connection: sqlite3.Connection, fingerprint: str, batch_size: int = 1000):
+        """Volcar los embeddings normalizados, ordenados por id, al archivo compartido"""
+        cursor = connection.cursor()
+        count = cursor.execute(
+            "SELECT COUNT(*) FROM knowledge_passages WHERE embedding IS NOT NULL"
+        ).fetchone()[0]
+        first = cursor.execute(
+            "SELECT embedding FROM knowledge_passages WHERE embedding IS NOT NULL LIMIT 1"
+        ).fetchone()
+        dimension = len(decode_embedding(first[0])) if first else self.vector_index.dimension
+        
+        with self.embedding_store.writer(count, dimension, fingerprint) as (ids, matrix):
+            cursor.execute(
+                "SELECT id, embedding FROM knowledge_passages WHERE embedding IS NOT NULL ORDER BY id"
+            )
+            position = 0
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                end = position + len(rows)
+                ids[position:end] = [row[0] for row in rows]
+                matrix[position:end] = VectorIndex.normalize(
+                    np.stack([decode_embedding(row[1]) for row in rows])
+                )
+                position = end
+    
+    def _refresh_embedding_store(self) -> bool:
+        """Volver a mapear el archivo compartido si otro proceso publicó uno nuevo"""
+        if self.embedding_store is not None and self.embedding_store.has_changed():
+            ids, matrix = self.embedding_store.open()
+            self.vector_index.attach(ids, matrix)
+            return True
+        return False
+    
+    def restore_snapshot(self, path: str, attachments: Optional[Dict[str, str]] = None,
+                         force: bool = False) -> bool:
+        """
+        Restaurar la base, el índice y los adjuntos desde un snapshot (antes de initialize)
+        
+        Solo se sobrescribe la base si no existe o con force=True. En ambos
+        casos el snapshot queda asociado: si su huella coincide con la base,
+        initialize mapea su matriz de embeddings en lugar de decodificarla.
+        
+        Args:
+            path: Ruta del archivo de snapshot
+            attachments: Destino de las secciones adicionales por nombre
+                (p. ej. {"classifier": ruta del modelo})
+            force: Sobrescribir la base existente
+        
+        Returns:
+            True si se restauraron los archivos
+        """
+        if self.db.is_open():
+            raise RuntimeError("El snapshot se restaura antes de abrir la base de datos")
+        
+        snapshot = SnapshotFile(path)
+        manifest = snapshot.manifest()
+        if manifest is None:
+            self.logger.warning(f"Snapshot no válido o inexistente: {path}")
+            return False
+        self._snapshot = snapshot
+        
+        if os.path.exists(self.db_path) and not force:
+            return False
+        
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(self.db_path + suffix):
+                os.remove(self.db_path + suffix)
+        snapshot.extract("database", self.db_path)
+        if snapshot.has("vector_index") and manifest["vector_index"] == self.vector_index_type:
+            snapshot.extract("vector_index", self.vector_index_path)
+        for name, destination in (attachments or {}).items():
+            if snapshot.has(name):
+                snapshot.extract(name, destination)
+        
+        self.logger.info(f"Snapshot restaurado desde {path} (creado {manifest['created_at']})")
+        return True
+    
+    async def export_snapshot(self, path: str, attachments: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """
+        Exportar la base a un snapshot de un solo archivo
+        
+        La base se copia con la API de backup de SQLite; la huella, la matriz
+        de embeddings y el índice vectorial se derivan de esa copia, por lo
+        que son consistentes entre sí aunque haya escrituras concurrentes.
+        
+        Args:
+            path: Ruta del archivo de snapshot
+            attachments: Archivos adicionales por nombre de sección (p. ej. el clasificador)
+        
+        Returns:
+            Manifiesto del snapshot escrito
+        """
+        tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            database_copy = os.path.join(tmp_dir, "knowledge_base.db")
+            
+            def backup(connection: sqlite3.Connection):
+                target = sqlite3.connect(database_copy)
+                try:
+                    connection.backup(target)
+                finally:
+                    target.close()
+            
+            await self.db.read(backup)
+            return await asyncio.to_thread(self._write_snapshot, path, database_copy, tmp_dir, attachments or {})
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    
+    def _write_snapshot(self, path: str, database_copy: str, tmp_dir: str,
+                        attachments: Dict[str, str]) -> Dict[str, Any]:
+        """Derivar embeddings e índice de la copia de la base y escribir el snapshot"""
+        connection = sqlite3.connect(database_copy)
+        connection.row_factory = sqlite3.Row
+        try:
+            fingerprint = self._index_fingerprint(connection)
+            schema_version = connection.execute("PRAGMA user_version").fetchone()[0]
+            models = [row[0] for row in connection.execute(
+                "SELECT DISTINCT embedding_model FROM knowledge_passages WHERE embedding IS NOT NULL"
+            )]
+            rows = connection.execute(
+                "SELECT id, embedding FROM knowledge_passages WHERE embedding IS NOT NULL ORDER BY id"
+            ).fetchall()
+        finally:
+            connection.close()
+        
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        matrix = (VectorIndex.normalize(np.stack([decode_embedding(row[1]) for row in rows]))
+                  if rows else np.zeros((0, 0), dtype=np.float32))
+        sections: Dict[str, Any] = {"database": database_copy, "ids": ids, "embeddings": matrix}
+        
+        # Índice persistente reconstruido desde la misma matriz (p. ej. centroides IVF)
+        index = self._create_vector_index()
+        if rows and hasattr(index, "save"):
+            index_path = os.path.join(tmp_dir, "vector_index.npz")
+            index.build(ids, matrix)
+            index.save(index_path, fingerprint)
+            sections["vector_index"] = index_path
+        
+        for name, source in attachments.items():
+            if os.path.exists(source):
+                sections[name] = source
+        
+        manifest = {
+            "schema_version": schema_version,
+            "fingerprint": fingerprint,
+            "vector_index": self.vector_index_type,
+            "embedding_models": models,
+            "passages": len(ids),
+            "dimension": int(matrix.shape[1])
+        }
+        SnapshotFile(path).write(manifest, sections)
+        self.logger.info(f"Snapshot exportado en {path} ({len(ids)} pasajes)")
+        return SnapshotFile(path).manifest()
+    
+    def _vector_index_persistent(self) -> bool:
+        """Verificar si el índice configurado se persiste en disco"""
+        return hasattr(self.vector_index, "save")
+    
+    def _index_fingerprint(self, connection: sqlite3.Connection) -> str:
+        """Huella de los embeddings de pasajes para validar el índice en disco"""
+        cursor = connection.cursor()
         cursor.execute("""
-            INSERT INTO knowledge_items (title, content, category, embedding, updated_at)
-            VALUES (?, ?, ?, ?, ?)
-        """, (title, content, category, embedding_json, datetime.now()))
+            SELECT COUNT(*), MAX(id), MAX(updated_at)
+            FROM knowledge_passages WHERE embedding IS NOT NULL
+        """)
+        count, max_id, max_updated = cursor.fetchone()
+        return f"{count}:{max_id}:{max_updated}"
+    
+    async def close(self):
+        """Persistir el índice vectorial pendiente y cerrar la conexión"""
+        if not self.db.is_open():
+            return
         
-        self.connection.commit()
-        return cursor.lastrowid
+        if self._index_dirty and self._vector_index_persistent():
+            fingerprint = await self.db.read(self._index_fingerprint)
+            self.vector_index.save(self.vector_index_path, fingerprint)
+            self._index_dirty = False
+        
+        if self._index_dirty and self.embedding_store is not None:
+            # Publicar los cambios para los demás workers
+            await self.db.read(self._publish_embedding_store)
+            self._index_dirty = False
+        
+        if self.embedding_store is not None:
+            self.embedding_store.release_owner()
+        
+        await self.db.close()
+    
+    @staticmethod
+    def _row_to_item(row: sqlite3.Row) -> Dict[str, Any]:
+        """Convertir una fila a diccionario con el embedding como lista"""
+        item = dict(row)
+        if item.get('embedding'):
+            item['embedding'] = decode_embedding(item['embedding']).tolist()
+        return item
+    
+    async def add_item(self, title: str, content: str, category: str, embedding: Optional[List[float]] = None) -> int:
+        """
+        Agregar nuevo elemento a la base de conocimiento
+        
+        El contenido se fragmenta en pasajes; sus embeddings los calcula
+        EmbeddingBackfillWorker en segundo plano. Si es casi idéntico a un
+        documento existente se aplica DEDUP_POLICY: 'reject' lanza
+        DuplicateItemError, 'merge' reemplaza el existente con esta versión
+        (y devuelve su id) y 'link' lo inserta enlazado al original.
+        """
+        embedding_blob = encode_embedding(embedding) if embedding is not None else None
+        signature = self.minhasher.signature(content)
+        
+        def insert(connection: sqlite3.Connection) -> Tuple[int, List[int]]:
+            cursor = connection.cursor()
+            now = utc_timestamp()
+            duplicate = self._find_duplicate(connection, signature) if self.dedup_policy != "off" else None
+            
+            if duplicate and self.dedup_policy == "reject":
+                raise DuplicateItemError(*duplicate)
+            
+            if duplicate and self.dedup_policy == "merge":
+                item_id = duplicate[0]
+                # El trigger de actualización elimina los pasajes anteriores
+                stale_passages = self._indexed_passage_ids(connection, [item_id])
+                cursor.execute("""
+                    UPDATE knowledge_items
+                    SET title = ?, content = ?, category = ?, embedding = ?, updated_at = ?
+                    WHERE id = ?
+                """, (title, content, category, embedding_blob, now, item_id))
+                self._insert_passages(cursor, item_id, content)
+                self._store_signature(cursor, item_id, signature)
+                return item_id, stale_passages
+            
+            cursor.execute("""
+                INSERT INTO knowledge_items (title, content, category, embedding, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, (title, content, category, embedding_blob, now))
+            item_id = cursor.lastrowid
+            self._insert_passages(cursor, item_id, content)
+            self._store_signature(cursor, item_id, signature)
+            if duplicate:
+                cursor.execute(
+                    "INSERT INTO item_duplicates (item_id, duplicate_of, similarity) VALUES (?, ?, ?)",
+                    (item_id, duplicate[0], duplicate[1])
+                )
+            return item_id, []
+        
+        item_id, stale_passages = await self.db.write(insert)
+        self._remove_from_index(stale_passages)
+        self._register_category(category)
+        return item_id
+    
+    def _bulk_duplicates(self, connection: sqlite3.Connection,
+                         signatures: List[np.ndarray]) -> List[Optional[Tuple[Tuple[str, int], float]]]:
+        """
+        Casi duplicados de cada documento de una carga, en orden
+        
+        Cada documento se compara con la base (_find_duplicate) y con los
+        anteriores de la misma carga que se conservan, a través de buckets LSH
+        en memoria. Con la política 'merge' el documento sustituye a su
+        original, así que los siguientes se comparan con su firma.
+        
+        Returns:
+            Por documento, (original, similitud) o None; el original es
+            ('item', id) en la base o ('batch', posición) en la carga
+        """
+        kept: Dict[Tuple[str, int], np.ndarray] = {}
+        buckets: Dict[int, Set[Tuple[str, int]]] = {}
+        duplicates = []
+        
+        for position, signature in enumerate(signatures):
+            keys = self.minhasher.band_keys(signature)
+            best = None
+            candidates = {
+                target for key in keys
+                if len(buckets.get(key, ())) <= self.dedup_max_bucket_size
+                for target in buckets.get(key, ())
+            }
+            for target in candidates:
+                similarity = MinHasher.similarity(signature, kept[target])
+                if similarity >= self.dedup_threshold and (best is None or similarity > best[1]):
+                    best = (target, similarity)
+            
+            stored = self._find_duplicate(connection, signature)
+            if stored and (best is None or stored[1] > best[1]):
+                best = (("item", stored[0]), stored[1])
+            duplicates.append(best)
+            
+            if best is None or self.dedup_policy == "link":
+                target = ("batch", position)
+            elif self.dedup_policy == "merge":
+                target = best[0]
+            else:
+                continue
+            kept[target] = signature
+            for key in keys:
+                buckets.setdefault(key, set()).add(target)
+        return duplicates
+    
+    async def add_items_bulk(self, items: List[Dict[str, str]]) -> Dict[str, Any]:
+        """
+        Agregar varios elementos y sus pasajes en una sola transacción
+        
+        Los casi duplicados (de la base o de la propia carga) siguen
+        DEDUP_POLICY igual que en add_item: 'reject' los descarta, 'merge'
+        reemplaza el original con la versión más reciente y 'link' los
+        inserta enlazados al original.
+        
+        Args:
+            items: Lista de diccionarios con 'title', 'content' y 'category'
+        
+        Returns:
+            'ids': id de cada elemento, en el mismo orden (el asignado, el del
+            original con 'merge' o None si se descartó con 'reject'), y los
+            totales 'inserted' (filas nuevas), 'merged', 'linked' y 'rejected'
+        """
+        outcome: Dict[str, Any] = {"ids": [], "inserted": 0, "merged": 0, "linked": 0, "rejected": 0}
+        if not items:
+            return outcome
+        
+        # Fragmentar y firmar antes de tomar el escritor para no retenerlo
+        passages = [self.chunker.split(item["content"]) for item in items]
+        signatures = [self.minhasher.signature(item["content"]) for item in items]
+        
+        def insert(connection: sqlite3.Connection) -> List[int]:
+            cursor = connection.cursor()
+            # Bloqueo de escritura inmediato: los ids AUTOINCREMENT quedan contiguos
+            cursor.execute("BEGIN IMMEDIATE")
+            row = cursor.execute(
+                "SELECT seq FROM sqlite_sequence WHERE name = 'knowledge_items'"
+            ).fetchone()
+            max_id = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM knowledge_items").fetchone()[0]
+            first_id = max(row[0] if row else 0, max_id) + 1
+            
+            if self.dedup_policy != "off":
+                duplicates = self._bulk_duplicates(connection, signatures)
+            else:
+                duplicates = [None] * len(items)
+            
+            # Versión que se guarda para cada documento nuevo o reemplazado
+            versions: Dict[Tuple[str, int], int] = {}
+            for position, duplicate in enumerate(duplicates):
+                if duplicate is None or self.dedup_policy == "link":
+                    versions[("batch", position)] = position
+                elif self.dedup_policy == "merge":
+                    versions[duplicate[0]] = position
+            
+            new_items = [key[1] for key in versions if key[0] == "batch"]
+            ids = {("batch", original): first_id + offset for offset, original in enumerate(new_items)}
+            
+            def item_id(key: Tuple[str, int]) -> int:
+                return key[1] if key[0] == "item" else ids[key]
+            
+            now = utc_timestamp()
+            cursor.executemany(
+                "INSERT INTO knowledge_items (title, content, category, updated_at) VALUES (?, ?, ?, ?)",
+                [
+                    (item["title"], item["content"], item["category"], now)
+                    for item in (items[versions[("batch", original)]] for original in new_items)
+                ]
+            )
+            
+            stale_passages = []
+            merged = [key for key in versions if key[0] == "item"]
+            if merged:
+                stale_passages = self._indexed_passage_ids(connection, [key[1] for key in merged])
+                # El trigger de actualización elimina los pasajes anteriores
+                cursor.executemany(
+                    "UPDATE knowledge_items SET title = ?, content = ?, category = ?, embedding = NULL, "
+                    "updated_at = ? WHERE id = ?",
+                    [
+                        (items[versions[key]]["title"], items[versions[key]]["content"],
+                         items[versions[key]]["category"], now, key[1])
+                        for key in merged
+                    ]
+                )
+            
+            cursor.executemany(
+                "INSERT INTO knowledge_passages (item_id, ordinal, heading, content) VALUES (?, ?, ?, ?)",
+                [
+                    (item_id(key), p["ordinal"], p["heading"], p["content"])
+                    for key, position in versions.items()
+                    for p in passages[position]
+                ]
+            )
+            for key, position in versions.items():
+                self._store_signature(cursor, item_id(key), signatures[position])
+            
+            if self.dedup_policy == "link":
+                cursor.executemany(
+                    "INSERT INTO item_duplicates (item_id, duplicate_of, similarity) VALUES (?, ?, ?)",
+                    [
+                        (ids[("batch", position)], item_id(duplicate[0]), duplicate[1])
+                        for position, duplicate in enumerate(duplicates) if duplicate is not None
+                    ]
+                )
+            
+            item_ids: List[Optional[int]] = []
+            for position, duplicate in enumerate(duplicates):
+                if duplicate is None or self.dedup_policy == "link":
+                    item_ids.append(ids[("batch", position)])
+                elif self.dedup_policy == "merge":
+                    item_ids.append(item_id(duplicate[0]))
+                else:
+                    item_ids.append(None)
+            outcome["ids"] = item_ids
+            outcome["inserted"] = len(new_items)
+            counted = {"merge": "merged", "link": "linked", "reject": "rejected"}.get(self.dedup_policy)
+            if counted:
+                outcome[counted] = sum(1 for duplicate in duplicates if duplicate is not None)
+            return stale_passages
+        
+        self._remove_from_index(await self.db.write(insert))
+        for category in {item["category"] for item in items}:
+            self._register_category(category)
+        return outcome
+    
+    def _duplicate_pairs(self, connection: sqlite3.Connection, threshold: float) -> List[Tuple[int, int, float]]:
+        """
+        Casi duplicados entre los documentos que comparten algún bucket LSH
+        
+        Los pares que superan el umbral se agrupan transitivamente; el
+        original de cada grupo es su documento más antiguo (menor id). Los
+        buckets con más de DEDUP_MAX_BUCKET_SIZE documentos se omiten para
+        no generar un número cuadrático de pares.
+        
+        Returns:
+            Lista de (id duplicado, id original, similitud estimada)
+        """
+        oversized = connection.execute("""
+            SELECT COUNT(*) FROM (
+                SELECT bucket FROM item_lsh_buckets GROUP BY bucket HAVING COUNT(*) > ?
+            )
+        """, (self.dedup_max_bucket_size,)).fetchone()[0]
+        if oversized:
+            self.logger.warning(
+                f"Deduplicación: {oversized} buckets LSH con más de {self.dedup_max_bucket_size} documentos omitidos"
+            )
+        
+        shared = f"""
+            SELECT bucket FROM item_lsh_buckets GROUP BY bucket
+            HAVING COUNT(*) > 1 AND COUNT(*) <= {self.dedup_max_bucket_size:d}
+        """
+        pairs = set()
+        for (members,) in connection.execute(
+            f"SELECT GROUP_CONCAT(item_id) FROM item_lsh_buckets WHERE bucket IN ({shared}) GROUP BY bucket"
+        ):
+            pairs.update(itertools.combinations(sorted({int(i) for i in members.split(",")}), 2))
+        if not pairs:
+            return []
+        
+        signatures = {
+            row[0]: MinHasher.from_blob(row[1]) for row in connection.execute(f"""
+                SELECT item_id, signature FROM item_signatures
+                WHERE item_id IN (SELECT item_id FROM item_lsh_buckets WHERE bucket IN ({shared}))
+            """)
+        }
+        
+        parent: Dict[int, int] = {}
+        
+        def find(item_id: int) -> int:
+            root = item_id
+            while parent.get(root, root) != root:
+                root = parent[root]
+            while item_id != root:
+                parent[item_id], item_id = root, parent[item_id]
+            return root
+        
+        for first, second in pairs:
+            if MinHasher.similarity(signatures[first], signatures[second]) < threshold:
+                continue
+            first_root, second_root = find(first), find(second)
+            if first_root != second_root:
+                parent[max(first_root, second_root)] = min(first_root, second_root)
+        
+        duplicates = []
+        for item_id in sorted(parent):
+            root = find(item_id)
+            if root != item_id:
+                duplicates.append((item_id, root, MinHasher.similarity(signatures[item_id], signatures[root])))
+        return duplicates
+    
+    async def deduplicate(self, action: str = "link", threshold: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Buscar casi duplicados en toda la base (tarea por lotes)
+        
+        Args:
+            action: 'link' registra cada duplicado junto a su original;
+                'delete' elimina los duplicados y conserva el original
+            threshold: Similitud de Jaccard estimada mínima (por defecto DEDUP_THRESHOLD)
+        
+        Returns:
+            Reporte con firmas calculadas, grupos y duplicados encontrados
+        """
+        if action not in ("link", "delete"):
+            raise ValueError(f"Acción de deduplicación desconocida: {action}")
+        threshold = self.dedup_threshold if threshold is None else threshold
+        
+        computed = await self.db.write(self._backfill_signatures)
+        duplicates = await self.db.read(self._duplicate_pairs, threshold)
+        
+        def apply(connection: sqlite3.Connection) -> List[int]:
+            if action == "link":
+                connection.executemany(
+                    "INSERT OR REPLACE INTO item_duplicates (item_id, duplicate_of, similarity) VALUES (?, ?, ?)",
+                    duplicates
+                )
+                return []
+            
+            stale_passages = []
+            for item_id, _, _ in duplicates:
+                stale_passages.extend(self._indexed_passage_ids(connection, [item_id]))
+                connection.execute("DELETE FROM knowledge_items WHERE id = ?", (item_id,))
+            return stale_passages
+        
+        if duplicates:
+            self._remove_from_index(await self.db.write(apply))
+            self.logger.info(f"Deduplicación ({action}): {len(duplicates)} casi duplicados")
+        
+        return {
+            "action": action,
+            "threshold": threshold,
+            "signatures_computed": computed,
+            "groups": len({original for _, original, _ in duplicates}),
+            "duplicates": len(duplicates),
+            "pairs": [
+                {"item_id": item_id, "duplicate_of": original, "similarity": round(similarity, 4)}
+                for item_id, original, similarity in duplicates[:100]
+            ]
+        }
+    
+    async def get_passages_for_items(self, item_ids: List[int]) -> List[Dict[str, Any]]:
+        """Obtener los pasajes de varios elementos con el texto a codificar"""
+        if not item_ids:
+            return []
+        
+        def fetch(connection: sqlite3.Connection) -> List[Dict[str, Any]]:
+            placeholders = ",".join("?" for _ in item_ids)
+            cursor = connection.execute(f"""
+                SELECT p.id, k.title, p.content
+                FROM knowledge_passages p JOIN knowledge_items k ON k.id = p.item_id
+                WHERE p.item_id IN ({placeholders})
+                ORDER BY p.id
+            """, list(item_ids))
+            return [
+                {"id": row["id"], "text": self._document_text(row["title"], row["content"])}
+                for row in cursor.fetchall()
+            ]
+        
+        return await self.db.read(fetch)
+    
+    def _fetch_rows(self, connection: sqlite3.Connection, sql: str, params: Tuple = ()) -> List[Dict[str, Any]]:
+        """Ejecutar una consulta y convertir las filas con _row_to_item"""
+        return [self._row_to_item(row) for row in connection.execute(sql, params).fetchall()]
     
     async def get_all_items(self) -> List[Dict[str, Any]]:
         """Obtener todos los elementos de la base de conocimiento"""
-        cursor = self.connection.cursor()
-        cursor.execute("SELECT * FROM knowledge_items ORDER BY updated_at DESC")
+        return await self.db.read(
+            self._fetch_rows, "SELECT * FROM knowledge_items ORDER BY updated_at DESC"
+        )
+    
+    @staticmethod
+    def _encode_cursor(updated_at: str, item_id: int) -> str:
+        """Codificar la posición (updated_at, id) como cursor opaco"""
+        raw = json.dumps([updated_at, item_id]).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii")
+    
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Tuple[str, int]:
+        """Decodificar un cursor generado por _encode_cursor"""
+        try:
+            updated_at, item_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+            return str(updated_at), int(item_id)
+        except Exception:
+            raise ValueError("Cursor de paginación inválido")
+    
+    async def list_items(self, limit: int = 100, cursor: Optional[str] = None,
+                         fields: Optional[List[str]] = None, category: Optional[str] = None,
+                         updated_after: Optional[datetime] = None,
+                         updated_before: Optional[datetime] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Listar elementos con paginación por cursor (keyset) sobre (updated_at, id)
         
-        items = []
-        for row in cursor.fetchall():
-            item = dict(row)
-            if item['embedding']:
-                item['embedding'] = json.loads(item['embedding'])
-            items.append(item)
+        Args:
+            limit: Tamaño de página
+            cursor: Cursor devuelto por la página anterior
+            fields: Columnas a incluir (por defecto todas excepto 'embedding')
+            category: Filtrar por categoría
+            updated_after: Solo elementos actualizados desde esta fecha (inclusive;
+                sin zona horaria se interpreta como UTC)
+            updated_before: Solo elementos actualizados antes de esta fecha
+            
+        Returns:
+            (elementos de la página, cursor de la siguiente página o None)
+        """
+        fields = list(fields or DEFAULT_ITEM_FIELDS)
+        unknown = [field for field in fields if field not in ITEM_FIELDS]
+        if unknown:
+            raise ValueError(f"Campos desconocidos: {', '.join(unknown)}")
         
-        return items
+        # id y updated_at siempre se leen para construir el cursor
+        columns = list(dict.fromkeys(fields + ["id", "updated_at"]))
+        
+        conditions = []
+        params: List[Any] = []
+        if category:
+            conditions.append("category = ?")
+            params.append(category)
+        if updated_after:
+            conditions.append("updated_at >= ?")
+            params.append(utc_timestamp(updated_after))
+        if updated_before:
+            conditions.append("updated_at < ?")
+            params.append(utc_timestamp(updated_before))
+        if cursor:
+            conditions.append("(updated_at, id) < (?, ?)")
+            params.extend(self._decode_cursor(cursor))
+        
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        sql = f"""
+            SELECT {', '.join(columns)} FROM knowledge_items
+            {where}
+            ORDER BY updated_at DESC, id DESC
+            LIMIT ?
+        """
+        
+        rows = await self.db.read(self._fetch_rows, sql, tuple(params + [limit + 1]))
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = self._encode_cursor(rows[-1]["updated_at"], rows[-1]["id"]) if has_more else None
+        
+        items = [{field: row[field] for field in fields} for row in rows]
+        
+        return items, next_cursor
+    
+    async def stream_items(self, page_size: int = 1000, **filters) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Recorrer todos los elementos página a página (memoria acotada)
+        
+        Args:
+            page_size: Filas leídas por consulta
+            **filters: Mismos filtros y proyección que list_items
+        """
+        cursor = None
+        while True:
+            items, cursor = await self.list_items(limit=page_size, cursor=cursor, **filters)
+            for item in items:
+                yield item
+            if cursor is None:
+                break
     
     async def get_items_by_category(self, category: str) -> List[Dict[str, Any]]:
         """Obtener elementos por categoría"""
-        cursor = self.connection.cursor()
-        cursor.execute(
+        return await self.db.read(
+            self._fetch_rows,
             "SELECT * FROM knowledge_items WHERE category = ? ORDER BY updated_at DESC",
             (category,)
         )
+    
+    async def search_similar(self, query: str, top_k: int = 3, mode: Optional[str] = None,
+                             categories: Optional[List[str]] = None,
+                             diversify: bool = False) -> List[Dict[str, Any]]:
+        """
+        Buscar elementos similares a una consulta
+        
+        Args:
+            query: Consulta de búsqueda
+            top_k: Número de elementos a retornar
+            mode: "semantic" (índice vectorial), "lexical" (FTS5 + BM25),
+                  "hybrid" (léxica + semántica con fusión de rankings) o
+                  "keyword" (texto simple); por defecto se usa SEARCH_MODE
+            categories: Buscar primero en estas particiones (nombres de categoría
+                o etiquetas del clasificador); si devuelven menos de top_k
+                resultados o el mejor no alcanza ROUTING_MIN_SCORE, se busca
+                en toda la base
+            diversify: Elegir los top_k entre MMR_CANDIDATES candidatos con
+                Maximal Marginal Relevance para no repetir documentos casi
+                idénticos (modos semantic e hybrid)
+        
+        Returns:
+            Lista de elementos con 'similarity_score'
+        """
+        mode = mode or self.search_mode
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Modo de búsqueda desconocido: {mode}")
+        
+        if self._refresh_embedding_store():
+            self._set_partitions(await self.db.read(self._load_partitions))
+        
+        categories = self._resolve_categories(categories)
+        results = await self._search_mode(query, top_k, mode, categories, diversify)
+        if categories is not None and self._weak_routed_results(results, top_k):
+            self.logger.debug(f"Partición {categories} insuficiente, se busca en toda la base")
+            results = await self._search_mode(query, top_k, mode, None, diversify)
+        return results
+    
+    def _weak_routed_results(self, results: List[Dict[str, Any]], top_k: int) -> bool:
+        """Verificar si la búsqueda en la partición enrutada no es suficiente"""
+        if not results or len(results) < top_k:
+            return True
+        return max(item.get('similarity_score', 0.0) for item in results) < self.routing_min_score
+    
+    async def _search_mode(self, query: str, top_k: int, mode: str, categories: Optional[List[str]],
+                           diversify: bool) -> List[Dict[str, Any]]:
+        """Ejecutar la búsqueda del modo pedido (o el disponible más cercano)"""
+        semantic_ready = self._semantic_search_available() and not self.vector_index.is_empty()
+        
+        if mode == "hybrid" and semantic_ready and self.fts_available:
+            return await self._search_hybrid(query, top_k, categories, diversify)
+        
+        if mode in ("semantic", "hybrid") and semantic_ready:
+            return await self._search_semantic(query, top_k, categories, diversify)
+        
+        if mode in ("semantic", "lexical", "hybrid") and self.fts_available:
+            return await self._search_lexical(query, top_k, categories)
+        
+        return await self._search_keyword(query, top_k)
+    
+    def _fetch_items(self, connection: sqlite3.Connection, ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Obtener elementos por id (sin embedding) indexados por id"""
+        if not ids:
+            return {}
+        
+        cursor = connection.cursor()
+        placeholders = ",".join("?" for _ in ids)
+        cursor.execute(
+            f"""SELECT id, title, content, category, created_at, updated_at
+                FROM knowledge_items WHERE id IN ({placeholders})""",
+            list(ids)
+        )
+        return {row["id"]: dict(row) for row in cursor.fetchall()}
+    
+    def _fetch_passages(self, connection: sqlite3.Connection, ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Obtener pasajes por id (sin embedding) indexados por id"""
+        if not ids:
+            return {}
+        
+        cursor = connection.cursor()
+        placeholders = ",".join("?" for _ in ids)
+        cursor.execute(
+            f"""SELECT id, item_id, ordinal, heading, content
+                FROM knowledge_passages WHERE id IN ({placeholders})""",
+            list(ids)
+        )
+        return {row["id"]: dict(row) for row in cursor.fetchall()}
+    
+    async def _encode_query(self, query: str) -> np.ndarray:
+        """Codificar la consulta en el próximo micro-lote (o en el pool de inferencia si no hay planificador)"""
+        if self.encoding_scheduler is not None:
+            return await self.encoding_scheduler.encode(query)
+        return await self.embedding_service.encode_text_async(query)
+    
+    def _rerank_exact(self, connection: sqlite3.Connection, query_embedding: np.ndarray,
+                      hits: List[Tuple[int, float]], limit: int) -> List[Tuple[int, float]]:
+        """Reordenar candidatos del índice int8 con sus embeddings float32 de la base"""
+        if not hits:
+            return []
+        
+        placeholders = ",".join("?" for _ in hits)
+        rows = connection.execute(
+            f"SELECT id, embedding FROM knowledge_passages WHERE id IN ({placeholders}) AND embedding IS NOT NULL",
+            [passage_id for passage_id, _ in hits]
+        ).fetchall()
+        if not rows:
+            return []
+        return rerank_exact(
+            query_embedding,
+            [row[0] for row in rows],
+            np.stack([decode_embedding(row[1]) for row in rows]),
+            limit
+        )
+    
+    async def _semantic_hits(self, query: str, top_k: int,
+                             categories: Optional[List[str]] = None) -> Tuple[List[Tuple[int, float]], Dict[int, Dict[str, Any]]]:
+        """
+        Top-k documentos por similitud coseno de su mejor pasaje
+        
+        Args:
+            query: Consulta de búsqueda
+            top_k: Número de documentos
+            categories: Particiones en las que buscar (None = todo el índice)
+        
+        Returns:
+            (lista de (id de documento, similitud), mejor pasaje por documento)
+        """
+        candidate_ids = self._partition_candidates(categories) if categories else None
+        limit = top_k * self.passage_oversample
+        
+        # Índice int8: más candidatos aproximados, reordenados con float32
+        rerank = self.vector_index_type == "int8" and self.quantized_rerank > 0
+        query_embedding = await self._encode_query(query)
+        passage_hits = await asyncio.to_thread(
+            self.vector_index.search, query_embedding,
+            limit * self.quantized_rerank if rerank else limit, candidate_ids=candidate_ids
+        )
+        if rerank:
+            passage_hits = await self.db.read(self._rerank_exact, query_embedding, passage_hits, limit)
+            
+        passages = await self.db.read(self._fetch_passages, [passage_id for passage_id, _ in passage_hits])
+        
+        hits = []
+        best_passages = {}
+        for passage_id, score in passage_hits:
+            passage = passages.get(passage_id)
+            if passage is None or passage["item_id"] in best_passages:
+                continue
+            best_passages[passage["item_id"]] = passage
+            hits.append((passage["item_id"], score))
+            if len(hits) == top_k:
+                break
+        
+        return hits, best_passages
+    
+    @staticmethod
+    def _apply_passage(item: Dict[str, Any], passage: Dict[str, Any]):
+        """Sustituir el contenido completo del documento por el pasaje recuperado"""
+        item['content'] = passage['content']
+        item['passage_id'] = passage['id']
+        item['passage_heading'] = passage['heading']
+    
+    @staticmethod
+    def _build_fts_query(query: str) -> str:
+        """Construir una consulta FTS5 (términos entre comillas unidos por OR)"""
+        terms = dict.fromkeys(re.findall(r"\w+", query.lower()))
+        return " OR ".join(f'"{term}"' for term in terms)
+    
+    def _lexical_hits(self, connection: sqlite3.Connection, query: str, top_k: int,
+                      categories: Optional[List[str]] = None) -> List[Tuple[int, float]]:
+        """Top-k (id, score BM25) sobre el índice FTS5, opcionalmente dentro de unas categorías"""
+        fts_query = self._build_fts_query(query)
+        if not fts_query:
+            return []
+        
+        weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+        category_filter = ""
+        params: List[Any] = [fts_query]
+        if categories:
+            category_filter = f"AND category IN ({','.join('?' for _ in categories)})"
+            params.extend(categories)
+        
+        cursor = connection.cursor()
+        cursor.execute(f"""
+            SELECT rowid, -bm25(knowledge_items_fts, {weights}) AS bm25_score
+            FROM knowledge_items_fts
+            WHERE knowledge_items_fts MATCH ? {category_filter}
+            ORDER BY bm25(knowledge_items_fts, {weights})
+            LIMIT ?
+        """, params + [top_k])
+        
+        return [(row[0], row[1]) for row in cursor.fetchall()]
+    
+    @staticmethod
+    def _bm25_similarity(bm25_score: float) -> float:
+        """Llevar un score BM25 (no acotado) al rango (0, 1) para la confianza"""
+        return bm25_score / (bm25_score + 1.0)
+    
+    def _fetch_passage_embeddings(self, connection: sqlite3.Connection,
+                                  passage_ids: List[int]) -> Dict[int, np.ndarray]:
+        """Embeddings ya calculados de los pasajes indicados, por id de pasaje"""
+        if not passage_ids:
+            return {}
+        
+        placeholders = ",".join("?" for _ in passage_ids)
+        rows = connection.execute(
+            f"SELECT id, embedding FROM knowledge_passages WHERE id IN ({placeholders}) AND embedding IS NOT NULL",
+            list(passage_ids)
+        ).fetchall()
+        return {row[0]: decode_embedding(row[1]) for row in rows}
+    
+    async def _diversify(self, hits: List[Tuple[int, float]], passages: Dict[int, Dict[str, Any]],
+                         top_k: int, normalize_scores: bool = False) -> List[Tuple[int, float]]:
+        """Elegir top_k documentos con MMR usando los embeddings de su mejor pasaje"""
+        if len(hits) <= top_k:
+            return hits
+        
+        passage_ids = {doc_id: passages[doc_id]["id"] for doc_id, _ in hits if doc_id in passages}
+        embeddings = await self.db.read(self._fetch_passage_embeddings, list(passage_ids.values()))
+        doc_embeddings = {
+            doc_id: embeddings[passage_id]
+            for doc_id, passage_id in passage_ids.items() if passage_id in embeddings
+        }
+        return maximal_marginal_relevance(hits, doc_embeddings, top_k, self.mmr_lambda, normalize_scores)
+    
+    async def diversify_results(self, docs: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        """
+        Aplicar MMR a resultados ya ordenados (p. ej. por el cross-encoder)
+        
+        La relevancia es 'rerank_score' si existe y si no 'similarity_score'
+        (normalizadas a [0, 1]); la redundancia se mide con el embedding del
+        pasaje de cada documento.
+        
+        Args:
+            docs: Documentos de search_similar, de más a menos relevante
+            top_k: Documentos a retornar
+        
+        Returns:
+            Los top_k documentos elegidos, en orden de selección
+        """
+        if len(docs) <= top_k:
+            return docs
+        
+        hits = [
+            (position, float(doc.get('rerank_score', doc.get('similarity_score', 0.0))))
+            for position, doc in enumerate(docs)
+        ]
+        passage_ids = {position: doc['passage_id'] for position, doc in enumerate(docs)
+                       if doc.get('passage_id') is not None}
+        embeddings = await self.db.read(self._fetch_passage_embeddings, list(passage_ids.values()))
+        doc_embeddings = {
+            position: embeddings[passage_id]
+            for position, passage_id in passage_ids.items() if passage_id in embeddings
+        }
+        selected = maximal_marginal_relevance(hits, doc_embeddings, top_k, self.mmr_lambda, normalize_scores=True)
+        return [docs[position] for position, _ in selected]
+    
+    async def _search_semantic(self, query: str, top_k: int, categories: Optional[List[str]] = None,
+                               diversify: bool = False) -> List[Dict[str, Any]]:
+        """Búsqueda top-k por similitud coseno sobre el índice vectorial"""
+        if diversify:
+            hits, passages = await self._semantic_hits(query, max(top_k, self.mmr_candidates), categories)
+            hits = await self._diversify(hits, passages, top_k)
+        else:
+            hits, passages = await self._semantic_hits(query, top_k, categories)
+        rows = await self.db.read(self._fetch_items, [doc_id for doc_id, _ in hits])
         
         items = []
-        for row in cursor.fetchall():
-            item = dict(row)
-            if item['embedding']:
-                item['embedding'] = json.loads(item['embedding'])
+        for doc_id, score in hits:
+            item = rows.get(doc_id)
+            if item is None:
+                continue
+            self._apply_passage(item, passages[doc_id])
+            item['similarity_score'] = score
             items.append(item)
         
         return items
     
-    async def search_similar(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+    async def _search_lexical(self, query: str, top_k: int,
+                              categories: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Búsqueda léxica sobre el índice FTS5 ordenada por BM25"""
+        hits = await self.db.read(self._lexical_hits, query, top_k, categories)
+        rows = await self.db.read(self._fetch_items, [doc_id for doc_id, _ in hits])
+        
+        items = []
+        for doc_id, score in hits:
+            item = rows.get(doc_id)
+            if item is None:
+                continue
+            item['bm25_score'] = score
+            item['similarity_score'] = self._bm25_similarity(score)
+            items.append(item)
+        
+        return items
+    
+    async def _search_hybrid(self, query: str, top_k: int, categories: Optional[List[str]] = None,
+                             diversify: bool = False) -> List[Dict[str, Any]]:
         """
-        Buscar elementos similares usando búsqueda de texto simple
-        (En implementación real se usarían embeddings)
+        Búsqueda híbrida: candidatos léxicos y semánticos en paralelo,
+        combinados por fusión de rankings antes del corte top-k
         """
-        cursor = self.connection.cursor()
+        lexical_hits, (semantic_hits, passages) = await asyncio.gather(
+            self.db.read(self._lexical_hits, query, self.hybrid_lexical_candidates, categories),
+            self._semantic_hits(query, self.hybrid_semantic_candidates, categories)
+        )
+        
+        if self.hybrid_fusion == "weighted":
+            fused = weighted_score_fusion(
+                [lexical_hits, semantic_hits],
+                [1.0 - self.hybrid_semantic_weight, self.hybrid_semantic_weight]
+            )
+        else:
+            fused = reciprocal_rank_fusion([lexical_hits, semantic_hits], k=self.hybrid_rrf_k)
+        
+        if diversify:
+            fused = await self._diversify(
+                fused[:max(top_k, self.mmr_candidates)], passages, top_k, normalize_scores=True
+            )
+        else:
+            fused = fused[:top_k]
+        lexical_scores = dict(lexical_hits)
+        semantic_scores = dict(semantic_hits)
+        rows = await self.db.read(self._fetch_items, [doc_id for doc_id, _ in fused])
+        
+        items = []
+        for doc_id, fusion_score in fused:
+            item = rows.get(doc_id)
+            if item is None:
+                continue
+            item['fusion_score'] = fusion_score
+            if doc_id in passages:
+                self._apply_passage(item, passages[doc_id])
+            if doc_id in lexical_scores:
+                item['bm25_score'] = lexical_scores[doc_id]
+            if doc_id in semantic_scores:
+                item['similarity_score'] = semantic_scores[doc_id]
+            else:
+                item['similarity_score'] = self._bm25_similarity(lexical_scores[doc_id])
+            items.append(item)
         
+        return items
+    
+    async def _search_keyword(self, query: str, top_k: int) -> List[Dict[str, Any]]:
+        """Búsqueda simple por palabras clave (respaldo sin embeddings)"""
         # Búsqueda simple por palabras clave
         search_terms = query.lower().split()
         
@@ -349,57 +2073,104 @@ Responsable: Departamento de RRHH""",
         # Agregar parámetros para el scoring
         final_params = [f"%{query.lower()}%", f"%{query.lower()}%"] + params + [top_k]
         
-        cursor.execute(sql, final_params)
-        
         items = []
-        for row in cursor.fetchall():
-            item = dict(row)
-            if item['embedding']:
-                item['embedding'] = json.loads(item['embedding'])
+        for item in await self.db.read(self._fetch_rows, sql, tuple(final_params)):
             # Simular score de similitud
             item['similarity_score'] = min(1.0, item['relevance_score'] / 3.0)
             items.append(item)
         
         return items
     
-    async def update_embeddings(self, item_id: int, embedding: List[float]):
+    async def quantization_report(self, sample_size: int = 200, top_k: int = 10) -> Dict[str, Any]:
+        """
+        Medir el recall@k de la búsqueda int8 frente a la exacta float32
+        
+        Args:
+            sample_size: Número de consultas de prueba
+            top_k: k de recall@k
+        
+        Returns:
+            Reporte de recall, latencia y memoria (ver quantized_index.recall_report)
+        """
+        def load(connection: sqlite3.Connection) -> Tuple[List[int], List[bytes]]:
+            rows = connection.execute(
+                "SELECT id, embedding FROM knowledge_passages WHERE embedding IS NOT NULL ORDER BY id"
+            ).fetchall()
+            return [row[0] for row in rows], [row[1] for row in rows]
+        
+        ids, blobs = await self.db.read(load)
+        if not ids:
+            raise ValueError("No hay embeddings de pasajes para evaluar")
+        
+        embeddings = np.stack([decode_embedding(blob) for blob in blobs])
+        return await asyncio.to_thread(
+            recall_report, np.asarray(ids, dtype=np.int64), embeddings,
+            sample_size, top_k, max(self.quantized_rerank, 1)
+        )
+    
+    async def update_embeddings(self, item_id: int, embedding: Union[List[float], np.ndarray]):
         """Actualizar embedding de un elemento"""
-        cursor = self.connection.cursor()
-        cursor.execute(
+        await self.db.write(
+            self._execute,
             "UPDATE knowledge_items SET embedding = ?, updated_at = ? WHERE id = ?",
-            (json.dumps(embedding), datetime.now(), item_id)
+            (encode_embedding(embedding), utc_timestamp(), item_id)
         )
-        self.connection.commit()
+    
+    @staticmethod
+    def _execute(connection: sqlite3.Connection, sql: str, params: Tuple = ()):
+        """Ejecutar una sentencia de escritura (para Database.write)"""
+        connection.execute(sql, params)
     
     async def log_query(self, question: str, answer: str, confidence: float, 
                        sources: List[str], classification: str):
         """Registrar consulta para análisis y mejora"""
-        cursor = self.connection.cursor()
-        cursor.execute("""
-            INSERT INTO query_history (question, answer, confidence, sources, classification)
-            VALUES (?, ?, ?, ?, ?)
-        """, (question, answer, confidence, json.dumps(sources), classification))
+        await self.log_queries([{
+            "question": question,
+            "answer": answer,
+            "confidence": confidence,
+            "sources": sources,
+            "classification": classification
+        }])
+    
+    async def log_queries(self, records: List[Dict[str, Any]]):
+        """
+        Registrar varias consultas en una sola transacción
+        
+        Args:
+            records: Diccionarios con 'question', 'answer', 'confidence', 'sources',
+                'classification' y opcionalmente 'created_at'
+        """
+        if not records:
+            return
+        
+        rows = [
+            (r["question"], r["answer"], r["confidence"], json.dumps(r["sources"]),
+             r["classification"], r.get("created_at") or utc_timestamp())
+            for r in records
+        ]
         
-        self.connection.commit()
+        def insert(connection: sqlite3.Connection):
+            connection.executemany("""
+                INSERT INTO query_history (question, answer, confidence, sources, classification, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, rows)
+        
+        await self.db.write(insert)
     
     async def get_categories(self) -> List[Dict[str, Any]]:
         """Obtener todas las categorías"""
-        cursor = self.connection.cursor()
-        cursor.execute("SELECT * FROM categories ORDER BY name")
-        
-        return [dict(row) for row in cursor.fetchall()]
+        return await self.db.read(self._fetch_rows, "SELECT * FROM categories ORDER BY name")
     
     async def get_query_history(self, limit: int = 100) -> List[Dict[str, Any]]:
         """Obtener historial de consultas"""
-        cursor = self.connection.cursor()
-        cursor.execute(
+        rows = await self.db.read(
+            self._fetch_rows,
             "SELECT * FROM query_history ORDER BY created_at DESC LIMIT ?",
             (limit,)
         )
         
         history = []
-        for row in cursor.fetchall():
-            item = dict(row)
+        for item in rows:
             if item['sources']:
                 item['sources'] = json.loads(item['sources'])
             history.append(item)
@@ -0,0 +1,156 @@
+"""
+Micro-lotes Asíncronos - Cola en proceso vaciada por lotes con plazo
+Base común del registro de consultas y del planificador de codificación
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, List, Optional, Set
+import logging
+
+class MicroBatcher:
+    """
+    Cola que entrega sus elementos a un manejador en lotes
+
+    Una tarea de fondo espera el primer elemento y sigue recogiendo hasta llenar
+    el lote o vencer el plazo contado desde ese primer elemento. Hasta
+    `concurrency` lotes se procesan a la vez; mientras no hay hueco los
+    elementos siguen acumulándose en la cola para el próximo lote.
+    """
+
+    def __init__(self, handler: Callable[[List[Any]], Awaitable[None]], max_batch_size: int,
+                 max_wait: float, max_queue: int, concurrency: int = 1,
+                 idle_timeout: float = 0.5):
+        """
+        Inicializar la cola
+
+        Args:
+            handler: Corrutina que procesa cada lote (debe gestionar sus errores)
+            max_batch_size: Elementos máximos por lote
+            max_wait: Segundos que el primer elemento de un lote espera a otros
+            max_queue: Elementos pendientes máximos
+            concurrency: Lotes procesados a la vez como máximo
+            idle_timeout: Segundos entre comprobaciones de parada con la cola vacía
+        """
+        self.handler = handler
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait)
+        self.concurrency = max(1, concurrency)
+        self.idle_timeout = idle_timeout
+        self.logger = logging.getLogger(__name__)
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+        self._in_flight: Set[asyncio.Task] = set()
+
+    def is_running(self) -> bool:
+        """Verificar si la tarea de fondo está activa"""
+        return self._task is not None and not self._task.done()
+
+    def pending(self) -> int:
+        """Elementos esperando en la cola"""
+        return self._queue.qsize()
+
+    def in_flight(self) -> int:
+        """Lotes que se están procesando"""
+        return len(self._in_flight)
+
+    async def start(self):
+        """Lanzar la tarea de fondo"""
+        if self.is_running():
+            return
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Detener la tarea de fondo (terminan sus lotes) y procesar lo que quede en la cola"""
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+
+        while not self._queue.empty():
+            await self._handle(self._drain(self.max_batch_size))
+
+    def submit(self, item: Any) -> bool:
+        """
+        Encolar un elemento sin esperar
+
+        Args:
+            item: Elemento a procesar en un lote
+
+        Returns:
+            False si la cola está llena y el elemento no se encoló
+        """
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def _drain(self, limit: int) -> List[Any]:
+        """Sacar de la cola hasta `limit` elementos sin esperar"""
+        batch = []
+        while len(batch) < limit and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _get(self, timeout: float) -> Optional[Any]:
+        """Esperar un elemento hasta `timeout` segundos; None si vence o se pide parar"""
+        getter = asyncio.ensure_future(self._queue.get())
+        stopper = asyncio.ensure_future(self._stopping.wait())
+        try:
+            await asyncio.wait({getter, stopper}, timeout=timeout,
+                               return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stopper.cancel()
+            if not getter.done():
+                getter.cancel()
+        return getter.result() if getter.done() and not getter.cancelled() else None
+
+    async def _collect(self) -> List[Any]:
+        """Esperar el primer elemento y recoger hasta llenar el lote o vencer el plazo"""
+        first = await self._get(self.idle_timeout)
+        if first is None:
+            return []
+
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size and not self._stopping.is_set():
+            batch.extend(self._drain(self.max_batch_size - len(batch)))
+            remaining = deadline - time.perf_counter()
+            if len(batch) >= self.max_batch_size or remaining <= 0:
+                break
+            item = await self._get(remaining)
+            if item is None:
+                break
+            batch.append(item)
+        return batch
+
+    async def _handle(self, batch: List[Any]):
+        """Entregar un lote al manejador sin dejar escapar sus errores"""
+        try:
+            await self.handler(batch)
+        except Exception as e:
+            self.logger.error(f"Error procesando lote de {len(batch)} elementos: {e}")
+
+    async def _run(self):
+        """Bucle principal: recoger un lote por cada hueco libre y entregarlo al manejador"""
+        slots = asyncio.Semaphore(self.concurrency)
+
+        def finished(task: asyncio.Task):
+            self._in_flight.discard(task)
+            slots.release()
+
+        while not self._stopping.is_set():
+            await slots.acquire()
+            batch = await self._collect()
+            if not batch:
+                slots.release()
+                continue
+            task = asyncio.create_task(self._handle(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(finished)
+
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight)
@@ -3,9 +3,10 @@ Clasificador de Machine Learning - Módulo adicional ML
 Implementa clasificación de consultas usando scikit-learn
 """
 
+import asyncio
 import pickle
 import os
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.naive_bayes import MultinomialNB
@@ -188,6 +189,16 @@ class MLClassifier:
     
     def _classify_by_rules(self, question: str) -> str:
         """Clasificación básica por palabras clave"""
+        scores = self._rule_scores(question)
+        
+        # Retornar categoría con mayor score
+        if max(scores.values()) > 0:
+            return max(scores, key=scores.get)
+        else:
+            return "general"
+    
+    def _rule_scores(self, question: str) -> Dict[str, int]:
+        """Coincidencias de palabras clave por categoría"""
         question_lower = question.lower()
         
         # Palabras clave por categoría
@@ -225,11 +236,7 @@ class MLClassifier:
             score = sum(1 for word in words if word in question_lower)
             scores[category] = score
         
-        # Retornar categoría con mayor score
-        if max(scores.values()) > 0:
-            return max(scores, key=scores.get)
-        else:
-            return "general"
+        return scores
     
     def get_classification_confidence(self, question: str) -> float:
         """
@@ -254,6 +261,39 @@ class MLClassifier:
             self.logger.error(f"Error calculando confianza: {e}")
             return 0.5
     
+    def get_class_probabilities(self, question: str) -> List[Tuple[str, float]]:
+        """
+        Obtener la probabilidad de cada categoría
+        
+        Args:
+            question: Pregunta a evaluar
+        
+        Returns:
+            Lista de (categoría, probabilidad) ordenada de mayor a menor
+        """
+        try:
+            if self.pipeline:
+                probabilities = self.pipeline.predict_proba([question])[0]
+                ranked = zip(self.pipeline.classes_.tolist(), probabilities.tolist())
+            else:
+                # Por reglas: la categoría elegida recibe la confianza fija (0.7)
+                # y el resto se reparte según sus coincidencias
+                predicted = self._classify_by_rules(question)
+                others = {c: s for c, s in self._rule_scores(question).items() if c != predicted}
+                total = sum(others.values())
+                ranked = [(predicted, 0.7)] + [
+                    (c, 0.3 * (s / total if total else 1 / len(others))) for c, s in others.items()
+                ]
+            return sorted(ranked, key=lambda pair: pair[1], reverse=True)
+        
+        except Exception as e:
+            self.logger.error(f"Error calculando probabilidades: {e}")
+            return [("general", 1.0)]
+    
+    async def get_class_probabilities_async(self, question: str) -> List[Tuple[str, float]]:
+        """get_class_probabilities en un hilo, fuera del event loop"""
+        return await asyncio.to_thread(self.get_class_probabilities, question)
+    
     def get_classes(self) -> List[str]:
         """Obtener lista de clases disponibles"""
         return self.classes.copy()
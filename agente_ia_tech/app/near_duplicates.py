@@ -0,0 +1,114 @@
+"""
+Detección de Casi Duplicados - Firmas MinHash y buckets LSH
+Estima la similitud de Jaccard entre documentos a partir de firmas compactas
+y encuentra candidatos por bandas LSH sin comparar contra toda la base
+"""
+
+import hashlib
+import re
+import unicodedata
+import zlib
+from typing import List, Set
+import numpy as np
+
+# Primo de Mersenne 2^61 - 1 para las permutaciones (a * x + b) mod p
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+DEDUP_POLICIES = ("off", "reject", "merge", "link")
+
+class DuplicateItemError(ValueError):
+    """El documento es casi idéntico a uno existente (política 'reject')"""
+
+    def __init__(self, duplicate_of: int, similarity: float):
+        super().__init__(
+            f"Documento casi duplicado del elemento {duplicate_of} (similitud estimada {similarity:.2f})"
+        )
+        self.duplicate_of = duplicate_of
+        self.similarity = similarity
+
+class MinHasher:
+    """Firmas MinHash de shingles de palabras y sus claves de banda LSH"""
+
+    def __init__(self, num_perm: int = 128, bands: int = 16, shingle_size: int = 3, seed: int = 1):
+        """
+        Inicializar el generador de firmas
+
+        Con b bandas de r = num_perm / b filas, dos documentos con similitud s
+        comparten algún bucket con probabilidad 1 - (1 - s^r)^b; el umbral
+        práctico es cercano a (1 / b)^(1 / r) (≈ 0.71 con 128 y 16).
+
+        Args:
+            num_perm: Permutaciones (enteros uint32 por firma)
+            bands: Bandas LSH; debe dividir a num_perm
+            shingle_size: Palabras por shingle
+            seed: Semilla de las permutaciones (fija para que las firmas
+                guardadas sigan siendo comparables)
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm debe ser múltiplo de bands")
+
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # a < 2^31 y x < 2^32: a * x + b no desborda uint64
+        self._a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 31, size=num_perm, dtype=np.uint64)
+
+    @staticmethod
+    def _words(text: str) -> List[str]:
+        """Palabras en minúsculas y sin acentos"""
+        decomposed = unicodedata.normalize("NFKD", text.lower())
+        plain = "".join(c for c in decomposed if not unicodedata.combining(c))
+        return re.findall(r"\w+", plain)
+
+    def shingles(self, text: str) -> Set[int]:
+        """Hashes (crc32) de los shingles de palabras del texto"""
+        words = self._words(text)
+        if len(words) <= self.shingle_size:
+            return {zlib.crc32(" ".join(words).encode("utf-8"))} if words else set()
+        return {
+            zlib.crc32(" ".join(words[i:i + self.shingle_size]).encode("utf-8"))
+            for i in range(len(words) - self.shingle_size + 1)
+        }
+
+    def signature(self, text: str) -> np.ndarray:
+        """
+        Firma MinHash de un texto
+
+        Returns:
+            Vector uint32 de num_perm mínimos (todo MAX_HASH si no hay palabras)
+        """
+        shingles = self.shingles(text)
+        if not shingles:
+            return np.full(self.num_perm, MAX_HASH, dtype=np.uint32)
+
+        values = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+        hashed = (np.outer(values, self._a) + self._b) % MERSENNE_PRIME & MAX_HASH
+        return hashed.min(axis=0).astype(np.uint32)
+
+    def band_keys(self, signature: np.ndarray) -> List[int]:
+        """Una clave de bucket (int64 con signo, apta para SQLite) por banda"""
+        keys = []
+        for band in range(self.bands):
+            rows = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            digest = hashlib.blake2b(rows, digest_size=8, person=band.to_bytes(2, "little")).digest()
+            keys.append(int.from_bytes(digest, "little", signed=True))
+        return keys
+
+    @staticmethod
+    def similarity(first: np.ndarray, second: np.ndarray) -> float:
+        """Similitud de Jaccard estimada: fracción de posiciones iguales"""
+        return float(np.mean(first == second))
+
+    @staticmethod
+    def to_blob(signature: np.ndarray) -> bytes:
+        """Serializar una firma para SQLite"""
+        return signature.astype("<u4").tobytes()
+
+    @staticmethod
+    def from_blob(blob: bytes) -> np.ndarray:
+        """Reconstruir una firma guardada en SQLite"""
+        return np.frombuffer(blob, dtype="<u4")
@@ -0,0 +1,299 @@
+"""
+Backend ONNX de Embeddings - Inferencia en CPU con onnxruntime
+Exporta el modelo de sentence-transformers a ONNX, lo cuantiza a int8
+(cuantización dinámica) y lo ejecuta sin cargar PyTorch en cada arranque
+"""
+
+import json
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Union
+import numpy as np
+import logging
+
+import onnxruntime as ort
+from transformers import AutoTokenizer
+
+EXPORT_VERSION = 1
+
+# Frases con las que se compara la salida ONNX contra la de PyTorch
+PARITY_SENTENCES = [
+    "¿Cuántos días de vacaciones me corresponden al año?",
+    "Procedimiento para solicitar acceso a la VPN corporativa",
+    "La política de teletrabajo permite dos días remotos por semana.",
+    "Cómo restablecer la contraseña del correo",
+    "Reembolso de gastos de viaje y viáticos",
+    "¿Quién aprueba las compras mayores a cinco mil soles?",
+    "Horario de atención de la mesa de ayuda de TI",
+    "hola"
+]
+
+class OnnxEmbeddingModel:
+    """
+    Modelo de embeddings ejecutado con onnxruntime
+
+    Expone encode() con la misma forma que SentenceTransformer.encode, por lo
+    que EmbeddingService lo usa como reemplazo directo. La exportación (que sí
+    requiere PyTorch) se hace una sola vez y queda en cache_dir junto con el
+    tokenizer y los parámetros de pooling.
+    """
+
+    def __init__(self, model_name: str, cache_dir: str = "./models/onnx", quantize: bool = True,
+                 threads: int = 0, parity_threshold: float = 0.99, tokenizer_cache_size: int = 4096):
+        """
+        Cargar (exportando si hace falta) el modelo ONNX
+
+        Args:
+            model_name: Modelo de sentence-transformers (EMBEDDING_MODEL)
+            cache_dir: Directorio donde se guardan los modelos exportados
+            quantize: Cuantizar los pesos a int8 (cuantización dinámica)
+            threads: Hilos intra-op de onnxruntime (0 = los que decida onnxruntime)
+            parity_threshold: Similitud coseno mínima contra PyTorch para aceptar la exportación
+            tokenizer_cache_size: Textos cuyos tokens se guardan en memoria (LRU)
+
+        Raises:
+            ValueError: Si el modelo no es exportable o no supera el control de paridad
+        """
+        self.model_name = model_name
+        self.quantize = quantize
+        self.parity_threshold = parity_threshold
+        self.tokenizer_cache_size = tokenizer_cache_size
+        self.logger = logging.getLogger(__name__)
+        safe_name = re.sub(r"[^\w.-]+", "_", model_name)
+        self.export_dir = os.path.join(cache_dir, f"{safe_name}.{'int8' if quantize else 'fp32'}")
+        self._token_cache: "OrderedDict[str, List[int]]" = OrderedDict()
+        self._token_lock = threading.Lock()
+
+        self.metadata = self._read_metadata()
+        if self.metadata is None:
+            self.metadata = self._export()
+
+        self.tokenizer = AutoTokenizer.from_pretrained(os.path.join(self.export_dir, "tokenizer"))
+        self.session = self._create_session(os.path.join(self.export_dir, "model.onnx"), threads)
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.dimension = self.metadata["dimension"]
+        self.logger.info(
+            f"Modelo ONNX cargado: {self.model_id} (paridad mínima {self.metadata['parity']['min_cosine']:.4f})"
+        )
+
+    @property
+    def model_id(self) -> str:
+        """Nombre con el que se registran los embeddings de este backend"""
+        return f"{self.model_name}+onnx-{'int8' if self.quantize else 'fp32'}"
+
+    def _read_metadata(self) -> Optional[Dict[str, Any]]:
+        """Leer los parámetros de una exportación previa compatible"""
+        path = os.path.join(self.export_dir, "export.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        if metadata.get("version") != EXPORT_VERSION or metadata.get("model_name") != self.model_name:
+            return None
+        return metadata
+
+    @staticmethod
+    def _create_session(path: str, threads: int) -> "ort.InferenceSession":
+        """Sesión de onnxruntime en CPU con todas las optimizaciones de grafo"""
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        return ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+    def _export(self) -> Dict[str, Any]:
+        """
+        Exportar el transformer a ONNX, cuantizarlo y verificar la paridad
+
+        Returns:
+            Metadatos de la exportación (pooling, normalización, paridad, ...)
+        """
+        import torch
+        from sentence_transformers import SentenceTransformer
+        from sentence_transformers.models import Transformer, Pooling, Normalize
+
+        self.logger.info(f"Exportando {self.model_name} a ONNX en {self.export_dir}")
+        reference = SentenceTransformer(self.model_name, device="cpu")
+        modules = list(reference)
+        if (not isinstance(modules[0], Transformer) or len(modules) < 2
+                or not isinstance(modules[1], Pooling)
+                or any(not isinstance(m, Normalize) for m in modules[2:])):
+            raise ValueError("Solo se exportan modelos Transformer + Pooling (+ Normalize)")
+
+        pooling = modules[1].get_pooling_mode_str()
+        if pooling not in ("mean", "cls", "max"):
+            raise ValueError(f"Pooling no soportado en ONNX: {pooling}")
+
+        tmp_dir = f"{self.export_dir}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        transformer = modules[0].auto_model.eval()
+        sample = reference.tokenizer(["ejemplo de exportación"], return_tensors="pt")
+        input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+
+        class HiddenStates(torch.nn.Module):
+            """Devolver solo last_hidden_state con entradas posicionales"""
+
+            def __init__(self, model):
+                super().__init__()
+                self.model = model
+
+            def forward(self, *inputs):
+                return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+        fp32_path = os.path.join(tmp_dir, "model.fp32.onnx")
+        axes = {0: "batch", 1: "sequence"}
+        with torch.no_grad():
+            torch.onnx.export(
+                HiddenStates(transformer),
+                tuple(sample[n] for n in input_names),
+                fp32_path,
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes={name: axes for name in input_names + ["last_hidden_state"]},
+                opset_version=14,
+                do_constant_folding=True
+            )
+
+        model_path = os.path.join(tmp_dir, "model.onnx")
+        if self.quantize:
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            quantize_dynamic(fp32_path, model_path, weight_type=QuantType.QInt8)
+            os.remove(fp32_path)
+        else:
+            os.replace(fp32_path, model_path)
+
+        reference.tokenizer.save_pretrained(os.path.join(tmp_dir, "tokenizer"))
+        metadata = {
+            "version": EXPORT_VERSION,
+            "model_name": self.model_name,
+            "quantized": self.quantize,
+            "pooling": pooling,
+            "normalize": len(modules) > 2,
+            "max_seq_length": int(reference.max_seq_length),
+            "dimension": int(reference.get_sentence_embedding_dimension())
+        }
+
+        # Control de paridad contra la salida de PyTorch antes de publicar la exportación
+        self.metadata = metadata
+        self.tokenizer = AutoTokenizer.from_pretrained(os.path.join(tmp_dir, "tokenizer"))
+        self.session = self._create_session(model_path, threads=0)
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.dimension = metadata["dimension"]
+        metadata["parity"] = self.check_parity(reference.encode(PARITY_SENTENCES, convert_to_numpy=True))
+        if metadata["parity"]["min_cosine"] < self.parity_threshold:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise ValueError(
+                f"Paridad ONNX insuficiente: {metadata['parity']['min_cosine']:.4f} < {self.parity_threshold}"
+            )
+
+        with open(os.path.join(tmp_dir, "export.json"), "w", encoding="utf-8") as f:
+            json.dump(metadata, f, indent=2)
+        shutil.rmtree(self.export_dir, ignore_errors=True)
+        os.replace(tmp_dir, self.export_dir)
+        self._token_cache.clear()
+        return metadata
+
+    def check_parity(self, reference_embeddings: np.ndarray,
+                     sentences: Optional[List[str]] = None) -> Dict[str, float]:
+        """
+        Comparar los embeddings ONNX con los de referencia (PyTorch)
+
+        Args:
+            reference_embeddings: Embeddings de PyTorch de las mismas frases
+            sentences: Frases codificadas (por defecto PARITY_SENTENCES)
+
+        Returns:
+            Similitud coseno mínima y media por frase
+        """
+        embeddings = self.encode(sentences or PARITY_SENTENCES)
+        reference = np.asarray(reference_embeddings, dtype=np.float32)
+        cosine = np.sum(embeddings * reference, axis=1) / np.maximum(
+            np.linalg.norm(embeddings, axis=1) * np.linalg.norm(reference, axis=1), 1e-12
+        )
+        return {"min_cosine": round(float(cosine.min()), 6), "mean_cosine": round(float(cosine.mean()), 6)}
+
+    def _tokenize(self, texts: List[str]) -> List[List[int]]:
+        """Ids de tokens por texto, reutilizando los de textos ya vistos"""
+        with self._token_lock:
+            cached = [self._token_cache.get(text) for text in texts]
+            for text, ids in zip(texts, cached):
+                if ids is not None:
+                    self._token_cache.move_to_end(text)
+
+        missing = list(dict.fromkeys(text for text, ids in zip(texts, cached) if ids is None))
+        if missing:
+            encoded = self.tokenizer(
+                missing, truncation=True, max_length=self.metadata["max_seq_length"]
+            )["input_ids"]
+            fresh = dict(zip(missing, encoded))
+            cached = [ids if ids is not None else fresh[text] for text, ids in zip(texts, cached)]
+            with self._token_lock:
+                self._token_cache.update(fresh)
+                while len(self._token_cache) > self.tokenizer_cache_size:
+                    self._token_cache.popitem(last=False)
+        return cached
+
+    def _run(self, token_ids: List[List[int]]) -> np.ndarray:
+        """Ejecutar un lote ya tokenizado y aplicar pooling y normalización"""
+        length = max(len(ids) for ids in token_ids)
+        input_ids = np.full((len(token_ids), length), self.tokenizer.pad_token_id or 0, dtype=np.int64)
+        attention_mask = np.zeros((len(token_ids), length), dtype=np.int64)
+        for row, ids in enumerate(token_ids):
+            input_ids[row, :len(ids)] = ids
+            attention_mask[row, :len(ids)] = 1
+
+        feeds = {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "token_type_ids": np.zeros_like(input_ids)
+        }
+        hidden = self.session.run(None, {name: feeds[name] for name in self.input_names})[0]
+
+        pooling = self.metadata["pooling"]
+        if pooling == "cls":
+            embeddings = hidden[:, 0]
+        elif pooling == "max":
+            embeddings = np.where(attention_mask[..., None] > 0, hidden, -1e9).max(axis=1)
+        else:
+            mask = attention_mask[..., None].astype(np.float32)
+            embeddings = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+        if self.metadata["normalize"]:
+            embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings.astype(np.float32)
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32,
+               convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        """
+        Generar embeddings (misma interfaz que SentenceTransformer.encode)
+
+        Los textos se ordenan por longitud para que cada lote tenga poco relleno.
+
+        Args:
+            sentences: Texto o lista de textos
+            batch_size: Textos por ejecución del modelo
+
+        Returns:
+            Vector (si se pasó un texto) o matriz de embeddings float32
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+
+        token_ids = self._tokenize(texts)
+        order = np.argsort([-len(ids) for ids in token_ids], kind="stable")
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            rows = order[start:start + batch_size]
+            embeddings[rows] = self._run([token_ids[i] for i in rows])
+        return embeddings[0] if single else embeddings
+
+    def get_sentence_embedding_dimension(self) -> int:
+        """Dimensión de los embeddings"""
+        return self.dimension
@@ -185,12 +185,8 @@ RESPUESTA DE ESCALAMIENTO:""",
             Prompt formateado listo para el modelo
         """
         try:
-            # Mapear clasificación a template
-            template_key = self._map_classification_to_template(classification)
-            
-            # Obtener template
-            template_info = self.templates.get(template_key, self.templates["general"])
-            template = template_info["template"]
+            # Obtener template según la clasificación
+            template = self.get_template_for(classification)["template"]
             
             # Formatear template con variables
             formatted_prompt = template.format(
@@ -205,6 +201,19 @@ RESPUESTA DE ESCALAMIENTO:""",
             # Fallback a template general
             return self._get_fallback_prompt(question, context)
     
+    def get_template_for(self, classification: str) -> Dict[str, Any]:
+        """
+        Obtener el template (texto y max_tokens) que corresponde a una clasificación
+        
+        Args:
+            classification: Tipo de consulta clasificada
+        
+        Returns:
+            Diccionario del template ('template', 'max_tokens', ...)
+        """
+        template_key = self._map_classification_to_template(classification)
+        return self.templates.get(template_key, self.templates["general"])
+    
     def _map_classification_to_template(self, classification: str) -> str:
         """Mapear clasificación de ML a template de prompt"""
         classification_lower = classification.lower()
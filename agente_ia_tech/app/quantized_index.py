@@ -0,0 +1,357 @@
+"""
+Índice Cuantizado - Embeddings int8 con escala y desplazamiento por dimensión
+Guarda 1 byte por componente (4 veces menos memoria que float32) y puntúa con
+productos escalares enteros
+"""
+
+import threading
+import time
+from typing import List, Dict, Tuple, Iterable, Optional, Any
+import numpy as np
+import logging
+
+from app.vector_index import VectorIndex
+
+# Rango de los códigos: u = round((x - offset) / scale) en [0, 255], código = u - 128
+CODE_SHIFT = 128
+CODE_LEVELS = 255
+
+class QuantizedVectorIndex:
+    """
+    Índice exacto sobre códigos int8 de embeddings L2-normalizados
+
+    Cada dimensión d se cuantiza como x ≈ scale[d] * (código + 128) + offset[d],
+    con scale/offset ajustados al rango de los datos al construir el índice.
+    El producto q·x se descompone en un término entero (códigos · consulta
+    cuantizada, acumulado en int32) más un sesgo constante por consulta.
+    Los vectores agregados después del ajuste que caen fuera del rango se
+    saturan; needs_refit() indica cuándo conviene reconstruir con el rango nuevo.
+    """
+
+    def __init__(self, initial_capacity: int = 1024, clip_tolerance: float = 0.01):
+        """
+        Inicializar el índice
+
+        Args:
+            initial_capacity: Filas reservadas inicialmente
+            clip_tolerance: Fracción de componentes saturados, entre los
+                agregados desde el último ajuste, a partir de la cual se reajusta
+        """
+        self.initial_capacity = initial_capacity
+        self.clip_tolerance = clip_tolerance
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.RLock()
+        self._reset(0)
+
+    def _reset(self, dimension: int, capacity: int = 0):
+        """Vaciar el índice y reservar memoria"""
+        self.dimension = dimension
+        self.scale = np.ones(dimension, dtype=np.float32)
+        self.offset = np.zeros(dimension, dtype=np.float32)
+        self._codes = np.zeros((capacity, dimension), dtype=np.int8)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._positions: Dict[int, int] = {}
+        self._size = 0
+        self._fitted = False
+        self._added_components = 0
+        self._clipped_components = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def is_empty(self) -> bool:
+        """Verificar si el índice no tiene vectores"""
+        return self._size == 0
+
+    def memory_bytes(self) -> int:
+        """Bytes ocupados por los códigos de los vectores indexados"""
+        return self._size * self.dimension
+
+    def _fit(self, matrix: np.ndarray):
+        """Ajustar escala y desplazamiento por dimensión al rango de los datos"""
+        low = matrix.min(axis=0)
+        high = matrix.max(axis=0)
+        self.offset = low.astype(np.float32)
+        self.scale = np.maximum((high - low) / CODE_LEVELS, 1e-8).astype(np.float32)
+        self._fitted = True
+        self._added_components = 0
+        self._clipped_components = 0
+
+    def clipped_fraction(self) -> float:
+        """Fracción de componentes saturados entre los agregados desde el último ajuste"""
+        if self._added_components == 0:
+            return 0.0
+        return self._clipped_components / self._added_components
+
+    def needs_refit(self) -> bool:
+        """
+        Verificar si el rango ajustado dejó de cubrir los datos
+
+        Se considera desajuste si más de `clip_tolerance` de los componentes
+        agregados desde el último ajuste quedaron fuera del rango y se saturaron.
+        """
+        return self._fitted and self.clipped_fraction() > self.clip_tolerance
+
+    def _levels(self, matrix: np.ndarray) -> np.ndarray:
+        """Niveles de cuantización sin saturar"""
+        return np.rint((matrix - self.offset) / self.scale)
+
+    @staticmethod
+    def _to_codes(levels: np.ndarray) -> np.ndarray:
+        """Saturar los niveles al rango y desplazarlos a int8"""
+        np.clip(levels, 0, CODE_LEVELS, out=levels)
+        return (levels - CODE_SHIFT).astype(np.int8)
+
+    def quantize(self, matrix: np.ndarray) -> np.ndarray:
+        """
+        Cuantizar vectores ya normalizados
+
+        Los valores fuera del rango ajustado (vectores agregados después de
+        construir) se saturan; reconstruir el índice vuelve a ajustar el rango.
+        """
+        return self._to_codes(self._levels(matrix))
+
+    def dequantize(self, codes: np.ndarray) -> np.ndarray:
+        """Reconstruir vectores float32 aproximados a partir de sus códigos"""
+        return (codes.astype(np.float32) + CODE_SHIFT) * self.scale + self.offset
+
+    def _reserve(self, required: int):
+        """Asegurar capacidad para `required` filas duplicando la matriz"""
+        capacity = self._codes.shape[0]
+        if required <= capacity:
+            return
+
+        new_capacity = max(required, capacity * 2, self.initial_capacity)
+        codes = np.zeros((new_capacity, self.dimension), dtype=np.int8)
+        ids = np.zeros(new_capacity, dtype=np.int64)
+        codes[:self._size] = self._codes[:self._size]
+        ids[:self._size] = self._ids[:self._size]
+        self._codes = codes
+        self._ids = ids
+
+    def build(self, ids: Iterable[int], embeddings: np.ndarray):
+        """
+        Construir el índice desde cero y ajustar la cuantización
+
+        Args:
+            ids: Identificadores de los documentos
+            embeddings: Matriz (n, d) de embeddings sin normalizar
+        """
+        ids = np.asarray(list(ids), dtype=np.int64)
+        with self._lock:
+            if len(ids) == 0:
+                self._reset(self.dimension)
+                return
+
+            matrix = VectorIndex.normalize(embeddings)
+            self._reset(matrix.shape[1], max(len(ids), self.initial_capacity))
+            self._fit(matrix)
+            self._codes[:len(ids)] = self.quantize(matrix)
+            self._ids[:len(ids)] = ids
+            self._positions = {int(doc_id): i for i, doc_id in enumerate(ids)}
+            self._size = len(ids)
+
+        self.logger.info(f"Índice int8 construido con {len(ids)} documentos")
+
+    def add(self, ids: Iterable[int], embeddings: np.ndarray):
+        """
+        Agregar o reemplazar vectores (con la cuantización ya ajustada)
+
+        Cuenta los componentes que quedan fuera del rango para needs_refit().
+
+        Args:
+            ids: Identificadores de los documentos
+            embeddings: Matriz (n, d) de embeddings sin normalizar
+        """
+        ids = [int(doc_id) for doc_id in ids]
+        if not ids:
+            return
+
+        matrix = VectorIndex.normalize(embeddings)
+        with self._lock:
+            if not self._fitted:
+                self._reset(matrix.shape[1])
+                self._fit(matrix)
+            elif matrix.shape[1] != self.dimension:
+                raise ValueError(
+                    f"Dimensión de embedding inválida: {matrix.shape[1]} (esperada {self.dimension})"
+                )
+
+            levels = self._levels(matrix)
+            self._added_components += levels.size
+            self._clipped_components += int(np.count_nonzero((levels < 0) | (levels > CODE_LEVELS)))
+            codes = self._to_codes(levels)
+            self._reserve(self._size + len(ids))
+            for doc_id, code in zip(ids, codes):
+                position = self._positions.get(doc_id)
+                if position is None:
+                    position = self._size
+                    self._positions[doc_id] = position
+                    self._ids[position] = doc_id
+                    self._size += 1
+                self._codes[position] = code
+
+    def remove(self, ids: Iterable[int]):
+        """
+        Eliminar vectores del índice (intercambio con la última fila)
+
+        Args:
+            ids: Identificadores de los documentos a eliminar
+        """
+        with self._lock:
+            for doc_id in ids:
+                position = self._positions.pop(int(doc_id), None)
+                if position is None:
+                    continue
+
+                last = self._size - 1
+                if position != last:
+                    last_id = int(self._ids[last])
+                    self._codes[position] = self._codes[last]
+                    self._ids[position] = last_id
+                    self._positions[last_id] = position
+                self._size -= 1
+
+    def _quantize_query(self, query: np.ndarray) -> Tuple[np.ndarray, float, float]:
+        """
+        Preparar la consulta: pesos enteros int16, su escala y el sesgo constante
+
+        El máximo de los pesos se limita para que la suma de d productos
+        (|código| <= 128) no desborde el acumulador int32.
+        """
+        weights = query * self.scale
+        limit = min(np.iinfo(np.int16).max, (np.iinfo(np.int32).max // (CODE_SHIFT * max(self.dimension, 1))))
+        peak = float(np.abs(weights).max()) or 1.0
+        step = peak / limit
+        query_codes = np.rint(weights / step).astype(np.int16)
+        bias = float(query @ (CODE_SHIFT * self.scale + self.offset))
+        return query_codes, step, bias
+
+    def search(self, query_embedding: np.ndarray, top_k: int = 3,
+               candidate_ids: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        Buscar los documentos más similares con producto escalar entero
+
+        Args:
+            query_embedding: Embedding de la consulta (sin normalizar)
+            top_k: Número de resultados
+            candidate_ids: Si se indica, solo se puntúan estos ids
+
+        Returns:
+            Lista de tuplas (id, similitud coseno aproximada) de mayor a menor
+        """
+        query = VectorIndex.normalize(query_embedding)[0]
+        with self._lock:
+            if self.is_empty() or top_k <= 0:
+                return []
+            if query.shape[0] != self.dimension:
+                raise ValueError(
+                    f"Dimensión de consulta inválida: {query.shape[0]} (esperada {self.dimension})"
+                )
+
+            if candidate_ids is not None:
+                rows = [self._positions[doc_id] for doc_id in np.asarray(candidate_ids).tolist()
+                        if doc_id in self._positions]
+                rows = np.asarray(rows, dtype=np.int64)
+                codes = self._codes[rows]
+                ids = self._ids[rows]
+            else:
+                codes = self._codes[:self._size]
+                ids = self._ids[:self._size]
+            if len(ids) == 0:
+                return []
+
+            query_codes, step, bias = self._quantize_query(query)
+            # int8 x int16 acumulado en int32, sin copiar la matriz a float
+            raw = np.einsum("ij,j->i", codes, query_codes, dtype=np.int32)
+
+            k = min(top_k, len(raw))
+            if k < len(raw):
+                candidates = np.argpartition(-raw, k - 1)[:k]
+            else:
+                candidates = np.arange(len(raw))
+            ordered = candidates[np.argsort(-raw[candidates])]
+
+            return [(int(ids[i]), float(raw[i]) * step + bias) for i in ordered]
+
+def rerank_exact(query_embedding: np.ndarray, ids: List[int], embeddings: np.ndarray,
+                 top_k: int) -> List[Tuple[int, float]]:
+    """
+    Reordenar candidatos con sus embeddings float32 originales
+
+    Args:
+        query_embedding: Embedding de la consulta (sin normalizar)
+        ids: Ids de los candidatos
+        embeddings: Matriz (n, d) float32 de los candidatos, en el mismo orden
+        top_k: Número de resultados
+
+    Returns:
+        Lista de tuplas (id, similitud coseno exacta) de mayor a menor
+    """
+    if not len(ids):
+        return []
+    query = VectorIndex.normalize(query_embedding)[0]
+    scores = VectorIndex.normalize(embeddings) @ query
+    order = np.argsort(-scores)[:top_k]
+    return [(int(ids[i]), float(scores[i])) for i in order]
+
+def recall_report(ids: np.ndarray, embeddings: np.ndarray, sample_size: int = 200,
+                  top_k: int = 10, rerank_factor: int = 4, seed: int = 42) -> Dict[str, Any]:
+    """
+    Comparar la búsqueda int8 con la búsqueda exacta float32
+
+    Se usan como consultas una muestra de los propios embeddings con ruido
+    gaussiano leve, para no medir solo la coincidencia consigo mismos.
+
+    Args:
+        ids: Ids de los vectores
+        embeddings: Matriz (n, d) float32 sin normalizar
+        sample_size: Número de consultas
+        top_k: k de recall@k
+        rerank_factor: Candidatos int8 por resultado reordenados con float32
+        seed: Semilla de la muestra
+
+    Returns:
+        Recall@k con y sin reordenamiento, latencias medias y memoria
+    """
+    exact = VectorIndex()
+    exact.build(ids, embeddings)
+    quantized = QuantizedVectorIndex()
+    quantized.build(ids, embeddings)
+    normalized = VectorIndex.normalize(embeddings)
+    rows = {int(doc_id): i for i, doc_id in enumerate(ids)}
+
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(ids), size=min(sample_size, len(ids)), replace=False)
+    queries = normalized[sample] + rng.normal(scale=0.05, size=(len(sample), normalized.shape[1])).astype(np.float32)
+
+    timings = {"float32": 0.0, "int8": 0.0, "int8_rerank": 0.0}
+    hits = {"int8": 0, "int8_rerank": 0}
+    for query in queries:
+        start = time.perf_counter()
+        truth = {doc_id for doc_id, _ in exact.search(query, top_k)}
+        timings["float32"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        approx = quantized.search(query, top_k)
+        timings["int8"] += time.perf_counter() - start
+        hits["int8"] += len(truth & {doc_id for doc_id, _ in approx})
+
+        start = time.perf_counter()
+        candidates = [doc_id for doc_id, _ in quantized.search(query, top_k * rerank_factor)]
+        reranked = rerank_exact(query, candidates, normalized[[rows[c] for c in candidates]], top_k)
+        timings["int8_rerank"] += time.perf_counter() - start
+        hits["int8_rerank"] += len(truth & {doc_id for doc_id, _ in reranked})
+
+    expected = len(queries) * min(top_k, len(ids))
+    return {
+        "vectors": len(ids),
+        "dimension": int(normalized.shape[1]),
+        "queries": len(queries),
+        "top_k": top_k,
+        "rerank_factor": rerank_factor,
+        "recall_int8": round(hits["int8"] / expected, 4) if expected else None,
+        "recall_int8_rerank": round(hits["int8_rerank"] / expected, 4) if expected else None,
+        "mean_ms": {name: round(total / max(len(queries), 1) * 1000, 3) for name, total in timings.items()},
+        "memory_bytes": {"float32": int(normalized.nbytes), "int8": quantized.memory_bytes()}
+    }
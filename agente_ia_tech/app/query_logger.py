@@ -0,0 +1,100 @@
+"""
+Registro de Consultas - Historial de /api/ask en segundo plano
+Encola cada interacción en memoria y la escribe por lotes, fuera del camino
+de la petición
+"""
+
+import time
+from typing import Dict, Any, List
+import logging
+
+from app.database import utc_timestamp
+from app.micro_batcher import MicroBatcher
+
+class QueryHistoryLogger:
+    """Cola en proceso que vuelca el historial de consultas en transacciones por lote"""
+
+    def __init__(self, knowledge_base, batch_size: int = 100, flush_interval: float = 2.0,
+                 max_queue: int = 10000):
+        """
+        Inicializar el registro
+
+        Args:
+            knowledge_base: Base de conocimiento donde se guarda el historial
+            batch_size: Consultas por transacción (se escribe al alcanzarlo)
+            flush_interval: Segundos máximos que una consulta espera en la cola
+            max_queue: Consultas pendientes máximas; si se supera se descartan
+        """
+        self.knowledge_base = knowledge_base
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.logger = logging.getLogger(__name__)
+        self._batcher = MicroBatcher(self._flush, batch_size, flush_interval, max_queue)
+        self._stats: Dict[str, Any] = {
+            "queued": 0,
+            "written": 0,
+            "dropped": 0,
+            "batches": 0,
+            "last_batch_seconds": None,
+            "last_error": None
+        }
+
+    def is_running(self) -> bool:
+        """Verificar si la tarea de fondo está activa"""
+        return self._batcher.is_running()
+
+    async def start(self):
+        """Lanzar la tarea de fondo"""
+        await self._batcher.start()
+
+    async def stop(self):
+        """Detener la tarea de fondo (termina su lote) y escribir lo que quede en la cola"""
+        await self._batcher.stop()
+
+    def log(self, question: str, answer: str, confidence: float, sources: List[str],
+            classification: str):
+        """
+        Encolar una consulta sin esperar a la base de datos
+
+        Args:
+            question: Pregunta del usuario
+            answer: Respuesta generada
+            confidence: Confianza de la respuesta
+            sources: Títulos de los documentos usados
+            classification: Categoría asignada por el clasificador
+        """
+        record = {
+            "question": question,
+            "answer": answer,
+            "confidence": confidence,
+            "sources": sources,
+            "classification": classification,
+            "created_at": utc_timestamp()
+        }
+        if self._batcher.submit(record):
+            self._stats["queued"] += 1
+        else:
+            self._stats["dropped"] += 1
+            self.logger.warning("Cola del historial de consultas llena, consulta descartada")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obtener contadores del registro"""
+        return dict(self._stats, pending=self._batcher.pending())
+
+    async def _flush(self, batch: List[Dict[str, Any]]):
+        """Escribir un lote en una transacción"""
+        if not batch:
+            return
+
+        start = time.perf_counter()
+        try:
+            await self.knowledge_base.log_queries(batch)
+        except Exception as e:
+            self._stats["last_error"] = str(e)
+            self.logger.error(f"Error guardando historial de consultas ({len(batch)} perdidas): {e}")
+            return
+
+        self._stats["written"] += len(batch)
+        self._stats["batches"] += 1
+        self._stats["last_batch_seconds"] = round(time.perf_counter() - start, 4)
+        self._stats["last_error"] = None
@@ -0,0 +1,62 @@
+"""
+Fusión de Rankings - Combinación de resultados léxicos y semánticos
+Implementa Reciprocal Rank Fusion (RRF) y fusión ponderada de scores
+"""
+
+from typing import List, Tuple, Dict, Sequence
+
+Hits = Sequence[Tuple[int, float]]
+
+def reciprocal_rank_fusion(rankings: Sequence[Hits], k: int = 60) -> List[Tuple[int, float]]:
+    """
+    Combinar rankings con Reciprocal Rank Fusion
+
+    Cada documento suma 1 / (k + posición) por cada ranking en el que aparece,
+    por lo que no depende de la escala de los scores de cada fuente.
+
+    Args:
+        rankings: Listas de (id, score) ordenadas de mejor a peor
+        k: Constante de suavizado (60 en la formulación original)
+
+    Returns:
+        Lista de (id, score fusionado) ordenada de mayor a menor
+    """
+    fused: Dict[int, float] = {}
+    for hits in rankings:
+        for position, (doc_id, _) in enumerate(hits, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + position)
+
+    return sorted(fused.items(), key=lambda x: x[1], reverse=True)
+
+def _min_max(hits: Hits) -> Dict[int, float]:
+    """Normalizar scores al rango [0, 1]"""
+    if not hits:
+        return {}
+
+    scores = [score for _, score in hits]
+    low, high = min(scores), max(scores)
+    if high == low:
+        return {doc_id: 1.0 for doc_id, _ in hits}
+
+    return {doc_id: (score - low) / (high - low) for doc_id, score in hits}
+
+def weighted_score_fusion(rankings: Sequence[Hits], weights: Sequence[float]) -> List[Tuple[int, float]]:
+    """
+    Combinar rankings sumando scores normalizados (min-max) y ponderados
+
+    Args:
+        rankings: Listas de (id, score), una por fuente
+        weights: Peso de cada fuente
+
+    Returns:
+        Lista de (id, score fusionado) ordenada de mayor a menor
+    """
+    if len(rankings) != len(weights):
+        raise ValueError("Se requiere un peso por ranking")
+
+    fused: Dict[int, float] = {}
+    for hits, weight in zip(rankings, weights):
+        for doc_id, score in _min_max(hits).items():
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight * score
+
+    return sorted(fused.items(), key=lambda x: x[1], reverse=True)
@@ -0,0 +1,209 @@
+"""
+Reordenamiento con Cross-Encoder - Segunda etapa de la recuperación
+Puntúa cada par (pregunta, documento) con un cross-encoder de
+sentence-transformers dentro de un presupuesto de tiempo por petición
+"""
+
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+import logging
+
+class CrossEncoderReranker:
+    """Reordena los candidatos de la primera etapa con un cross-encoder"""
+
+    def __init__(self, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2", candidates: int = 20,
+                 budget_ms: float = 300, cache_size: int = 10000, enabled: bool = False,
+                 workers: int = 1, max_pending: int = 2):
+        """
+        Inicializar el reordenador
+
+        Args:
+            model_name: Modelo CrossEncoder de sentence-transformers
+            candidates: Documentos de la primera etapa que se reordenan
+            budget_ms: Tiempo máximo por petición; si se supera se conserva
+                el orden de la primera etapa
+            cache_size: Pares (pregunta, documento) puntuados que se recuerdan
+            enabled: False para desactivar la etapa
+            workers: Hilos dedicados al cross-encoder
+            max_pending: Predicciones en curso o en cola (incluidas las que ya
+                agotaron su presupuesto); al alcanzarlo no se reordena
+        """
+        self.model_name = model_name
+        self.candidates = candidates
+        self.budget_ms = budget_ms
+        self.cache_size = cache_size
+        self.enabled = enabled
+        self.workers = max(1, workers)
+        self.max_pending = max(self.workers, max_pending)
+        self.model = None
+        self.logger = logging.getLogger(__name__)
+        self._cache: "OrderedDict[Tuple[str, Any], float]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._stats: Dict[str, Any] = {
+            "requests": 0,
+            "reranked": 0,
+            "timeouts": 0,
+            "skipped_busy": 0,
+            "errors": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "last_ms": None
+        }
+
+    def load(self):
+        """Cargar el cross-encoder si la etapa está activa (bloqueante, se llama al arrancar)"""
+        if not self.enabled or self.model is not None:
+            return
+        try:
+            from sentence_transformers import CrossEncoder
+            self.model = CrossEncoder(self.model_name)
+            self.logger.info(f"Cross-encoder cargado: {self.model_name}")
+        except Exception as e:
+            self.logger.error(f"Error cargando cross-encoder: {e}")
+            raise
+
+    def is_available(self) -> bool:
+        """Verificar si el reordenamiento está activo"""
+        return self.model is not None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obtener contadores de uso, tiempos agotados y caché"""
+        return dict(self._stats, available=self.is_available(), cache_entries=len(self._cache),
+                    pending=self._pending)
+    
+    def close(self):
+        """Detener los hilos del cross-encoder (descarta las predicciones en cola)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+    
+    def _submit(self, query: str, query_key: str, docs: List[Dict[str, Any]]) -> Optional[Future]:
+        """
+        Encolar una predicción en el executor dedicado
+        
+        Returns:
+            El future, o None si ya hay max_pending predicciones pendientes
+        """
+        with self._pending_lock:
+            if self._pending >= self.max_pending:
+                return None
+            self._pending += 1
+        
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="reranker")
+        future = self._executor.submit(self._predict, query, query_key, docs)
+        # El cupo se libera cuando el hilo termina (o se cancela), no cuando la
+        # petición deja de esperar
+        future.add_done_callback(self._release)
+        return future
+    
+    def _release(self, _future: Future):
+        """Liberar el cupo de una predicción terminada"""
+        with self._pending_lock:
+            self._pending -= 1
+
+    @staticmethod
+    def _query_key(query: str) -> str:
+        """Hash de la pregunta normalizada para la caché de puntuaciones"""
+        return hashlib.sha1(" ".join(query.lower().split()).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _doc_key(doc: Dict[str, Any]) -> Any:
+        """Identificador del texto puntuado: el pasaje si existe, si no el documento"""
+        passage_id = doc.get("passage_id")
+        return ("p", passage_id) if passage_id is not None else ("d", doc.get("id"))
+
+    def _cached(self, key: Tuple[str, Any]) -> Optional[float]:
+        """Leer una puntuación de la caché (LRU)"""
+        with self._cache_lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+            return score
+
+    def _predict(self, query: str, query_key: str, docs: List[Dict[str, Any]]) -> List[float]:
+        """
+        Puntuar los pares en un solo lote y guardarlos en caché
+
+        Se guarda en caché aunque la petición ya haya agotado su presupuesto,
+        para que la siguiente pregunta igual no vuelva a pagar el cálculo.
+        """
+        pairs = [(query, f"{doc.get('title', '')}\n{doc.get('content', '')}") for doc in docs]
+        scores = [float(score) for score in self.model.predict(pairs, batch_size=len(pairs))]
+
+        with self._cache_lock:
+            for doc, score in zip(docs, scores):
+                self._cache[(query_key, self._doc_key(doc))] = score
+                self._cache.move_to_end((query_key, self._doc_key(doc)))
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return scores
+
+    async def rerank(self, query: str, docs: List[Dict[str, Any]], top_k: int = 3) -> List[Dict[str, Any]]:
+        """
+        Reordenar los documentos recuperados
+
+        Args:
+            query: Pregunta del usuario
+            docs: Documentos de la primera etapa, de más a menos relevante
+            top_k: Documentos a retornar
+
+        Returns:
+            Los top_k documentos reordenados (con 'rerank_score'), o los
+            top_k de la primera etapa si el modelo no está disponible, falla
+            o agota el presupuesto o el executor está saturado
+        """
+        if not self.is_available() or len(docs) <= 1:
+            return docs[:top_k]
+
+        self._stats["requests"] += 1
+        start = time.perf_counter()
+        query_key = self._query_key(query)
+        candidates = docs[:self.candidates]
+
+        scores: Dict[int, float] = {}
+        pending = []
+        for position, doc in enumerate(candidates):
+            score = self._cached((query_key, self._doc_key(doc)))
+            if score is None:
+                pending.append(position)
+            else:
+                scores[position] = score
+        self._stats["cache_hits"] += len(scores)
+        self._stats["cache_misses"] += len(pending)
+
+        if pending:
+            future = self._submit(query, query_key, [candidates[i] for i in pending])
+            if future is None:
+                self._stats["skipped_busy"] += 1
+                return docs[:top_k]
+            try:
+                predicted = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.budget_ms / 1000)
+            except asyncio.TimeoutError:
+                self._stats["timeouts"] += 1
+                self.logger.warning(f"Reordenamiento excedió {self.budget_ms} ms; se usa el orden original")
+                return docs[:top_k]
+            except Exception as e:
+                self._stats["errors"] += 1
+                self.logger.error(f"Error en el reordenamiento: {e}")
+                return docs[:top_k]
+            scores.update(zip(pending, predicted))
+
+        order = sorted(range(len(candidates)), key=lambda i: scores[i], reverse=True)[:top_k]
+        reranked = []
+        for position in order:
+            doc = dict(candidates[position])
+            doc["rerank_score"] = scores[position]
+            reranked.append(doc)
+
+        self._stats["reranked"] += 1
+        self._stats["last_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return reranked
@@ -0,0 +1,176 @@
+"""
+Snapshot de la Base de Conocimiento - Archivo único versionado para arranque en frío
+Empaqueta la base SQLite, la matriz de embeddings, el índice vectorial y el
+clasificador en un solo archivo cuyas matrices se mapean en memoria al iniciar
+"""
+
+import json
+import os
+import shutil
+import struct
+from datetime import datetime
+from typing import Dict, Any, Optional, Union
+import numpy as np
+import logging
+
+# Cabecera: magia, versión, desplazamiento y longitud del manifiesto JSON
+HEADER_FORMAT = "<8sIQQ"
+HEADER_SIZE = 64
+MAGIC = b"KBSNAP01"
+VERSION = 1
+ALIGNMENT = 64
+
+Section = Union[bytes, str, np.ndarray]
+
+class SnapshotFile:
+    """
+    Contenedor de secciones alineadas con un manifiesto JSON al final
+
+    Cada sección es un archivo copiado byte a byte o una matriz numpy en
+    formato nativo, de modo que se puede extraer por streaming o mapear en
+    memoria con np.memmap sin leer el resto del archivo.
+    """
+
+    def __init__(self, path: str):
+        """
+        Inicializar el acceso al snapshot
+
+        Args:
+            path: Ruta del archivo de snapshot
+        """
+        self.path = path
+        self.logger = logging.getLogger(__name__)
+        self._manifest: Optional[Dict[str, Any]] = None
+
+    def exists(self) -> bool:
+        """Verificar si el archivo existe"""
+        return os.path.exists(self.path)
+
+    @staticmethod
+    def _pad(f):
+        """Avanzar hasta el siguiente múltiplo de ALIGNMENT"""
+        position = f.tell()
+        padding = (ALIGNMENT - position % ALIGNMENT) % ALIGNMENT
+        if padding:
+            f.write(b"\0" * padding)
+
+    def write(self, manifest: Dict[str, Any], sections: Dict[str, Section]):
+        """
+        Escribir el snapshot (en un temporal que luego reemplaza al archivo)
+
+        Args:
+            manifest: Metadatos (huella, modelo, tipo de índice, ...)
+            sections: Contenido por nombre: bytes, ruta de un archivo a copiar
+                o matriz numpy (se guarda con su dtype y forma)
+        """
+        manifest = dict(manifest, format_version=VERSION,
+                        created_at=datetime.now().isoformat(), sections={})
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(b"\0" * HEADER_SIZE)
+            for name, content in sections.items():
+                self._pad(f)
+                offset = f.tell()
+                entry: Dict[str, Any] = {"offset": offset}
+                if isinstance(content, np.ndarray):
+                    array = np.ascontiguousarray(content)
+                    f.write(array.tobytes())
+                    entry.update(dtype=array.dtype.str, shape=list(array.shape))
+                elif isinstance(content, str):
+                    with open(content, "rb") as source:
+                        shutil.copyfileobj(source, f, 1024 * 1024)
+                else:
+                    f.write(content)
+                entry["length"] = f.tell() - offset
+                manifest["sections"][name] = entry
+
+            payload = json.dumps(manifest, ensure_ascii=False).encode("utf-8")
+            manifest_offset = f.tell()
+            f.write(payload)
+            f.seek(0)
+            f.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, manifest_offset, len(payload)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._manifest = manifest
+
+    def manifest(self) -> Optional[Dict[str, Any]]:
+        """Leer el manifiesto o None si el archivo no es un snapshot válido"""
+        if self._manifest is not None:
+            return self._manifest
+        try:
+            with open(self.path, "rb") as f:
+                header = f.read(HEADER_SIZE)
+                if len(header) < HEADER_SIZE:
+                    return None
+                magic, version, offset, length = struct.unpack_from(HEADER_FORMAT, header)
+                if magic != MAGIC or version != VERSION:
+                    return None
+                f.seek(offset)
+                self._manifest = json.loads(f.read(length).decode("utf-8"))
+        except FileNotFoundError:
+            return None
+        return self._manifest
+
+    def has(self, name: str) -> bool:
+        """Verificar si el snapshot contiene una sección"""
+        manifest = self.manifest()
+        return manifest is not None and name in manifest["sections"]
+
+    def array(self, name: str) -> np.ndarray:
+        """Mapear en memoria (solo lectura) una sección guardada como matriz"""
+        entry = self.manifest()["sections"][name]
+        if not entry["length"]:
+            return np.zeros(entry["shape"], dtype=np.dtype(entry["dtype"]))
+        return np.memmap(self.path, dtype=np.dtype(entry["dtype"]), mode="r",
+                         offset=entry["offset"], shape=tuple(entry["shape"]))
+
+    def extract(self, name: str, destination: str):
+        """
+        Copiar una sección a un archivo (escritura atómica)
+
+        Args:
+            name: Nombre de la sección
+            destination: Ruta del archivo destino
+        """
+        entry = self.manifest()["sections"][name]
+        directory = os.path.dirname(destination)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_path = f"{destination}.tmp"
+        with open(self.path, "rb") as source, open(tmp_path, "wb") as target:
+            source.seek(entry["offset"])
+            remaining = entry["length"]
+            while remaining:
+                chunk = source.read(min(remaining, 1024 * 1024))
+                if not chunk:
+                    raise ValueError(f"Snapshot truncado en la sección '{name}'")
+                target.write(chunk)
+                remaining -= len(chunk)
+        os.replace(tmp_path, destination)
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    from app.knowledge_base import KnowledgeBase
+    from app.ml_classifier import MLClassifier
+
+    parser = argparse.ArgumentParser(description="Exportar o restaurar un snapshot de la base de conocimiento")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", help="Ruta del archivo de snapshot")
+    args = parser.parse_args()
+
+    knowledge_base = KnowledgeBase()
+    attachments = {"classifier": MLClassifier().model_path}
+
+    if args.command == "import":
+        knowledge_base.restore_snapshot(args.path, attachments, force=True)
+    else:
+        async def export():
+            await knowledge_base.initialize()
+            try:
+                print(json.dumps(await knowledge_base.export_snapshot(args.path, attachments), indent=2))
+            finally:
+                await knowledge_base.close()
+        asyncio.run(export())
@@ -0,0 +1,95 @@
+"""
+Arranque de Servicios - Carga diferida y estado de preparación
+Registra el estado (pendiente, cargando, listo, fallido) y el tiempo de carga
+de cada servicio pesado para /health
+"""
+
+import asyncio
+import inspect
+import time
+from typing import Any, Callable, Dict, Optional
+import logging
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+class StartupTracker:
+    """Estado y desglose de tiempos del arranque por servicio"""
+
+    def __init__(self, *services: str, started: Optional[float] = None):
+        """
+        Inicializar el registro
+
+        Args:
+            *services: Servicios que se cargarán (quedan como pendientes)
+            started: Instante (time.perf_counter) en que arrancó el proceso
+        """
+        self.logger = logging.getLogger(__name__)
+        self._started = started if started is not None else time.perf_counter()
+        self._finished: Optional[float] = None
+        self._services: Dict[str, Dict[str, Any]] = {
+            name: {"status": PENDING, "seconds": None, "error": None} for name in services
+        }
+        self._timings: Dict[str, float] = {}
+
+    def record(self, name: str, seconds: float):
+        """Registrar el tiempo de una etapa que no es un servicio (importaciones, ...)"""
+        self._timings[name] = round(seconds, 4)
+
+    async def run(self, name: str, fn: Callable[..., Any], *args) -> bool:
+        """
+        Cargar un servicio midiendo su tiempo
+
+        Las funciones síncronas se ejecutan en un hilo para no bloquear el event
+        loop; las corrutinas se esperan directamente.
+
+        Args:
+            name: Nombre del servicio
+            fn: Función o corrutina de carga
+            *args: Argumentos de fn
+
+        Returns:
+            True si el servicio quedó listo
+        """
+        service = self._services.setdefault(name, {"status": PENDING, "seconds": None, "error": None})
+        service["status"] = LOADING
+        start = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(fn):
+                await fn(*args)
+            else:
+                await asyncio.to_thread(fn, *args)
+            service["status"] = READY
+            return True
+        except Exception as e:
+            service["status"] = FAILED
+            service["error"] = str(e)
+            self.logger.error(f"Error iniciando {name}: {e}")
+            return False
+        finally:
+            service["seconds"] = round(time.perf_counter() - start, 4)
+            self._timings[name] = service["seconds"]
+
+    def finish(self):
+        """Marcar el fin del arranque"""
+        self._finished = time.perf_counter()
+
+    def is_ready(self, name: str) -> bool:
+        """Verificar si un servicio terminó de cargar correctamente"""
+        return self._services.get(name, {}).get("status") == READY
+
+    def is_complete(self) -> bool:
+        """Verificar si ya no queda ningún servicio pendiente o cargando"""
+        return all(s["status"] in (READY, FAILED) for s in self._services.values())
+
+    def get_status(self) -> Dict[str, Any]:
+        """Obtener el estado por servicio y el desglose de tiempos (segundos)"""
+        end = self._finished if self._finished is not None else time.perf_counter()
+        return {
+            "complete": self.is_complete(),
+            "services": {name: dict(service) for name, service in self._services.items()},
+            "timings": dict(self._timings),
+            "total_seconds": round(end - self._started, 4)
+        }
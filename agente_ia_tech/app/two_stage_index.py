@@ -0,0 +1,354 @@
+"""
+Índice de Dos Etapas - Prefiltro en dimensión reducida y reordenamiento exacto
+Puntúa todos los documentos con una proyección PCA de pocas dimensiones y
+solo recalcula con los vectores completos los mejores candidatos
+"""
+
+import os
+import threading
+from typing import List, Dict, Tuple, Iterable, Optional, Any
+import numpy as np
+import logging
+
+from app.vector_index import VectorIndex
+
+class TwoStageIndex:
+    """
+    Índice exacto float32 con prefiltro PCA
+
+    Etapa 1: q·x ≈ q·μ + (C q)·(C (x - μ)), con C las `components` componentes
+    principales, sobre una matriz (n, components). Etapa 2: producto completo
+    solo para los `candidates` mejores de la etapa 1.
+    """
+
+    def __init__(self, components: int = 96, candidates: int = 256, fit_sample: int = 20000,
+                 drift_tolerance: float = 0.05, refit_ratio: float = 0.5,
+                 initial_capacity: int = 1024, seed: int = 42):
+        """
+        Inicializar el índice
+
+        Args:
+            components: Dimensiones de la proyección (64-128 recomendado)
+            candidates: Candidatos de la etapa 1 reordenados con vectores completos
+            fit_sample: Vectores máximos usados para ajustar la PCA
+            drift_tolerance: Caída tolerada de la varianza capturada en los
+                vectores nuevos antes de reajustar la proyección
+            refit_ratio: Reajustar también si los vectores agregados desde el
+                último ajuste superan esta fracción de los usados en él
+            initial_capacity: Filas reservadas inicialmente
+            seed: Semilla del muestreo para el ajuste
+        """
+        self.components = components
+        self.candidates = candidates
+        self.fit_sample = fit_sample
+        self.drift_tolerance = drift_tolerance
+        self.refit_ratio = refit_ratio
+        self.initial_capacity = initial_capacity
+        self.seed = seed
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.RLock()
+        self._reset(0)
+
+    def _reset(self, dimension: int, capacity: int = 0):
+        """Vaciar el índice y reservar memoria"""
+        self.dimension = dimension
+        self.mean = np.zeros(dimension, dtype=np.float32)
+        self.projection = np.zeros((0, dimension), dtype=np.float32)
+        self._matrix = np.zeros((capacity, dimension), dtype=np.float32)
+        self._reduced = np.zeros((capacity, 0), dtype=np.float32)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._positions: Dict[int, int] = {}
+        self._size = 0
+        # Estadísticas de deriva: varianza capturada al ajustar y en los agregados
+        self._fit_size = 0
+        self._fit_captured = 1.0
+        self._added_count = 0
+        self._added_captured = 0.0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def is_empty(self) -> bool:
+        """Verificar si el índice no tiene vectores"""
+        return self._size == 0
+
+    def is_fitted(self) -> bool:
+        """Verificar si hay una proyección ajustada"""
+        return self.projection.shape[0] > 0
+
+    def _captured(self, vectors: np.ndarray) -> np.ndarray:
+        """Fracción de la energía (respecto a la media) que conserva la proyección"""
+        centered = vectors - self.mean
+        total = np.einsum("ij,ij->i", centered, centered)
+        reduced = centered @ self.projection.T
+        kept = np.einsum("ij,ij->i", reduced, reduced)
+        return kept / np.maximum(total, 1e-12)
+
+    def _fit(self, vectors: np.ndarray):
+        """Ajustar media y componentes principales sobre una muestra"""
+        if len(vectors) > self.fit_sample:
+            rng = np.random.default_rng(self.seed)
+            vectors = vectors[rng.choice(len(vectors), self.fit_sample, replace=False)]
+
+        self.mean = vectors.mean(axis=0).astype(np.float32)
+        components = max(1, min(self.components, vectors.shape[0], vectors.shape[1]))
+        _, _, vt = np.linalg.svd(vectors - self.mean, full_matrices=False)
+        self.projection = np.ascontiguousarray(vt[:components], dtype=np.float32)
+
+        self._fit_size = len(vectors)
+        self._fit_captured = float(self._captured(vectors).mean())
+        self._added_count = 0
+        self._added_captured = 0.0
+
+    def _project(self, vectors: np.ndarray) -> np.ndarray:
+        """Coordenadas reducidas C (x - μ)"""
+        return np.ascontiguousarray((vectors - self.mean) @ self.projection.T, dtype=np.float32)
+
+    def _reserve(self, required: int):
+        """Asegurar capacidad para `required` filas duplicando las matrices"""
+        capacity = self._matrix.shape[0]
+        if required <= capacity:
+            return
+
+        new_capacity = max(required, capacity * 2, self.initial_capacity)
+        matrix = np.zeros((new_capacity, self.dimension), dtype=np.float32)
+        reduced = np.zeros((new_capacity, self._reduced.shape[1]), dtype=np.float32)
+        ids = np.zeros(new_capacity, dtype=np.int64)
+        matrix[:self._size] = self._matrix[:self._size]
+        reduced[:self._size] = self._reduced[:self._size]
+        ids[:self._size] = self._ids[:self._size]
+        self._matrix = matrix
+        self._reduced = reduced
+        self._ids = ids
+
+    def build(self, ids: Iterable[int], embeddings: np.ndarray):
+        """
+        Ajustar la proyección y construir el índice desde cero
+
+        Args:
+            ids: Identificadores de los documentos
+            embeddings: Matriz (n, d) de embeddings sin normalizar
+        """
+        ids = np.asarray(list(ids), dtype=np.int64)
+        with self._lock:
+            if len(ids) == 0:
+                self._reset(self.dimension)
+                return
+
+            matrix = VectorIndex.normalize(embeddings)
+            self._reset(matrix.shape[1], max(len(ids), self.initial_capacity))
+            self._fit(matrix)
+            self._reduced = np.zeros((self._matrix.shape[0], self.projection.shape[0]), dtype=np.float32)
+            self._matrix[:len(ids)] = matrix
+            self._reduced[:len(ids)] = self._project(matrix)
+            self._ids[:len(ids)] = ids
+            self._positions = {int(doc_id): i for i, doc_id in enumerate(ids)}
+            self._size = len(ids)
+
+        self.logger.info(
+            f"Índice de dos etapas construido: {len(ids)} documentos, "
+            f"{self.projection.shape[0]} dimensiones (varianza capturada {self._fit_captured:.3f})"
+        )
+
+    def refit(self):
+        """Reajustar la proyección con los vectores actuales y recalcular la matriz reducida"""
+        with self._lock:
+            if self.is_empty():
+                return
+            size = self._size
+            self._fit(self._matrix[:size])
+            self._reduced = np.zeros((self._matrix.shape[0], self.projection.shape[0]), dtype=np.float32)
+            self._reduced[:size] = self._project(self._matrix[:size])
+
+        self.logger.info(f"Proyección PCA reajustada (varianza capturada {self._fit_captured:.3f})")
+
+    def needs_refit(self) -> bool:
+        """
+        Verificar si el corpus derivó respecto a la proyección
+
+        Se considera deriva si la varianza capturada de los vectores agregados
+        cae más de `drift_tolerance` respecto a la del ajuste, o si se agregaron
+        más de `refit_ratio` veces los vectores usados para ajustar.
+        """
+        if not self.is_fitted() or self._added_count == 0:
+            return False
+        if self._added_count > self.refit_ratio * self._fit_size:
+            return True
+        added_captured = self._added_captured / self._added_count
+        return self._added_count >= 32 and self._fit_captured - added_captured > self.drift_tolerance
+
+    def add(self, ids: Iterable[int], embeddings: np.ndarray):
+        """
+        Agregar o reemplazar vectores proyectándolos con el ajuste actual
+
+        Si el índice no tiene proyección se construye con estos vectores.
+        """
+        ids = [int(doc_id) for doc_id in ids]
+        if not ids:
+            return
+
+        with self._lock:
+            if not self.is_fitted():
+                self.build(ids, embeddings)
+                return
+
+            matrix = VectorIndex.normalize(embeddings)
+            if matrix.shape[1] != self.dimension:
+                raise ValueError(
+                    f"Dimensión de embedding inválida: {matrix.shape[1]} (esperada {self.dimension})"
+                )
+
+            reduced = self._project(matrix)
+            self._added_count += len(ids)
+            self._added_captured += float(self._captured(matrix).sum())
+
+            self._reserve(self._size + len(ids))
+            for doc_id, vector, coordinates in zip(ids, matrix, reduced):
+                position = self._positions.get(doc_id)
+                if position is None:
+                    position = self._size
+                    self._positions[doc_id] = position
+                    self._ids[position] = doc_id
+                    self._size += 1
+                self._matrix[position] = vector
+                self._reduced[position] = coordinates
+
+    def remove(self, ids: Iterable[int]):
+        """
+        Eliminar vectores del índice (intercambio con la última fila)
+
+        Args:
+            ids: Identificadores de los documentos a eliminar
+        """
+        with self._lock:
+            for doc_id in ids:
+                position = self._positions.pop(int(doc_id), None)
+                if position is None:
+                    continue
+
+                last = self._size - 1
+                if position != last:
+                    last_id = int(self._ids[last])
+                    self._matrix[position] = self._matrix[last]
+                    self._reduced[position] = self._reduced[last]
+                    self._ids[position] = last_id
+                    self._positions[last_id] = position
+                self._size -= 1
+
+    def search(self, query_embedding: np.ndarray, top_k: int = 3,
+               candidate_ids: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        Buscar con prefiltro reducido y reordenamiento con vectores completos
+
+        Args:
+            query_embedding: Embedding de la consulta (sin normalizar)
+            top_k: Número de resultados
+            candidate_ids: Si se indica, solo se puntúan estos ids
+
+        Returns:
+            Lista de tuplas (id, similitud coseno exacta) ordenada de mayor a menor
+        """
+        query = VectorIndex.normalize(query_embedding)[0]
+        with self._lock:
+            if self.is_empty() or top_k <= 0:
+                return []
+            if query.shape[0] != self.dimension:
+                raise ValueError(
+                    f"Dimensión de consulta inválida: {query.shape[0]} (esperada {self.dimension})"
+                )
+
+            if candidate_ids is not None:
+                rows = np.asarray([self._positions[doc_id] for doc_id in np.asarray(candidate_ids).tolist()
+                                   if doc_id in self._positions], dtype=np.int64)
+            else:
+                rows = None
+            count = self._size if rows is None else len(rows)
+            if count == 0:
+                return []
+
+            # Etapa 1: puntuación aproximada en dimensión reducida
+            shortlist = max(self.candidates, top_k)
+            if count > shortlist:
+                reduced = self._reduced[:self._size] if rows is None else self._reduced[rows]
+                approx = reduced @ (self.projection @ query)
+                best = np.argpartition(-approx, shortlist - 1)[:shortlist]
+                rows = best if rows is None else rows[best]
+            elif rows is None:
+                rows = np.arange(self._size)
+
+            # Etapa 2: producto exacto solo sobre los candidatos
+            scores = self._matrix[rows] @ query
+            ids = self._ids[rows]
+
+        k = min(top_k, len(scores))
+        if k < len(scores):
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(len(scores))
+        ordered = candidates[np.argsort(-scores[candidates])]
+
+        return [(int(ids[i]), float(scores[i])) for i in ordered]
+
+    def save(self, path: str, fingerprint: str = ""):
+        """
+        Persistir proyección y vectores en disco (escritura atómica)
+
+        Args:
+            path: Ruta del archivo .npz
+            fingerprint: Huella de los datos indexados para validar al cargar
+        """
+        with self._lock:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    mean=self.mean,
+                    projection=self.projection,
+                    ids=self._ids[:self._size],
+                    vectors=self._matrix[:self._size],
+                    fit_stats=np.array([self._fit_size, self._fit_captured, self._added_count, self._added_captured]),
+                    fingerprint=np.array(fingerprint)
+                )
+            os.replace(tmp_path, path)
+
+    def load(self, path: str, fingerprint: Optional[str] = None) -> bool:
+        """
+        Cargar el índice desde disco
+
+        Args:
+            path: Ruta del archivo .npz
+            fingerprint: Si se indica, el archivo solo se usa si coincide
+
+        Returns:
+            True si el índice se cargó
+        """
+        if not os.path.exists(path):
+            return False
+
+        with np.load(path) as data:
+            if fingerprint is not None and str(data["fingerprint"]) != fingerprint:
+                return False
+            mean = data["mean"]
+            projection = data["projection"]
+            ids = data["ids"]
+            vectors = data["vectors"]
+            fit_size, fit_captured, added_count, added_captured = data["fit_stats"].tolist()
+
+        with self._lock:
+            self._reset(vectors.shape[1], max(len(ids), self.initial_capacity))
+            self.mean = mean
+            self.projection = projection
+            self._reduced = np.zeros((self._matrix.shape[0], projection.shape[0]), dtype=np.float32)
+            self._matrix[:len(ids)] = vectors
+            if len(ids):
+                self._reduced[:len(ids)] = self._project(vectors)
+            self._ids[:len(ids)] = ids
+            self._positions = {int(doc_id): i for i, doc_id in enumerate(ids)}
+            self._size = len(ids)
+            self._fit_size = int(fit_size)
+            self._fit_captured = float(fit_captured)
+            self._added_count = int(added_count)
+            self._added_captured = float(added_captured)
+
+        self.logger.info(f"Índice de dos etapas cargado desde {path} ({len(ids)} documentos)")
+        return True
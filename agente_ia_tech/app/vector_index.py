@@ -0,0 +1,264 @@
+"""
+Índice Vectorial - Recuperación semántica en memoria
+Mantiene una matriz contigua float32 de embeddings normalizados para búsqueda top-k
+"""
+
+import threading
+from typing import List, Dict, Set, Tuple, Iterable, Optional
+import numpy as np
+import logging
+
+class VectorIndex:
+    """
+    Índice vectorial exacto sobre embeddings L2-normalizados
+
+    Puede combinar un segmento base de solo lectura (p. ej. un memmap compartido
+    entre procesos) con un segmento en memoria para los cambios posteriores.
+    """
+
+    def __init__(self, dimension: int = 0, initial_capacity: int = 1024):
+        """
+        Inicializar el índice
+
+        Args:
+            dimension: Dimensión de los embeddings (0 = se fija con el primer lote)
+            initial_capacity: Filas reservadas inicialmente en la matriz
+        """
+        self.dimension = dimension
+        self.initial_capacity = initial_capacity
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.RLock()
+        self._reset(dimension)
+
+    def _reset(self, dimension: int, capacity: int = 0):
+        """Vaciar el índice y reservar memoria"""
+        self.dimension = dimension
+        self._matrix = np.zeros((capacity, dimension), dtype=np.float32)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._positions: Dict[int, int] = {}
+        self._size = 0
+        # Segmento base de solo lectura: ids ordenados y filas eliminadas
+        self._base_ids = np.zeros(0, dtype=np.int64)
+        self._base_matrix = np.zeros((0, dimension), dtype=np.float32)
+        self._base_deleted: Set[int] = set()
+
+    def __len__(self) -> int:
+        return self._size + len(self._base_ids) - len(self._base_deleted)
+
+    def is_empty(self) -> bool:
+        """Verificar si el índice no tiene vectores"""
+        return len(self) == 0
+
+    def _base_contains(self, doc_id: int) -> bool:
+        """Verificar si un id está en el segmento base (búsqueda binaria)"""
+        position = np.searchsorted(self._base_ids, doc_id)
+        return position < len(self._base_ids) and self._base_ids[position] == doc_id
+
+    def attach(self, ids: np.ndarray, matrix: np.ndarray, keep_delta: bool = True):
+        """
+        Usar una matriz ya normalizada como segmento base, sin copiarla
+
+        Por defecto los vectores agregados en memoria se conservan; los que
+        también existen en la nueva base la ocultan.
+
+        Args:
+            ids: Ids ordenados ascendentemente
+            matrix: Matriz (n, d) normalizada (puede ser un memmap de solo lectura)
+            keep_delta: False si la nueva base ya incluye todos los cambios
+        """
+        with self._lock:
+            deleted = list(self._base_deleted) if keep_delta else []
+            if self._size == 0 or not keep_delta:
+                self._reset(matrix.shape[1])
+            elif matrix.shape[1] != self.dimension:
+                raise ValueError(
+                    f"Dimensión de embedding inválida: {matrix.shape[1]} (esperada {self.dimension})"
+                )
+
+            self._base_ids = ids
+            self._base_matrix = matrix
+            self._base_deleted = set()
+            for doc_id in list(self._positions) + deleted:
+                if self._base_contains(doc_id):
+                    self._base_deleted.add(doc_id)
+
+        self.logger.info(f"Segmento base del índice vectorial adjuntado ({len(ids)} documentos)")
+
+    @staticmethod
+    def normalize(vectors: np.ndarray) -> np.ndarray:
+        """
+        Normalizar vectores a norma L2 unitaria
+
+        Args:
+            vectors: Vector (d,) o matriz (n, d)
+
+        Returns:
+            Copia float32 contigua con filas normalizadas
+        """
+        matrix = np.array(vectors, dtype=np.float32, copy=True, ndmin=2, order="C")
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+        return matrix
+
+    def _reserve(self, required: int):
+        """Asegurar capacidad para `required` filas duplicando la matriz"""
+        capacity = self._matrix.shape[0]
+        if required <= capacity:
+            return
+
+        new_capacity = max(required, capacity * 2, self.initial_capacity)
+        matrix = np.zeros((new_capacity, self.dimension), dtype=np.float32)
+        ids = np.zeros(new_capacity, dtype=np.int64)
+        matrix[:self._size] = self._matrix[:self._size]
+        ids[:self._size] = self._ids[:self._size]
+        self._matrix = matrix
+        self._ids = ids
+
+    def build(self, ids: Iterable[int], embeddings: np.ndarray):
+        """
+        Construir el índice completo desde cero
+
+        Args:
+            ids: Identificadores de los documentos
+            embeddings: Matriz (n, d) de embeddings sin normalizar
+        """
+        ids = np.asarray(list(ids), dtype=np.int64)
+        with self._lock:
+            if len(ids) == 0:
+                self._reset(self.dimension)
+                return
+
+            matrix = self.normalize(embeddings)
+            self._reset(matrix.shape[1], max(len(ids), self.initial_capacity))
+            self._matrix[:len(ids)] = matrix
+            self._ids[:len(ids)] = ids
+            self._positions = {int(doc_id): i for i, doc_id in enumerate(ids)}
+            self._size = len(ids)
+
+        self.logger.info(f"Índice vectorial construido con {len(ids)} documentos")
+
+    def add(self, ids: Iterable[int], embeddings: np.ndarray):
+        """
+        Agregar o reemplazar vectores en el índice
+
+        Args:
+            ids: Identificadores de los documentos
+            embeddings: Matriz (n, d) de embeddings sin normalizar
+        """
+        ids = [int(doc_id) for doc_id in ids]
+        if not ids:
+            return
+
+        matrix = self.normalize(embeddings)
+        with self._lock:
+            if self.dimension == 0 or self.is_empty():
+                if self.dimension != matrix.shape[1]:
+                    self._reset(matrix.shape[1])
+            elif matrix.shape[1] != self.dimension:
+                raise ValueError(
+                    f"Dimensión de embedding inválida: {matrix.shape[1]} (esperada {self.dimension})"
+                )
+
+            self._reserve(self._size + len(ids))
+            for doc_id, vector in zip(ids, matrix):
+                if self._base_contains(doc_id):
+                    self._base_deleted.add(doc_id)
+                position = self._positions.get(doc_id)
+                if position is None:
+                    position = self._size
+                    self._positions[doc_id] = position
+                    self._ids[position] = doc_id
+                    self._size += 1
+                self._matrix[position] = vector
+
+    def remove(self, ids: Iterable[int]):
+        """
+        Eliminar vectores del índice (intercambio con la última fila)
+
+        Args:
+            ids: Identificadores de los documentos a eliminar
+        """
+        with self._lock:
+            for doc_id in ids:
+                doc_id = int(doc_id)
+                if self._base_contains(doc_id):
+                    self._base_deleted.add(doc_id)
+
+                position = self._positions.pop(doc_id, None)
+                if position is None:
+                    continue
+
+                last = self._size - 1
+                if position != last:
+                    last_id = int(self._ids[last])
+                    self._matrix[position] = self._matrix[last]
+                    self._ids[position] = last_id
+                    self._positions[last_id] = position
+                self._size -= 1
+
+    def _candidate_rows(self, candidate_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Filas (delta, base) de los ids candidatos presentes en el índice"""
+        delta_rows = [self._positions[doc_id] for doc_id in candidate_ids.tolist() if doc_id in self._positions]
+
+        base_rows = np.searchsorted(self._base_ids, candidate_ids)
+        valid = base_rows < len(self._base_ids)
+        base_rows = base_rows[valid]
+        base_rows = base_rows[self._base_ids[base_rows] == candidate_ids[valid]]
+        if self._base_deleted and len(base_rows):
+            deleted = np.fromiter(self._base_deleted, dtype=np.int64)
+            base_rows = base_rows[~np.isin(self._base_ids[base_rows], deleted)]
+
+        return np.asarray(delta_rows, dtype=np.int64), base_rows
+
+    def search(self, query_embedding: np.ndarray, top_k: int = 3,
+               candidate_ids: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        Buscar los documentos más similares a un embedding de consulta
+
+        Args:
+            query_embedding: Embedding de la consulta (sin normalizar)
+            top_k: Número de resultados
+            candidate_ids: Si se indica, solo se puntúan estos ids (p. ej. una
+                partición por categoría)
+
+        Returns:
+            Lista de tuplas (id, similitud coseno) ordenada de mayor a menor
+        """
+        query = self.normalize(query_embedding)[0]
+        with self._lock:
+            if self.is_empty() or top_k <= 0:
+                return []
+            if query.shape[0] != self.dimension:
+                raise ValueError(
+                    f"Dimensión de consulta inválida: {query.shape[0]} (esperada {self.dimension})"
+                )
+
+            if candidate_ids is not None:
+                # Solo las filas de la partición: el costo es proporcional a su tamaño
+                delta_rows, base_rows = self._candidate_rows(np.asarray(candidate_ids, dtype=np.int64))
+                scores = np.concatenate([self._base_matrix[base_rows] @ query, self._matrix[delta_rows] @ query])
+                ids = np.concatenate([self._base_ids[base_rows], self._ids[delta_rows]])
+            else:
+                # Un producto matriz-vector por segmento sobre matrices contiguas
+                scores = self._matrix[:self._size] @ query
+                ids = self._ids[:self._size]
+                if len(self._base_ids):
+                    base_scores = self._base_matrix @ query
+                    if self._base_deleted:
+                        deleted = np.searchsorted(self._base_ids, list(self._base_deleted))
+                        base_scores[deleted] = -np.inf
+                    scores = np.concatenate([base_scores, scores])
+                    ids = np.concatenate([self._base_ids, ids])
+
+            # Selección parcial: O(n) en lugar de ordenar todo
+            k = min(top_k, len(self), len(scores))
+            if k == 0:
+                return []
+            if k < len(scores):
+                candidates = np.argpartition(-scores, k - 1)[:k]
+            else:
+                candidates = np.arange(len(scores))
+            ordered = candidates[np.argsort(-scores[candidates])]
+
+            return [(int(ids[i]), float(scores[i])) for i in ordered]
@@ -2,12 +2,22 @@
 Agente de IA Conversacional - Sistema Principal
 """
 
+import time
+
+# Inicio del proceso: el desglose de arranque incluye las importaciones
+PROCESS_STARTED = time.perf_counter()
+
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from typing import Any, Dict, Literal, Optional
+from contextlib import asynccontextmanager
+from datetime import datetime
+import asyncio
+import json
 import uvicorn
 import os
 from dotenv import load_dotenv
@@ -18,14 +28,83 @@ from app.embedding_service import EmbeddingService
 from app.knowledge_base import KnowledgeBase
 from app.prompt_templates import PromptTemplates
 from app.ml_classifier import MLClassifier
+from app.embedding_backfill import EmbeddingBackfillWorker
+from app.bulk_ingest import BulkIngestor
+from app.query_logger import QueryHistoryLogger
+from app.category_router import CategoryRouter
+from app.reranker import CrossEncoderReranker
+from app.context_packer import ContextPacker
+from app.near_duplicates import DuplicateItemError
+from app.encoding_scheduler import EncodingScheduler
+from app.inference_pool import InferenceOverloadedError
+from app.startup import StartupTracker
+
+# Los modelos se cargan en el lifespan; aquí solo se mide la importación de módulos
+IMPORT_SECONDS = time.perf_counter() - PROCESS_STARTED
 
 # Cargar variables de entorno
 load_dotenv()
 
+async def warm_up():
+    """Cargar en paralelo la base, los modelos y el clasificador (el puerto ya está abierto)"""
+    # Restaurar base, índice y clasificador desde el snapshot si la base no existe
+    if snapshot_path:
+        await startup.run(
+            "snapshot", knowledge_base.restore_snapshot, snapshot_path, {"classifier": ml_classifier.model_path}
+        )
+    
+    await asyncio.gather(
+        startup.run("knowledge_base", knowledge_base.initialize),
+        startup.run("embedding_model", embedding_service.load),
+        startup.run("ml_classifier", ml_classifier.load_model),
+        startup.run("reranker", reranker.load)
+    )
+    for stage, seconds in embedding_service.load_timings.items():
+        startup.record(f"embedding_{stage}", seconds)
+    
+    if startup.is_ready("knowledge_base") and startup.is_ready("embedding_model"):
+        # El índice vectorial necesita el modelo, que pudo terminar después de la base
+        await startup.run("vector_index", knowledge_base.load_vector_index)
+        
+        # Completar embeddings de pasajes en segundo plano
+        await embedding_backfill.start()
+    
+    startup.finish()
+    print("Servicios inicializados correctamente")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Arranque y cierre de la aplicación
+    
+    Los servicios pesados se cargan en una tarea de fondo para que el servidor
+    acepte conexiones de inmediato; /health informa cuándo están listos.
+    """
+    print("Iniciando Agente de IA Conversacional...")
+    
+    # Agrupar en micro-lotes los embeddings de consultas concurrentes
+    await encoding_scheduler.start()
+    
+    # Guardar el historial de consultas por lotes en segundo plano
+    await query_logger.start()
+    
+    warm_up_task = asyncio.create_task(warm_up())
+    yield
+    
+    # La carga de modelos no se puede interrumpir: esperar a que termine
+    await warm_up_task
+    await embedding_backfill.stop()
+    await query_logger.stop()
+    await encoding_scheduler.stop()
+    await knowledge_base.close()
+    embedding_service.close()
+    reranker.close()
+
 # Inicializar FastAPI
 app = FastAPI(
     title="Agente de IA Conversacional",
     description="Sistema de IA para responder preguntas usando GenAI y recuperación semántica",
+    lifespan=lifespan,
     version="1.0.0"
 )
 
@@ -45,38 +124,81 @@ templates = Jinja2Templates(directory="templates")
 # Inicializar servicios
 genai_service = GenAIService()
 embedding_service = EmbeddingService()
-knowledge_base = KnowledgeBase()
+encoding_scheduler = EncodingScheduler(
+    embedding_service,
+    max_batch_size=int(os.getenv("ENCODE_BATCH_SIZE", 32)),
+    max_wait_ms=float(os.getenv("ENCODE_BATCH_WAIT_MS", 5)),
+    max_concurrency=int(os.getenv("ENCODE_CONCURRENCY", embedding_service.inference.workers))
+)
+knowledge_base = KnowledgeBase(embedding_service, encoding_scheduler)
 prompt_templates = PromptTemplates()
 ml_classifier = MLClassifier()
+embedding_backfill = EmbeddingBackfillWorker(
+    knowledge_base,
+    embedding_service,
+    batch_size=int(os.getenv("EMBEDDING_BACKFILL_BATCH_SIZE", 256)),
+    poll_interval=float(os.getenv("EMBEDDING_BACKFILL_INTERVAL", 30))
+)
+category_router = CategoryRouter(
+    ml_classifier,
+    min_confidence=float(os.getenv("ROUTING_MIN_CONFIDENCE", 0.5)),
+    max_categories=int(os.getenv("ROUTING_MAX_CATEGORIES", 3)),
+    enabled=os.getenv("CATEGORY_ROUTING", "false").lower() == "true"
+)
+query_logger = QueryHistoryLogger(
+    knowledge_base,
+    batch_size=int(os.getenv("QUERY_LOG_BATCH_SIZE", 100)),
+    flush_interval=float(os.getenv("QUERY_LOG_FLUSH_INTERVAL", 2))
+)
+reranker = CrossEncoderReranker(
+    model_name=os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2"),
+    candidates=int(os.getenv("RERANK_CANDIDATES", 20)),
+    budget_ms=float(os.getenv("RERANK_BUDGET_MS", 300)),
+    workers=int(os.getenv("RERANK_WORKERS", 1)),
+    max_pending=int(os.getenv("RERANK_MAX_PENDING", 2)),
+    enabled=os.getenv("RERANK", "false").lower() == "true"
+)
+context_packer = ContextPacker(
+    context_window=int(os.getenv("MODEL_CONTEXT_WINDOW", 4096)),
+    max_context_tokens=int(os.getenv("CONTEXT_MAX_TOKENS", 1500))
+)
+snapshot_path = os.getenv("SNAPSHOT_PATH")
+bulk_max_batch_size = int(os.getenv("BULK_MAX_BATCH_SIZE", 5000))
+bulk_max_line_bytes = int(os.getenv("BULK_MAX_LINE_BYTES", 1 << 20))
+startup = StartupTracker(
+    "knowledge_base", "embedding_model", "ml_classifier", "reranker", started=PROCESS_STARTED
+)
+startup.record("imports", IMPORT_SECONDS)
 
 # Modelos Pydantic para las APIs
 class QuestionRequest(BaseModel):
     question: str
     context: str = ""
+    search_mode: Optional[Literal["semantic", "lexical", "hybrid", "keyword"]] = None
+    diversify: bool = False
 
 class QuestionResponse(BaseModel):
     answer: str
     confidence: float
     sources: list
     classification: str
+    context_usage: Optional[Dict[str, Any]] = None
 
 class KnowledgeItem(BaseModel):
     title: str
     content: str
     category: str
 
-@app.on_event("startup")
-async def startup_event():
-    """Inicializar servicios al arrancar la aplicación"""
-    print("Iniciando Agente de IA Conversacional...")
-    
-    # Inicializar base de conocimiento
-    await knowledge_base.initialize()
-    
-    # Cargar modelo de ML
-    ml_classifier.load_model()
-    
-    print("Servicios inicializados correctamente")
+@app.middleware("http")
+async def require_knowledge_base(request: Request, call_next):
+    """Responder 503 en /api/* mientras la base de conocimiento se inicializa"""
+    if request.url.path.startswith("/api/") and not startup.is_ready("knowledge_base"):
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Servicio iniciando, base de conocimiento no disponible"},
+            headers={"Retry-After": "1"}
+        )
+    return await call_next(request)
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
@@ -85,17 +207,42 @@ async def read_root(request: Request):
 
 @app.get("/health")
 async def health_check():
-    """Endpoint de verificación de salud"""
+    """Endpoint de verificación de salud (el proceso responde aunque los modelos sigan cargando)"""
+    status = startup.get_status()
+    if not status["complete"]:
+        health = "starting"
+    elif any(s["status"] == "failed" for s in status["services"].values()):
+        health = "degraded"
+    else:
+        health = "healthy"
+    
     return {
-        "status": "healthy",
+        "status": health,
+        "ready": startup.is_ready("knowledge_base"),
         "services": {
             "genai": genai_service.is_available(),
             "embedding": embedding_service.is_available(),
             "knowledge_base": knowledge_base.is_available(),
             "ml_classifier": ml_classifier.is_available()
-        }
+        },
+        "startup": status,
+        "embedding_backfill": embedding_backfill.get_progress(),
+        "query_log": query_logger.get_stats(),
+        "reranker": reranker.get_stats(),
+        "embedding_cache": embedding_service.get_cache_stats(),
+        "encoding_scheduler": encoding_scheduler.get_stats(),
+        "inference": embedding_service.get_inference_stats()
     }
 
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness: 200 cuando terminó el arranque y la base está lista, 503 mientras tanto"""
+    ready = startup.is_complete() and startup.is_ready("knowledge_base")
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "services": startup.get_status()["services"]}
+    )
+
 @app.post("/api/ask", response_model=QuestionResponse)
 async def ask_question(request: QuestionRequest):
     """
@@ -103,23 +250,49 @@ async def ask_question(request: QuestionRequest):
     
     Proceso:
     1. Clasificar la pregunta usando ML
-    2. Buscar información relevante usando embeddings
-    3. Generar respuesta usando GenAI con prompt template
+    2. Buscar información relevante usando embeddings, solo en las
+       categorías probables según el clasificador
+    3. Reordenar los candidatos con el cross-encoder (si está activo)
+    4. Armar el contexto dentro del presupuesto de tokens del template
+    5. Generar respuesta usando GenAI con prompt template
     """
     try:
-        # Clasificar la pregunta
-        classification = ml_classifier.classify_question(request.question)
+        # Clasificar la pregunta una sola vez, fuera del event loop
+        ranked = await ml_classifier.get_class_probabilities_async(request.question)
+        classification = ranked[0][0]
+        
+        # Elegir las particiones a consultar (se amplía si la clasificación es dudosa)
+        route = category_router.route_probabilities(ranked)
         
         # Buscar información relevante en la base de conocimiento
+        rerank = reranker.is_available()
         relevant_docs = await knowledge_base.search_similar(
-            request.question, 
-            top_k=3
+            request.question,
+            top_k=reranker.candidates if rerank else 3,
+            mode=request.search_mode,
+            categories=route["categories"],
+            diversify=request.diversify and not rerank
         )
         
-        # Preparar el contexto
-        context = "\n".join([doc["content"] for doc in relevant_docs])
-        if request.context:
-            context += f"\n\nContexto adicional: {request.context}"
+        # Segunda etapa: cross-encoder con presupuesto de tiempo
+        if rerank and request.diversify:
+            # MMR sobre la lista reordenada, justo antes del corte final
+            relevant_docs = await reranker.rerank(request.question, relevant_docs, top_k=len(relevant_docs))
+            relevant_docs = await knowledge_base.diversify_results(relevant_docs, top_k=3)
+        else:
+            relevant_docs = await reranker.rerank(request.question, relevant_docs, top_k=3)
+        
+        # Preparar el contexto dentro del presupuesto del template
+        template_info = prompt_templates.get_template_for(classification)
+        additional = f"\n\nContexto adicional: {request.context}" if request.context else ""
+        budget = context_packer.budget_for(template_info, request.question)
+        packed = context_packer.pack(
+            relevant_docs,
+            max(0, budget - context_packer.estimate_tokens(additional))
+        )
+        context = packed.pop("context") + additional
+        # Solo se citan (y puntúan) los documentos que el modelo recibió
+        context_docs = packed.pop("documents")
         
         # Seleccionar template de prompt basado en la clasificación
         prompt = prompt_templates.get_prompt(
@@ -129,21 +302,29 @@ async def ask_question(request: QuestionRequest):
         )
         
         # Generar respuesta usando GenAI
-        answer = await genai_service.generate_response(prompt)
+        answer = await genai_service.generate_response(prompt, max_tokens=template_info["max_tokens"])
         
         # Calcular confianza basada en la similitud semántica
-        confidence = embedding_service.calculate_confidence(
+        confidence = await embedding_service.calculate_confidence_async(
             request.question, 
-            relevant_docs
+            context_docs
         )
         
+        sources = [doc["title"] for doc in context_docs]
+        
+        # Registrar la interacción (se escribe por lotes fuera de la petición)
+        query_logger.log(request.question, answer, confidence, sources, classification)
+        
         return QuestionResponse(
             answer=answer,
             confidence=confidence,
-            sources=[doc["title"] for doc in relevant_docs],
-            classification=classification
+            sources=sources,
+            classification=classification,
+            context_usage=packed
         )
-        
+    
+    except InferenceOverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error procesando pregunta: {str(e)}")
 
@@ -156,16 +337,99 @@ async def add_knowledge(item: KnowledgeItem):
             content=item.content,
             category=item.category
         )
+        embedding_backfill.notify()
         return {"message": "Conocimiento agregado exitosamente", "id": result}
+    except DuplicateItemError as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "duplicate_of": e.duplicate_of})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error agregando conocimiento: {str(e)}")
 
+@app.post("/api/knowledge/bulk")
+async def add_knowledge_bulk(request: Request, batch_size: int = 500, embed: bool = True):
+    """
+    Carga masiva de conocimiento en NDJSON (un objeto {title, content, category} por línea)
+    
+    Acepta el cuerpo NDJSON en streaming o un archivo multipart en el campo 'file'.
+    """
+    try:
+        if request.headers.get("content-type", "").startswith("multipart/form-data"):
+            form = await request.form()
+            upload = form.get("file")
+            if upload is None or isinstance(upload, str):
+                raise HTTPException(status_code=400, detail="Se requiere un archivo en el campo 'file'")
+            
+            async def read_upload():
+                while chunk := await upload.read(64 * 1024):
+                    yield chunk
+            chunks = read_upload()
+        else:
+            chunks = request.stream()
+        
+        ingestor = BulkIngestor(
+            knowledge_base, embedding_service,
+            batch_size=max(1, min(batch_size, bulk_max_batch_size)),
+            max_line_bytes=bulk_max_line_bytes
+        )
+        report = await ingestor.ingest(chunks, embed=embed)
+        embedding_backfill.notify()
+        return report
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en carga masiva: {str(e)}")
+
+@app.post("/api/knowledge/dedup")
+async def deduplicate_knowledge(action: Literal["link", "delete"] = "link", threshold: Optional[float] = None):
+    """
+    Buscar casi duplicados en toda la base (MinHash + LSH)
+    
+    - action=link: enlaza cada duplicado con su original
+    - action=delete: elimina los duplicados y conserva el más antiguo
+    """
+    try:
+        return await knowledge_base.deduplicate(action=action, threshold=threshold)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.get("/api/knowledge")
-async def get_knowledge():
-    """Obtener todos los elementos de la base de conocimiento"""
+async def get_knowledge(
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    category: Optional[str] = None,
+    updated_after: Optional[datetime] = None,
+    updated_before: Optional[datetime] = None,
+    format: Literal["json", "jsonl"] = "json"
+):
+    """
+    Listar la base de conocimiento con paginación por cursor
+    
+    - fields: columnas separadas por comas (por defecto sin 'embedding')
+    - format=jsonl: exporta todos los elementos filtrados en streaming (JSON Lines)
+    """
+    filters = {
+        "fields": fields.split(",") if fields else None,
+        "category": category,
+        "updated_after": updated_after,
+        "updated_before": updated_before
+    }
     try:
-        items = await knowledge_base.get_all_items()
-        return {"items": items}
+        if format == "jsonl":
+            # Validar filtros antes de empezar a transmitir
+            await knowledge_base.list_items(limit=1, **filters)
+            
+            async def export_lines():
+                async for item in knowledge_base.stream_items(**filters):
+                    yield json.dumps(item, ensure_ascii=False, default=str) + "\n"
+            
+            return StreamingResponse(export_lines(), media_type="application/x-ndjson")
+        
+        items, next_cursor = await knowledge_base.list_items(
+            limit=max(1, min(limit, 1000)), cursor=cursor, **filters
+        )
+        return {"items": items, "next_cursor": next_cursor}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo conocimiento: {str(e)}")
 
@@ -179,8 +443,7 @@ async def classify_text(request: dict):
     """Clasificar texto usando el modelo de ML"""
     try:
         text = request.get("text", "")
-        classification = ml_classifier.classify_question(text)
-        confidence = ml_classifier.get_classification_confidence(text)
+        classification, confidence = (await ml_classifier.get_class_probabilities_async(text))[0]
         
         return {
             "classification": classification,
@@ -190,12 +453,32 @@ async def classify_text(request: dict):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error clasificando texto: {str(e)}")
 
+@app.get("/api/index/quantization-report")
+async def quantization_report(sample_size: int = 200, top_k: int = 10):
+    """Recall@k del índice int8 frente a la búsqueda exacta float32"""
+    try:
+        return await knowledge_base.quantization_report(sample_size=sample_size, top_k=top_k)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/api/snapshot")
+async def export_snapshot():
+    """Exportar base, embeddings, índice y clasificador al archivo SNAPSHOT_PATH"""
+    if not snapshot_path:
+        raise HTTPException(status_code=400, detail="SNAPSHOT_PATH no configurado")
+    try:
+        return await knowledge_base.export_snapshot(snapshot_path, {"classifier": ml_classifier.model_path})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error exportando snapshot: {str(e)}")
+
 @app.get("/api/embeddings/similarity")
 async def calculate_similarity(text1: str, text2: str):
     """Calcular similitud semántica entre dos textos"""
     try:
-        similarity = embedding_service.calculate_similarity(text1, text2)
+        similarity = await embedding_service.calculate_similarity_async(text1, text2)
         return {"similarity": similarity}
+    except InferenceOverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error calculando similitud: {str(e)}")
 
@@ -210,7 +493,7 @@ if __name__ == "__main__":
         "main:app",
         host=host,
         port=port,
-        reload=True,
+        reload=os.getenv("RELOAD", "false").lower() == "true",
         log_level="info"
     )
 
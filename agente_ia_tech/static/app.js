@@ -247,12 +247,18 @@ class AIAgentApp {
     
     async loadKnowledgeBase() {
         try {
-            const response = await this.callAPI('/api/knowledge');
-            if (response.ok) {
+            let items = [];
+            let cursor = null;
+            do {
+                const url = cursor ? `/api/knowledge?cursor=${encodeURIComponent(cursor)}` : '/api/knowledge';
+                const response = await this.callAPI(url);
+                if (!response.ok) break;
                 const data = await response.json();
-                this.knowledgeItems = data.items;
-                this.renderKnowledgeItems(this.knowledgeItems);
-            }
+                items = items.concat(data.items);
+                cursor = data.next_cursor;
+            } while (cursor);
+            this.knowledgeItems = items;
+            this.renderKnowledgeItems(this.knowledgeItems);
         } catch (error) {
             console.error('Error loading knowledge base:', error);
         }
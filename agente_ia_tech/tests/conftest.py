@@ -0,0 +1,32 @@
+"""
+Fixtures compartidas - Base de conocimiento temporal
+"""
+
+import contextlib
+import pytest
+
+from app.knowledge_base import KnowledgeBase
+
+@pytest.fixture
+def knowledge_base_factory(tmp_path, monkeypatch):
+    """
+    Abrir una KnowledgeBase sobre una base SQLite temporal
+
+    Uso: ``async with knowledge_base_factory(VECTOR_INDEX="ivf") as kb``; las
+    variables indicadas se aplican como entorno antes de crearla. Se puede
+    pasar embedding_service para habilitar la búsqueda semántica.
+    """
+    monkeypatch.setenv("DATABASE_PATH", str(tmp_path / "knowledge_base.db"))
+
+    @contextlib.asynccontextmanager
+    async def factory(embedding_service=None, **env):
+        for name, value in env.items():
+            monkeypatch.setenv(name, str(value))
+        kb = KnowledgeBase(embedding_service=embedding_service)
+        await kb.initialize()
+        try:
+            yield kb
+        finally:
+            await kb.close()
+
+    return factory
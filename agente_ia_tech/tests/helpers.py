@@ -0,0 +1,50 @@
+"""
+Utilidades de las pruebas - Embeddings sintéticos y servicio de embeddings falso
+"""
+
+import hashlib
+from typing import List
+import numpy as np
+
+def unit_vectors(count: int, dim: int = 32, seed: int = 0) -> np.ndarray:
+    """Vectores aleatorios normalizados (float32)"""
+    vectors = np.random.default_rng(seed).standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+class FakeEmbeddingService:
+    """
+    Sustituto determinista de EmbeddingService
+
+    Cada palabra suma un vector pseudoaleatorio fijo, de modo que textos con
+    palabras en común quedan cerca sin cargar ningún modelo.
+    """
+
+    def __init__(self, dim: int = 64, model_name: str = "fake-model"):
+        self.dim = dim
+        self.model_name = model_name
+
+    def is_available(self) -> bool:
+        return True
+
+    def _word_vector(self, word: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+        return np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+
+    def encode_text(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in text.lower().split():
+            vector += self._word_vector(word)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode_batch(self, texts: List[str]) -> np.ndarray:
+        return np.stack([self.encode_text(text) for text in texts])
+
+    async def encode_text_async(self, text: str) -> np.ndarray:
+        return self.encode_text(text)
+
+    async def encode_batch_async(self, texts: List[str]) -> np.ndarray:
+        return self.encode_batch(texts)
+
+    async def encode_texts_async(self, texts: List[str]) -> List[np.ndarray]:
+        return list(self.encode_batch(texts))
@@ -0,0 +1,89 @@
+"""
+Pruebas del índice IVF-Flat frente a la búsqueda exacta
+"""
+
+import numpy as np
+
+from app.ann_index import IVFFlatIndex
+from app.vector_index import VectorIndex
+from tests.helpers import unit_vectors
+
+def brute_force(vectors, ids, query, top_k):
+    scores = vectors @ query
+    order = np.argsort(-scores)[:top_k]
+    return [int(ids[i]) for i in order]
+
+def recall(index, vectors, ids, queries, top_k=10):
+    hits = 0
+    for query in queries:
+        expected = set(brute_force(vectors, ids, query, top_k))
+        hits += len(expected & {doc_id for doc_id, _ in index.search(query, top_k)})
+    return hits / (len(queries) * top_k)
+
+def test_incremental_growth_retrains_the_centroids():
+    """Un índice entrenado con pocos vectores se reentrena al crecer y rinde como uno construido de una vez"""
+    vectors = unit_vectors(3000, dim=32, seed=1)
+    ids = np.arange(1, 3001)
+    queries = unit_vectors(50, dim=32, seed=2)
+    index = IVFFlatIndex(nprobe=8, retrain_ratio=2.0)
+    for doc_id, vector in zip(ids[:8], vectors[:8]):
+        index.add([doc_id], vector[None])
+    for start in range(8, 3000, 100):
+        index.add(ids[start:start + 100], vectors[start:start + 100])
+
+    assert len(index) == 3000
+    assert index._trained_size > 1500
+    assert index.centroids.shape[0] == int(4 * np.sqrt(index._trained_size))
+    for position in (0, 1500, 2999):
+        assert index.search(vectors[position], top_k=1)[0][0] == ids[position]
+
+    built = IVFFlatIndex(nprobe=8)
+    built.build(ids, vectors)
+    assert recall(index, vectors, ids, queries) >= recall(built, vectors, ids, queries) - 0.1
+
+def test_add_replaces_and_remove_is_batched():
+    """Agregar un id existente lo reemplaza; remove elimina varios ids de una vez"""
+    vectors = unit_vectors(500, dim=16, seed=3)
+    index = IVFFlatIndex(nlist=10, nprobe=10)
+    index.build(range(500), vectors)
+
+    index.add([7], vectors[8][None])
+    assert len(index) == 500
+    top = index.search(vectors[8], top_k=2)
+    assert {doc_id for doc_id, _ in top} == {7, 8}
+
+    index.remove(list(range(0, 500, 2)))
+    assert len(index) == 250
+    remaining = np.arange(1, 500, 2)
+    query = unit_vectors(1, dim=16, seed=4)[0]
+    assert [doc_id for doc_id, _ in index.search(query, top_k=5)] == \
+        brute_force(vectors[remaining], remaining, query, 5)
+
+def test_small_candidate_sets_are_scored_exactly():
+    """Los candidatos enrutados fuera de las listas exploradas no se pierden"""
+    vectors = unit_vectors(2000, dim=32, seed=5)
+    index = IVFFlatIndex(nlist=40, nprobe=1)
+    index.build(range(2000), vectors)
+
+    query = unit_vectors(1, dim=32, seed=6)[0]
+    candidates = np.arange(0, 2000, 50)
+    expected = brute_force(vectors[candidates], candidates, query, 5)
+    assert [doc_id for doc_id, _ in index.search(query, top_k=5, candidate_ids=candidates)] == expected
+
+def test_save_and_load_round_trip(tmp_path):
+    """El índice guardado se carga con las mismas listas y el tamaño de entrenamiento"""
+    vectors = unit_vectors(300, dim=16, seed=7)
+    index = IVFFlatIndex(nlist=8, nprobe=8)
+    index.build(range(300), vectors)
+    index.add([1000], unit_vectors(1, dim=16, seed=8))
+    path = str(tmp_path / "ivf.npz")
+    index.save(path, "huella")
+
+    loaded = IVFFlatIndex(nprobe=8)
+    assert not loaded.load(path, "otra")
+    assert loaded.load(path, "huella")
+    assert len(loaded) == 301 and loaded._trained_size == 300
+    query = VectorIndex.normalize(vectors[42])[0]
+    assert loaded.search(query, top_k=3) == index.search(query, top_k=3)
+    loaded.add([1001], unit_vectors(1, dim=16, seed=9))
+    assert len(loaded) == 302
@@ -0,0 +1,54 @@
+"""
+Pruebas de la ingesta masiva NDJSON
+"""
+
+import asyncio
+import json
+
+from app.bulk_ingest import BulkIngestor
+from tests.helpers import FakeEmbeddingService
+
+async def stream(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+async def collect(chunks, max_line_bytes=1 << 20):
+    return [line async for line in BulkIngestor.iter_lines(stream(*chunks), max_line_bytes)]
+
+def test_iter_lines_joins_lines_split_across_chunks():
+    """Las líneas partidas entre fragmentos se reconstruyen y la última sin salto se entrega"""
+    lines = asyncio.run(collect([b"uno\ndo", b"s", b"\ntres\n\ncua", b"tro"]))
+    assert lines == [b"uno", b"dos", b"tres", b"", b"cuatro"]
+
+def test_iter_lines_rejects_oversized_lines():
+    """Una línea más larga que el máximo se descarta completa y se señala con None"""
+    long_line = [b"x" * 6] * 5 + [b"x\nsiguiente\n"]
+    assert asyncio.run(collect([b"corta\n", *long_line], max_line_bytes=16)) == [b"corta", None, b"siguiente"]
+    assert asyncio.run(collect([b"a" * 20 + b"\nb\n"], max_line_bytes=16)) == [None, b"b"]
+    assert asyncio.run(collect([b"a" * 20], max_line_bytes=16)) == [None]
+
+def test_ingest_reports_merges_separately(knowledge_base_factory):
+    """Con DEDUP_POLICY=merge los documentos fusionados no cuentan como insertados"""
+    async def scenario():
+        service = FakeEmbeddingService()
+        async with knowledge_base_factory(service, DEDUP_POLICY="merge") as kb:
+            content = "Las solicitudes de equipo nuevo se hacen en el portal de soporte con la aprobación del jefe directo"
+            await kb.add_item("Equipos", content, "Tecnología")
+            records = [
+                {"title": "Equipos v2", "content": content + " inmediato", "category": "Tecnología"},
+                {"title": "Capacitación", "content": "Cada empleado dispone de cuarenta horas anuales de formación pagada", "category": "Recursos Humanos"},
+                "no es un objeto",
+            ]
+            body = ("\n".join(json.dumps(record) for record in records) + "\n").encode()
+            body += b'{"title": "' + b"x" * 400 + b'"}\n'
+
+            ingestor = BulkIngestor(kb, service, batch_size=10, max_line_bytes=256)
+            report = await ingestor.ingest(stream(body[:50], body[50:]))
+
+            assert report["inserted"] == 1
+            assert report["merged"] == 1
+            assert report["failed"] == 2
+            assert [error["line"] for error in report["errors"]] == [3, 4]
+            assert report["embedded"] == report["passages"] == 2
+
+    asyncio.run(scenario())
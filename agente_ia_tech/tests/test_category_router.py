@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from app.category_router import CategoryRouter
+from app.ml_classifier import MLClassifier
+
+QUESTIONS = [
+    "¿Cuántos días de vacaciones tengo?",
+    "No puedo entrar a la VPN con mi contraseña",
+    "¿Cuál es el procedimiento de aprobación de gastos?",
+    "¿Qué dice la política de confidencialidad?",
+    "¿Dónde queda la oficina de la empresa?",
+    "pregunta sin palabras clave",
+]
+
+
+class CountingClassifier:
+    def __init__(self, ranked):
+        self.ranked = ranked
+        self.calls = 0
+
+    def get_class_probabilities(self, question):
+        self.calls += 1
+        return self.ranked
+
+
+@pytest.mark.parametrize("ranked, expected", [
+    ([("tecnologia", 0.9), ("procesos", 0.1)], (["tecnologia"], False)),
+    ([("tecnologia", 0.45), ("procesos", 0.4), ("general", 0.15)], (["tecnologia", "procesos"], True)),
+    ([("a", 0.25), ("b", 0.25), ("c", 0.25), ("d", 0.25)], (None, True)),
+])
+def test_route_probabilities_matches_route(ranked, expected):
+    classifier = CountingClassifier(ranked)
+    router = CategoryRouter(classifier, min_confidence=0.5, coverage=0.8, max_categories=3)
+
+    routed = router.route_probabilities(ranked)
+
+    assert classifier.calls == 0
+    assert (routed["categories"], routed["widened"]) == expected
+    assert routed["confidence"] == ranked[0][1]
+    assert router.route("pregunta") == routed
+
+
+def test_disabled_router_searches_everything():
+    router = CategoryRouter(CountingClassifier([("tecnologia", 0.9)]), enabled=False)
+    assert router.route_probabilities([("tecnologia", 0.9)])["categories"] is None
+
+
+@pytest.mark.parametrize("trained", [False, True])
+def test_top_probability_is_the_classification(trained, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    classifier = MLClassifier()
+    if trained:
+        classifier.load_model()
+        assert classifier.is_available()
+    else:
+        classifier._create_basic_model()
+
+    for question in QUESTIONS:
+        ranked = asyncio.run(classifier.get_class_probabilities_async(question))
+        assert ranked[0][0] == classifier.classify_question(question)
+        assert ranked[0][1] == pytest.approx(classifier.get_classification_confidence(question))
@@ -0,0 +1,62 @@
+"""
+Pruebas de la división de documentos en pasajes
+"""
+
+from app.chunking import PassageChunker
+
+DOCUMENT = """Introducción general del documento.
+
+# Vacaciones
+- Quince días hábiles por año
+- Se solicitan con un mes de anticipación
+
+**Semana 1:**
+- Presentación del equipo
+- Configuración del equipo de trabajo
+
+## Solo encabezado
+"""
+
+def test_sections_follow_headings():
+    passages = PassageChunker(max_chars=500).split(DOCUMENT)
+
+    assert [passage["heading"] for passage in passages] == [None, "Vacaciones", "Semana 1", None]
+    assert [passage["ordinal"] for passage in passages] == [0, 1, 2, 3]
+    assert passages[0]["content"] == "Introducción general del documento."
+    assert passages[1]["content"] == (
+        "Vacaciones:\n- Quince días hábiles por año\n- Se solicitan con un mes de anticipación"
+    )
+    assert passages[2]["content"].startswith("Semana 1:\n- Presentación del equipo")
+    # Un encabezado sin cuerpo queda como pasaje propio
+    assert passages[3]["content"] == "Solo encabezado"
+
+def test_long_sections_overlap_by_units():
+    lines = [f"- Punto número {i} de la política de viajes" for i in range(12)]
+    content = "# Viajes\n" + "\n".join(lines)
+    chunker = PassageChunker(max_chars=150, overlap_units=1)
+
+    passages = chunker.split(content)
+
+    assert len(passages) > 2
+    bodies = []
+    for passage in passages:
+        assert passage["heading"] == "Viajes"
+        assert passage["content"].startswith("Viajes:\n")
+        assert len(passage["content"]) <= 150
+        bodies.append(passage["content"].split("\n")[1:])
+    # Cada pasaje repite la última línea del anterior y no se pierde ninguna
+    for previous, current in zip(bodies, bodies[1:]):
+        assert current[0] == previous[-1]
+    assert sorted({line for body in bodies for line in body}) == sorted(lines)
+
+def test_without_overlap_lines_are_not_repeated():
+    lines = [f"Párrafo {i} con algo de texto adicional" for i in range(10)]
+    passages = PassageChunker(max_chars=100, overlap_units=0).split("\n".join(lines))
+
+    assert [line for passage in passages for line in passage["content"].split("\n")] == lines
+
+def test_overlap_is_dropped_when_it_does_not_fit():
+    long_line = "x" * 90
+    passages = PassageChunker(max_chars=100, overlap_units=1).split(f"{long_line}\n{long_line}y")
+
+    assert [passage["content"] for passage in passages] == [long_line, long_line + "y"]
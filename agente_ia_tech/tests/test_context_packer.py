@@ -0,0 +1,56 @@
+"""
+Pruebas del ensamblado de contexto dentro del presupuesto de tokens
+"""
+
+from app.context_packer import ContextPacker
+
+def doc(title, content, **scores):
+    return {"title": title, "content": content, **scores}
+
+def test_budget_subtracts_template_answer_and_reserve():
+    packer = ContextPacker(context_window=1000, max_context_tokens=5000, reserve_tokens=50)
+    template = {"template": "Pregunta: {question}\nContexto: {context}", "max_tokens": 300}
+
+    overhead = packer.estimate_tokens("Pregunta: ¿hola?\nContexto: ")
+    assert packer.budget_for(template, "¿hola?") == 1000 - 300 - overhead - 50
+
+    capped = ContextPacker(context_window=1000, max_context_tokens=100, reserve_tokens=50)
+    assert capped.budget_for(template, "¿hola?") == 100
+    tiny = ContextPacker(context_window=100, reserve_tokens=50)
+    assert tiny.budget_for(template, "¿hola?") == 0
+
+def test_pack_stays_within_budget_in_score_order():
+    packer = ContextPacker(chars_per_token=1.0, min_snippet_tokens=5)
+    docs = [
+        doc("bajo", "b" * 30, similarity_score=0.2),
+        doc("alto", "a" * 30, rerank_score=0.9, similarity_score=0.1),
+        doc("medio", "m" * 30, fusion_score=0.5),
+    ]
+
+    packed = packer.pack(docs, budget=62)
+
+    assert packed["context"] == "a" * 30 + "\n" + "m" * 30
+    assert packed["used_tokens"] == 61 <= packed["budget_tokens"]
+    assert [item["title"] for item in packed["included"]] == ["alto", "medio"]
+    assert packed["dropped"] == ["bajo"]
+
+def test_trims_at_sentence_end_and_cites_only_included_documents():
+    packer = ContextPacker(chars_per_token=1.0, min_snippet_tokens=10)
+    first = doc("Vacaciones", "Quince días hábiles por año.", similarity_score=0.9)
+    second = doc("Viajes", "Primera oración del documento. Segunda oración mucho más larga que no cabe.",
+                 similarity_score=0.8)
+    third = doc("Remoto", "Dos días por semana desde casa.", similarity_score=0.7)
+
+    packed = packer.pack([third, second, first], budget=60)
+
+    assert packed["context"] == "Quince días hábiles por año.\nPrimera oración del documento."
+    assert packed["included"][1] == {"title": "Viajes", "tokens": 30, "trimmed": True}
+    # Solo los documentos que entraron al contexto se citan, en el mismo orden
+    assert packed["documents"] == [first, second]
+    assert packed["dropped"] == ["Remoto"]
+    assert packed["used_tokens"] <= 60
+
+def test_empty_budget_drops_everything():
+    packed = ContextPacker().pack([doc("a", "Texto."), doc("b", "")], budget=0)
+    assert packed["context"] == "" and packed["documents"] == []
+    assert packed["dropped"] == ["a", "b"]
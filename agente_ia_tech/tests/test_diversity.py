@@ -0,0 +1,60 @@
+"""
+Pruebas de la selección por Maximal Marginal Relevance
+"""
+
+import numpy as np
+
+from app.diversity import maximal_marginal_relevance
+
+def test_near_copies_give_way_to_a_different_document():
+    base = np.array([1.0, 0.0, 0.0])
+    embeddings = {
+        1: base,
+        2: base + np.array([0.0, 0.01, 0.0]),
+        3: base + np.array([0.0, 0.0, 0.02]),
+        4: np.array([0.0, 1.0, 0.0]),
+    }
+    hits = [(1, 0.95), (2, 0.94), (3, 0.93), (4, 0.80)]
+
+    assert maximal_marginal_relevance(hits, embeddings, top_k=2, lambda_=0.7) == [(1, 0.95), (4, 0.80)]
+    # lambda 1: solo relevancia, el orden original
+    assert maximal_marginal_relevance(hits, embeddings, top_k=3, lambda_=1.0) == hits[:3]
+
+def test_matches_a_direct_implementation():
+    rng = np.random.default_rng(21)
+    vectors = rng.standard_normal((12, 8))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    hits = [(100 + i, float(score)) for i, score in enumerate(np.sort(rng.random(12))[::-1])]
+    embeddings = {doc_id: vectors[i] for i, (doc_id, _) in enumerate(hits)}
+
+    expected = [0]
+    while len(expected) < 5:
+        best, best_value = None, -np.inf
+        for i in range(12):
+            if i in expected:
+                continue
+            redundancy = max(float(vectors[i] @ vectors[j]) for j in expected)
+            value = 0.6 * hits[i][1] - 0.4 * redundancy
+            if value > best_value:
+                best, best_value = i, value
+        expected.append(best)
+
+    selected = maximal_marginal_relevance(hits, embeddings, top_k=5, lambda_=0.6)
+    assert selected == [hits[i] for i in expected]
+
+def test_missing_embeddings_and_small_inputs():
+    hits = [(1, 0.9), (2, 0.8), (3, 0.7)]
+    # Sin embedding no hay redundancia: se respeta la relevancia
+    assert maximal_marginal_relevance(hits, {1: np.ones(4)}, top_k=3, lambda_=0.5) == hits
+    assert maximal_marginal_relevance(hits[:1], {}, top_k=3) == hits[:1]
+    assert maximal_marginal_relevance(hits, {}, top_k=0) == []
+
+def test_normalized_scores_use_the_relevance_range():
+    # Scores de fusión muy juntos: sin normalizar la redundancia domina
+    base = np.array([1.0, 0.0])
+    embeddings = {1: base, 2: base, 3: np.array([0.0, 1.0])}
+    hits = [(1, 0.0331), (2, 0.0330), (3, 0.0100)]
+
+    assert maximal_marginal_relevance(hits, embeddings, top_k=2, lambda_=0.95)[1][0] == 3
+    assert maximal_marginal_relevance(hits, embeddings, top_k=2, lambda_=0.95,
+                                      normalize_scores=True)[1][0] == 2
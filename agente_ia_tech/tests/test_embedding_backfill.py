@@ -0,0 +1,31 @@
+"""
+Pruebas de la escritura de embeddings de pasajes
+"""
+
+import asyncio
+
+from tests.helpers import unit_vectors
+
+def count_embedded_passages(connection):
+    return connection.execute("SELECT COUNT(*) FROM knowledge_passages WHERE embedding IS NOT NULL").fetchone()[0]
+
+def test_deleted_passages_do_not_reach_the_index(knowledge_base_factory):
+    """Un pasaje borrado entre la lectura y la escritura no deja vectores huérfanos"""
+    async def scenario():
+        async with knowledge_base_factory(DEDUP_POLICY="link") as kb:
+            content = "El reembolso de gastos de viaje se solicita con la factura original dentro de los treinta días"
+            await kb.add_item("Reembolsos", content, "finanzas")
+            await kb.add_item("Reembolsos (copia)", content + " hábiles", "finanzas")
+
+            pending = await kb.get_passages_needing_embeddings("modelo", 1000)
+            report = await kb.deduplicate("delete")
+            assert report["duplicates"] == 1
+
+            ids = [passage["id"] for passage in pending]
+            await kb.update_passage_embeddings(ids, unit_vectors(len(ids)), "modelo")
+
+            stored = await kb.db.read(count_embedded_passages)
+            assert stored == len(ids) - 1
+            assert len(kb.vector_index) == stored
+
+    asyncio.run(scenario())
@@ -0,0 +1,69 @@
+"""
+Pruebas del codec binario de embeddings
+"""
+
+import asyncio
+import json
+import sqlite3
+
+import numpy as np
+import pytest
+
+from app.embedding_codec import HEADER_SIZE, decode_embedding, encode_embedding, is_encoded_embedding
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float16, np.int8])
+def test_round_trip(dtype):
+    vector = (np.random.default_rng(0).standard_normal(384) * 50).astype(dtype)
+    blob = encode_embedding(vector, dtype=dtype)
+
+    assert is_encoded_embedding(blob)
+    assert len(blob) == HEADER_SIZE + vector.nbytes
+    decoded = decode_embedding(blob)
+    assert decoded.dtype == np.dtype(dtype)
+    np.testing.assert_array_equal(decoded, vector)
+
+def test_decoded_payload_is_a_read_only_view():
+    blob = encode_embedding([0.25, -1.5, 3.0])
+    decoded = decode_embedding(blob)
+    assert decoded.tolist() == [0.25, -1.5, 3.0]
+    assert not decoded.flags.writeable
+    # memoryview (como los BLOB leídos en bloque) también se reconoce
+    assert is_encoded_embedding(memoryview(blob))
+
+def test_legacy_json_is_decoded():
+    legacy = json.dumps([0.1, 0.2, -0.3])
+    assert not is_encoded_embedding(legacy)
+    decoded = decode_embedding(legacy)
+    assert decoded.dtype == np.float32
+    np.testing.assert_allclose(decoded, [0.1, 0.2, -0.3], rtol=1e-6)
+
+def test_unknown_formats_are_rejected():
+    with pytest.raises(ValueError):
+        encode_embedding([1.0, 2.0], dtype=np.float64)
+
+    blob = bytearray(encode_embedding([1.0, 2.0]))
+    blob[:2] = b"XX"
+    assert not is_encoded_embedding(bytes(blob))
+    with pytest.raises(ValueError):
+        decode_embedding(bytes(blob))
+
+def test_legacy_json_column_is_migrated(knowledge_base_factory, tmp_path):
+    """Una base con embeddings JSON (user_version 0) los convierte a BLOB al abrirse"""
+    async def open_and_close():
+        async with knowledge_base_factory():
+            pass
+
+    asyncio.run(open_and_close())
+    connection = sqlite3.connect(tmp_path / "knowledge_base.db")
+    item_id = connection.execute("SELECT MIN(id) FROM knowledge_items").fetchone()[0]
+    connection.execute("UPDATE knowledge_items SET embedding = ? WHERE id = ?", (json.dumps([0.5, -0.25]), item_id))
+    connection.execute("PRAGMA user_version = 0")
+    connection.commit()
+
+    asyncio.run(open_and_close())
+    stored, kind = connection.execute(
+        "SELECT embedding, typeof(embedding) FROM knowledge_items WHERE id = ?", (item_id,)
+    ).fetchone()
+    connection.close()
+    assert kind == "blob"
+    assert decode_embedding(stored).tolist() == [0.5, -0.25]
@@ -0,0 +1,39 @@
+"""
+Pruebas del almacén de embeddings compartido entre workers
+"""
+
+import asyncio
+
+from app.embedding_backfill import EmbeddingBackfillWorker
+from tests.helpers import FakeEmbeddingService
+
+def test_single_backfill_owner_republishes_for_all_workers(knowledge_base_factory):
+    """Solo un worker codifica; los demás ven sus embeddings al volver a mapear el archivo"""
+    async def scenario():
+        service = FakeEmbeddingService()
+        env = {"EMBEDDING_STORE": "mmap", "EMBEDDING_STORE_REFRESH": 0}
+        async with knowledge_base_factory(service, **env) as first, \
+                knowledge_base_factory(service, **env) as second:
+            owner = EmbeddingBackfillWorker(first, service)
+            follower = EmbeddingBackfillWorker(second, service)
+
+            encoded = await owner.run_once()
+            assert encoded > 0
+            assert await follower.run_once() == 0
+            assert follower.get_progress()["owner"] is False
+
+            query = "política de vacaciones días"
+            expected = [doc["id"] for doc in await first.search_similar(query, top_k=3)]
+            assert [doc["id"] for doc in await second.search_similar(query, top_k=3)] == expected
+            assert len(second.vector_index) == len(first.vector_index) == encoded
+
+            await first.add_item("Estacionamiento", "Los lugares de estacionamiento se asignan por sorteo", "General")
+            assert await owner.run_once() == 1
+            results = await second.search_similar("estacionamiento sorteo", top_k=1)
+            assert results[0]["title"] == "Estacionamiento"
+
+        async with knowledge_base_factory(service, **env) as third:
+            # El dueño anterior cerró: otro worker toma el backfill
+            assert third.owns_embedding_backfill()
+
+    asyncio.run(scenario())
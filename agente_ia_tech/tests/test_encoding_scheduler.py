@@ -0,0 +1,69 @@
+import asyncio
+
+import numpy as np
+
+from app.encoding_scheduler import EncodingScheduler
+from tests.helpers import FakeEmbeddingService
+
+
+class SlowEmbeddingService(FakeEmbeddingService):
+    def __init__(self, delay: float = 0.05):
+        super().__init__()
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+        self.batches = []
+
+    async def encode_texts_async(self, texts):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        self.batches.append(list(texts))
+        try:
+            await asyncio.sleep(self.delay)
+            return list(self.encode_batch(texts))
+        finally:
+            self.active -= 1
+
+
+def run_concurrent(scheduler, texts):
+    async def scenario():
+        await scheduler.start()
+        try:
+            return await asyncio.gather(*(scheduler.encode(text) for text in texts))
+        finally:
+            await scheduler.stop()
+
+    return asyncio.run(scenario())
+
+
+def test_one_batch_in_flight_per_slot():
+    service = SlowEmbeddingService()
+    scheduler = EncodingScheduler(service, max_batch_size=4, max_wait_ms=1, max_concurrency=3)
+    texts = [f"consulta número {i}" for i in range(24)]
+
+    results = run_concurrent(scheduler, texts)
+
+    assert service.peak == 3
+    assert all(len(batch) <= 4 for batch in service.batches)
+    for text, vector in zip(texts, results):
+        np.testing.assert_allclose(vector, service.encode_text(text), rtol=1e-6)
+
+
+def test_single_slot_serializes_batches():
+    service = SlowEmbeddingService()
+    scheduler = EncodingScheduler(service, max_batch_size=4, max_wait_ms=1, max_concurrency=1)
+
+    run_concurrent(scheduler, [f"consulta {i}" for i in range(12)])
+
+    assert service.peak == 1
+
+
+def test_repeated_texts_in_a_batch_are_encoded_once():
+    service = SlowEmbeddingService(delay=0)
+    scheduler = EncodingScheduler(service, max_batch_size=8, max_wait_ms=20, max_concurrency=1)
+
+    results = run_concurrent(scheduler, ["hola mundo"] * 5 + ["adiós"])
+
+    assert service.batches == [["hola mundo", "adiós"]]
+    np.testing.assert_allclose(results[0], results[4])
+    assert scheduler.get_stats()["encoded"] == 6
@@ -0,0 +1,126 @@
+"""
+Pruebas de la base de conocimiento - Inicialización y listados
+"""
+
+import asyncio
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from app.database import utc_timestamp
+
+def count_items(connection):
+    return connection.execute("SELECT COUNT(*) FROM knowledge_items").fetchone()[0]
+
+async def updated_at(kb, item_id):
+    return await kb.db.read(
+        lambda connection: connection.execute(
+            "SELECT updated_at FROM knowledge_items WHERE id = ?", (item_id,)
+        ).fetchone()[0]
+    )
+
+def test_concurrent_first_start_seeds_once(knowledge_base_factory, tmp_path):
+    """Varios workers que siembran a la vez una base vacía insertan los datos una sola vez"""
+    async def scenario():
+        async with knowledge_base_factory() as kb:
+            seeded = await kb.db.read(count_items)
+            await kb.db.write(lambda connection: connection.execute("DELETE FROM knowledge_items"))
+        return kb, seeded
+
+    kb, seeded = asyncio.run(scenario())
+
+    barrier = threading.Barrier(6)
+    errors = []
+
+    def worker():
+        connection = sqlite3.connect(kb.db_path, timeout=10)
+        try:
+            barrier.wait()
+            kb._populate_initial_data(connection)
+            connection.commit()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    connection = sqlite3.connect(kb.db_path)
+    try:
+        assert count_items(connection) == seeded
+    finally:
+        connection.close()
+
+def test_keyset_pagination_visits_every_item_once(knowledge_base_factory):
+    """Recorrer el listado por cursor devuelve cada elemento una vez, de más a menos reciente"""
+    async def scenario():
+        async with knowledge_base_factory(DEDUP_POLICY="off") as kb:
+            for number in range(25):
+                await kb.add_item(f"Nota {number}", f"Contenido de la nota número {number}", "General")
+            total = await kb.db.read(count_items)
+
+            seen, cursor = [], None
+            while True:
+                items, cursor = await kb.list_items(limit=7, cursor=cursor, fields=["id", "updated_at"])
+                seen.extend(items)
+                if cursor is None:
+                    break
+
+            assert len(seen) == total
+            assert len({item["id"] for item in seen}) == total
+            keys = [(item["updated_at"], item["id"]) for item in seen]
+            assert keys == sorted(keys, reverse=True)
+
+    asyncio.run(scenario())
+
+def test_timestamps_are_stored_in_utc(knowledge_base_factory):
+    """Las escrituras desde Python y los valores por defecto usan el mismo formato UTC"""
+    async def scenario():
+        async with knowledge_base_factory() as kb:
+            before = utc_timestamp()
+            item_id = await kb.add_item("Horario", "El horario de atención es de nueve a cinco", "General")
+            stored = await updated_at(kb, item_id)
+            assert len(stored) == len(before) == 23
+            assert stored >= before
+
+            seeded = await kb.db.read(
+                lambda connection: connection.execute("SELECT MIN(updated_at) FROM knowledge_items").fetchone()[0]
+            )
+            assert len(seeded) == 23
+
+            await kb.db.write(lambda connection: connection.execute(
+                "UPDATE knowledge_items SET updated_at = '2020-01-01 00:00:00.000' WHERE id != ?", (item_id,)
+            ))
+            after = datetime.now(timezone(timedelta(hours=-5))) - timedelta(minutes=1)
+            items, _ = await kb.list_items(updated_after=after, fields=["id"])
+            assert [entry["id"] for entry in items] == [item_id]
+
+    asyncio.run(scenario())
+
+def test_legacy_local_timestamps_are_migrated(knowledge_base_factory, monkeypatch):
+    """Las marcas en hora local de versiones anteriores se convierten a UTC al migrar"""
+    monkeypatch.setenv("TZ", "Etc/GMT+5")
+    time.tzset()
+    try:
+        async def scenario():
+            async with knowledge_base_factory() as kb:
+                def downgrade(connection):
+                    connection.execute("UPDATE knowledge_items SET updated_at = '2026-01-01 10:00:00.500000' WHERE id = 1")
+                    connection.execute("UPDATE knowledge_items SET updated_at = '2026-01-01 12:00:00' WHERE id = 2")
+                    connection.execute("PRAGMA user_version = 3")
+                await kb.db.write(downgrade)
+
+            async with knowledge_base_factory() as kb:
+                assert await updated_at(kb, 1) == "2026-01-01 15:00:00.500"
+                assert await updated_at(kb, 2) == "2026-01-01 12:00:00.000"
+
+        asyncio.run(scenario())
+    finally:
+        monkeypatch.delenv("TZ")
+        time.tzset()
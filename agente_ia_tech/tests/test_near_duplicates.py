@@ -0,0 +1,92 @@
+"""
+Pruebas de las firmas MinHash, los buckets LSH y las políticas de casi duplicados
+"""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.near_duplicates import DuplicateItemError, MinHasher
+
+BASE = (
+    "Para solicitar el reembolso de gastos de viaje el empleado debe adjuntar la factura "
+    "original, el formulario firmado por su supervisor y el detalle de cada gasto realizado "
+    "durante el viaje dentro de los treinta días siguientes a su regreso"
+)
+
+def jaccard(first, second):
+    return len(first & second) / len(first | second)
+
+def test_signature_estimates_jaccard():
+    hasher = MinHasher(num_perm=256, bands=32)
+    edited = BASE.replace("treinta", "cuarenta").replace("supervisor", "gerente")
+    exact = jaccard(hasher.shingles(BASE), hasher.shingles(edited))
+
+    estimate = MinHasher.similarity(hasher.signature(BASE), hasher.signature(edited))
+
+    assert 0.3 < exact < 0.9
+    assert abs(estimate - exact) < 0.12
+
+def test_identical_text_ignores_case_and_accents():
+    hasher = MinHasher()
+    first = hasher.signature(BASE)
+    second = hasher.signature(BASE.upper().replace("dias", "días"))
+
+    assert MinHasher.similarity(first, second) == 1.0
+    assert hasher.band_keys(first) == hasher.band_keys(second)
+    assert np.array_equal(MinHasher.from_blob(MinHasher.to_blob(first)), first)
+
+def test_unrelated_text_shares_no_bucket():
+    hasher = MinHasher()
+    other = hasher.signature("La política de vestimenta permite ropa informal los viernes en todas las oficinas")
+    base = hasher.signature(BASE)
+
+    assert MinHasher.similarity(base, other) < 0.1
+    assert not set(hasher.band_keys(base)) & set(hasher.band_keys(other))
+
+def test_bands_must_divide_permutations():
+    with pytest.raises(ValueError):
+        MinHasher(num_perm=100, bands=16)
+
+def duplicate_links(connection):
+    return connection.execute("SELECT item_id, duplicate_of FROM item_duplicates ORDER BY item_id").fetchall()
+
+def test_policies_on_add(knowledge_base_factory):
+    async def scenario():
+        async with knowledge_base_factory(DEDUP_POLICY="reject") as kb:
+            original = await kb.add_item("Reembolsos", BASE, "finanzas")
+            with pytest.raises(DuplicateItemError) as error:
+                await kb.add_item("Reembolsos (copia)", BASE + " hábiles", "finanzas")
+            assert error.value.duplicate_of == original
+
+            kb.dedup_policy = "merge"
+            assert await kb.add_item("Reembolsos v2", BASE + " hábiles", "finanzas") == original
+
+            kb.dedup_policy = "link"
+            copy = await kb.add_item("Reembolsos (copia)", BASE + " corridos", "finanzas")
+            assert [tuple(row) for row in await kb.db.read(duplicate_links)] == [(copy, original)]
+
+    asyncio.run(scenario())
+
+def test_oversized_buckets_are_skipped(knowledge_base_factory):
+    """Los buckets con más de DEDUP_MAX_BUCKET_SIZE documentos no generan candidatos"""
+    async def scenario():
+        async with knowledge_base_factory(DEDUP_POLICY="link", DEDUP_MAX_BUCKET_SIZE=2) as kb:
+            ids = [await kb.add_item(f"Copia {i}", BASE, "finanzas") for i in range(4)]
+            # El cuarto encuentra buckets de 3 documentos (> 2) y no se enlaza
+            assert [tuple(row) for row in await kb.db.read(duplicate_links)] == [
+                (ids[1], ids[0]), (ids[2], ids[0])
+            ]
+
+            capped = await kb.deduplicate("link")
+            assert capped["duplicates"] == 0
+
+            kb.dedup_max_bucket_size = 1000
+            report = await kb.deduplicate("link")
+            assert report["groups"] == 1
+            assert {(pair["item_id"], pair["duplicate_of"]) for pair in report["pairs"]} == {
+                (ids[1], ids[0]), (ids[2], ids[0]), (ids[3], ids[0])
+            }
+
+    asyncio.run(scenario())
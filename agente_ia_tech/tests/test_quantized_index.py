@@ -0,0 +1,80 @@
+"""
+Pruebas del índice int8 frente a la búsqueda exacta
+"""
+
+import asyncio
+
+import numpy as np
+
+from app.quantized_index import QuantizedVectorIndex
+from tests.helpers import FakeEmbeddingService, unit_vectors
+
+def test_scores_match_brute_force():
+    """Las similitudes int8 se aproximan a las exactas y el orden se conserva"""
+    vectors = unit_vectors(500, dim=64, seed=3)
+    ids = np.arange(100, 600)
+    index = QuantizedVectorIndex()
+    index.build(ids, vectors)
+
+    for query in unit_vectors(20, dim=64, seed=4):
+        exact = vectors @ query
+        results = index.search(query, top_k=10)
+        for doc_id, score in results:
+            assert abs(score - exact[doc_id - 100]) < 0.02
+        expected = set((ids[np.argsort(-exact)[:10]]).tolist())
+        assert len(expected & {doc_id for doc_id, _ in results}) >= 8
+
+    assert index.memory_bytes() == 500 * 64
+
+def test_add_replace_and_remove():
+    vectors = unit_vectors(50, dim=32, seed=5)
+    index = QuantizedVectorIndex()
+    index.build(range(50), vectors)
+
+    index.remove([0, 10, 49, 999])
+    assert len(index) == 47
+    assert {doc_id for doc_id, _ in index.search(vectors[10], top_k=47)} == set(range(50)) - {0, 10, 49}
+
+    index.add([10, 7], vectors[[20, 21]])
+    assert len(index) == 48
+    assert index.search(vectors[20], top_k=2)[1][0] in (10, 20)
+    assert index.search(vectors[21], top_k=1, candidate_ids=np.array([7, 3]))[0][0] == 7
+
+def test_clipped_additions_request_a_refit():
+    """Vectores fuera del rango del primer ajuste se cuentan y piden reconstruir"""
+    narrow = np.tile(unit_vectors(1, dim=32, seed=6), (20, 1)) + unit_vectors(20, dim=32, seed=7) * 0.01
+    index = QuantizedVectorIndex(clip_tolerance=0.05)
+    index.add(range(20), narrow)
+    index.add([20], narrow[:1])
+    assert not index.needs_refit()
+
+    wide = unit_vectors(30, dim=32, seed=8)
+    index.add(range(100, 130), wide)
+    assert index.clipped_fraction() > 0.5
+    assert index.needs_refit()
+
+    index.build(list(range(20)) + list(range(100, 130)), np.vstack([narrow, wide]))
+    assert index.clipped_fraction() == 0 and not index.needs_refit()
+    for doc_id, vector in zip(range(100, 130), wide):
+        assert index.search(vector, top_k=1)[0][0] == doc_id
+
+def test_knowledge_base_rebuilds_clipped_int8_index(knowledge_base_factory):
+    """Tras un primer ajuste con un solo vector, los siguientes saturan y la base reconstruye el índice"""
+    async def scenario():
+        async with knowledge_base_factory(FakeEmbeddingService(), VECTOR_INDEX="int8") as kb:
+            for i in range(12):
+                await kb.add_item(f"Documento {i}", f"Contenido número {i} sobre el tema {i * 7}", "general")
+            pending = await kb.get_passages_needing_embeddings("modelo", 1000)
+            ids = [passage["id"] for passage in pending]
+            assert len(ids) >= 12
+            vectors = unit_vectors(len(ids), dim=64, seed=9)
+
+            await kb.update_passage_embeddings(ids[:1], vectors[:1], "modelo")
+            await kb.update_passage_embeddings(ids[1:], vectors[1:], "modelo")
+
+            assert len(kb.vector_index) == len(ids)
+            assert kb.vector_index.clipped_fraction() == 0
+            for passage_id, vector in zip(ids, vectors):
+                assert kb.vector_index.search(vector, top_k=1)[0][0] == passage_id
+
+    asyncio.run(scenario())
@@ -0,0 +1,70 @@
+import asyncio
+
+from app.query_logger import QueryHistoryLogger
+
+
+class RecordingKnowledgeBase:
+    def __init__(self):
+        self.batches = []
+
+    async def log_queries(self, batch):
+        self.batches.append(list(batch))
+
+
+def log_many(logger, count):
+    for i in range(count):
+        logger.log(f"pregunta {i}", "respuesta", 0.5, [], "general")
+
+
+def test_queries_are_written_in_full_batches():
+    kb = RecordingKnowledgeBase()
+
+    async def scenario():
+        logger = QueryHistoryLogger(kb, batch_size=10, flush_interval=5.0)
+        await logger.start()
+        log_many(logger, 25)
+        # Dos lotes llenos salen sin esperar al plazo; el resto, al detener
+        for _ in range(50):
+            if len(kb.batches) >= 2:
+                break
+            await asyncio.sleep(0.01)
+        assert [len(batch) for batch in kb.batches] == [10, 10]
+        await logger.stop()
+        return logger.get_stats()
+
+    stats = asyncio.run(scenario())
+    assert [len(batch) for batch in kb.batches] == [10, 10, 5]
+    assert [record["question"] for batch in kb.batches for record in batch] == [
+        f"pregunta {i}" for i in range(25)
+    ]
+    assert stats["written"] == 25 and stats["batches"] == 3 and stats["pending"] == 0
+
+
+def test_partial_batch_is_written_after_the_flush_interval():
+    kb = RecordingKnowledgeBase()
+
+    async def scenario():
+        logger = QueryHistoryLogger(kb, batch_size=100, flush_interval=0.05)
+        await logger.start()
+        log_many(logger, 3)
+        await asyncio.sleep(0.3)
+        written = [len(batch) for batch in kb.batches]
+        await logger.stop()
+        return written
+
+    assert asyncio.run(scenario()) == [3]
+
+
+def test_full_queue_drops_queries():
+    kb = RecordingKnowledgeBase()
+
+    async def scenario():
+        logger = QueryHistoryLogger(kb, batch_size=10, max_queue=4)
+        log_many(logger, 6)
+        stats = logger.get_stats()
+        await logger.stop()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert stats["queued"] == 4 and stats["dropped"] == 2
+    assert sum(len(batch) for batch in kb.batches) == 4
@@ -0,0 +1,49 @@
+"""
+Pruebas de la fusión de rankings léxicos y semánticos
+"""
+
+import pytest
+
+from app.rank_fusion import reciprocal_rank_fusion, weighted_score_fusion
+
+def test_rrf_sums_reciprocal_ranks():
+    lexical = [(1, 12.0), (2, 8.0), (3, 1.0)]
+    semantic = [(3, 0.9), (1, 0.8), (4, 0.1)]
+
+    fused = dict(reciprocal_rank_fusion([lexical, semantic], k=60))
+
+    assert fused[1] == pytest.approx(1 / 61 + 1 / 62)
+    assert fused[3] == pytest.approx(1 / 63 + 1 / 61)
+    assert fused[2] == pytest.approx(1 / 62)
+    assert fused[4] == pytest.approx(1 / 63)
+
+def test_rrf_ignores_score_scale_and_orders_results():
+    # Los scores de una fuente no influyen: solo la posición
+    first = reciprocal_rank_fusion([[(1, 1000.0), (2, 999.0)], [(2, 0.2), (1, 0.1)]])
+    second = reciprocal_rank_fusion([[(1, 1.0), (2, 0.0)], [(2, 5.0), (1, -5.0)]])
+    assert first == second
+
+    fused = reciprocal_rank_fusion([[(7, 1.0), (8, 0.5)], [(7, 1.0)], []])
+    assert [doc_id for doc_id, _ in fused] == [7, 8]
+    assert reciprocal_rank_fusion([]) == []
+
+def test_weighted_fusion_normalizes_each_source():
+    lexical = [(1, 20.0), (2, 10.0), (3, 0.0)]
+    semantic = [(2, 0.9), (3, 0.5), (4, 0.1)]
+
+    fused = dict(weighted_score_fusion([lexical, semantic], [0.3, 0.7]))
+
+    assert fused[1] == pytest.approx(0.3 * 1.0)
+    assert fused[2] == pytest.approx(0.3 * 0.5 + 0.7 * 1.0)
+    assert fused[3] == pytest.approx(0.3 * 0.0 + 0.7 * 0.5)
+    assert fused[4] == pytest.approx(0.0)
+    ranked = weighted_score_fusion([lexical, semantic], [0.3, 0.7])
+    assert [doc_id for doc_id, _ in ranked] == [2, 3, 1, 4]
+
+def test_weighted_fusion_edge_cases():
+    # Scores iguales en una fuente valen 1; una fuente vacía no aporta
+    fused = dict(weighted_score_fusion([[(1, 3.0), (2, 3.0)], []], [0.5, 0.5]))
+    assert fused == {1: 0.5, 2: 0.5}
+
+    with pytest.raises(ValueError):
+        weighted_score_fusion([[(1, 1.0)]], [0.5, 0.5])
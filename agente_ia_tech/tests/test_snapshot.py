@@ -0,0 +1,92 @@
+"""
+Pruebas del snapshot de un solo archivo: formato y exportación/restauración
+"""
+
+import asyncio
+
+import numpy as np
+
+from app.knowledge_base import KnowledgeBase
+from app.snapshot import SnapshotFile
+from tests.helpers import FakeEmbeddingService, unit_vectors
+
+def test_sections_round_trip(tmp_path):
+    source = tmp_path / "modelo.pkl"
+    source.write_bytes(b"clasificador" * 1000)
+    matrix = unit_vectors(7, dim=5)
+    path = str(tmp_path / "kb.snap")
+
+    SnapshotFile(path).write({"fingerprint": "abc"}, {
+        "raw": b"hola",
+        "ids": np.arange(7, dtype=np.int64),
+        "embeddings": matrix,
+        "classifier": str(source),
+        "empty": np.zeros((0, 0), dtype=np.float32),
+    })
+
+    snapshot = SnapshotFile(path)
+    manifest = snapshot.manifest()
+    assert manifest["fingerprint"] == "abc"
+    assert all(entry["offset"] % 64 == 0 for entry in manifest["sections"].values())
+    assert snapshot.has("embeddings") and not snapshot.has("vector_index")
+
+    mapped = snapshot.array("embeddings")
+    assert isinstance(mapped, np.memmap) and not mapped.flags.writeable
+    np.testing.assert_array_equal(mapped, matrix)
+    assert snapshot.array("ids").tolist() == list(range(7))
+    assert snapshot.array("empty").shape == (0, 0)
+
+    snapshot.extract("classifier", str(tmp_path / "restaurado" / "modelo.pkl"))
+    assert (tmp_path / "restaurado" / "modelo.pkl").read_bytes() == source.read_bytes()
+
+def test_invalid_file_has_no_manifest(tmp_path):
+    (tmp_path / "otro.snap").write_bytes(b"no es un snapshot" * 10)
+    assert SnapshotFile(str(tmp_path / "otro.snap")).manifest() is None
+    assert SnapshotFile(str(tmp_path / "falta.snap")).manifest() is None
+
+def count_items(connection):
+    return connection.execute("SELECT COUNT(*) FROM knowledge_items").fetchone()[0]
+
+def test_export_and_restore_knowledge_base(knowledge_base_factory, tmp_path, monkeypatch):
+    """Una base restaurada desde el snapshot responde igual sin recalcular embeddings"""
+    service = FakeEmbeddingService()
+    path = str(tmp_path / "kb.snap")
+    classifier = tmp_path / "classifier.pkl"
+    classifier.write_bytes(b"modelo")
+    query = service.encode_text("reembolso de viajes")
+
+    async def export():
+        async with knowledge_base_factory(service) as kb:
+            await kb.add_item("Reembolsos", "El reembolso de viajes requiere la factura original", "finanzas")
+            pending = await kb.get_passages_needing_embeddings(service.model_name, 1000)
+            ids = [passage["id"] for passage in pending]
+            await kb.update_passage_embeddings(ids, service.encode_batch([p["text"] for p in pending]),
+                                               service.model_name)
+            manifest = await kb.export_snapshot(path, {"classifier": str(classifier)})
+            return manifest, kb.vector_index.search(query, top_k=5), await kb.db.read(count_items)
+
+    manifest, expected_hits, expected_items = asyncio.run(export())
+    assert manifest["passages"] > 0 and manifest["dimension"] == service.dim
+
+    restored_path = tmp_path / "restaurada" / "knowledge_base.db"
+    restored_path.parent.mkdir()
+    monkeypatch.setenv("DATABASE_PATH", str(restored_path))
+    restored_classifier = tmp_path / "restaurada" / "classifier.pkl"
+
+    async def restore():
+        kb = KnowledgeBase(embedding_service=service)
+        assert kb.restore_snapshot(path, {"classifier": str(restored_classifier)})
+        await kb.initialize()
+        try:
+            # Índice flat: la matriz del snapshot se usa mapeada, sin decodificar la base
+            assert isinstance(kb.vector_index._base_matrix, np.memmap)
+            return kb.vector_index.search(query, top_k=5), await kb.db.read(count_items), len(kb.vector_index)
+        finally:
+            await kb.close()
+
+    hits, items, indexed = asyncio.run(restore())
+    assert indexed == manifest["passages"]
+    assert [doc_id for doc_id, _ in hits] == [doc_id for doc_id, _ in expected_hits]
+    np.testing.assert_allclose([s for _, s in hits], [s for _, s in expected_hits], rtol=1e-5)
+    assert items == expected_items
+    assert restored_classifier.read_bytes() == b"modelo"
@@ -0,0 +1,84 @@
+"""
+Pruebas del índice de dos etapas (prefiltro PCA) frente a la búsqueda exacta
+"""
+
+import numpy as np
+
+from app.two_stage_index import TwoStageIndex
+from tests.helpers import unit_vectors
+
+def low_rank_vectors(count, subspace, sample, dim=64, rank=12, noise=0.02):
+    """Vectores normalizados concentrados en el subespacio `subspace` de `rank` dimensiones"""
+    basis = np.linalg.qr(np.random.default_rng(subspace).standard_normal((dim, rank)))[0].T
+    rng = np.random.default_rng(sample)
+    vectors = rng.standard_normal((count, rank)) @ basis + noise * rng.standard_normal((count, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+def brute_force(vectors, ids, query, top_k):
+    scores = vectors @ (query / np.linalg.norm(query))
+    order = np.argsort(-scores)[:top_k]
+    return [(int(ids[i]), float(scores[i])) for i in order]
+
+def test_prefilter_keeps_the_exact_top_k():
+    vectors = low_rank_vectors(2000, subspace=1, sample=1)
+    ids = np.arange(1, 2001)
+    index = TwoStageIndex(components=12, candidates=100)
+    index.build(ids, vectors)
+
+    for query in low_rank_vectors(20, subspace=1, sample=2):
+        expected = brute_force(vectors, ids, query, 10)
+        results = index.search(query, top_k=10)
+        assert [doc_id for doc_id, _ in results] == [doc_id for doc_id, _ in expected]
+        # La segunda etapa devuelve la similitud exacta
+        np.testing.assert_allclose([s for _, s in results], [s for _, s in expected], rtol=1e-5)
+
+def test_add_remove_and_candidates_match_brute_force():
+    vectors = unit_vectors(200, dim=32, seed=2)
+    index = TwoStageIndex(components=8, candidates=500)
+    index.add(range(100), vectors[:100])
+    index.add(range(100, 200), vectors[100:])
+    index.add([3], vectors[[150]])
+    index.remove([0, 199, 777])
+    assert len(index) == 198
+
+    current = {doc_id: vectors[doc_id] for doc_id in range(1, 199)}
+    current[3] = vectors[150]
+    ids = np.array(sorted(current))
+    matrix = np.stack([current[doc_id] for doc_id in ids])
+    for query in unit_vectors(5, dim=32, seed=3):
+        assert [d for d, _ in index.search(query, top_k=15)] == [d for d, _ in brute_force(matrix, ids, query, 15)]
+
+    hits = index.search(vectors[150], top_k=5, candidate_ids=np.array([3, 150, 8, 0]))
+    assert [doc_id for doc_id, _ in hits][:2] in ([3, 150], [150, 3])
+    assert {doc_id for doc_id, _ in hits} == {3, 150, 8}
+
+def test_drift_and_growth_request_a_refit():
+    index = TwoStageIndex(components=12, candidates=50, drift_tolerance=0.05, refit_ratio=0.5)
+    index.build(range(400), low_rank_vectors(400, subspace=4, sample=1))
+    index.add(range(400, 450), low_rank_vectors(50, subspace=4, sample=2))
+    assert not index.needs_refit()
+
+    # Otro subespacio: la proyección captura poca varianza de los nuevos
+    index.add(range(1000, 1064), low_rank_vectors(64, subspace=5, sample=3))
+    assert index.needs_refit()
+    index.refit()
+    assert not index.needs_refit()
+
+    grown = TwoStageIndex(components=12, refit_ratio=0.5)
+    grown.build(range(100), low_rank_vectors(100, subspace=6, sample=1))
+    grown.add(range(100, 151), low_rank_vectors(51, subspace=6, sample=2))
+    assert grown.needs_refit()
+
+def test_save_and_load_round_trip(tmp_path):
+    vectors = low_rank_vectors(300, subspace=7, sample=1)
+    index = TwoStageIndex(components=12, candidates=40)
+    index.build(range(300), vectors)
+    path = str(tmp_path / "index.npz")
+    index.save(path, fingerprint="abc")
+
+    assert not TwoStageIndex().load(path, fingerprint="otra")
+    loaded = TwoStageIndex(components=12, candidates=40)
+    assert loaded.load(path, fingerprint="abc")
+    assert len(loaded) == 300
+    for query in vectors[:5]:
+        assert loaded.search(query, top_k=5) == index.search(query, top_k=5)
@@ -0,0 +1,61 @@
+"""
+Pruebas del índice vectorial exacto (flat) frente a la búsqueda por fuerza bruta
+"""
+
+import numpy as np
+import pytest
+
+from app.vector_index import VectorIndex
+from tests.helpers import unit_vectors
+
+def brute_force(vectors, ids, query, top_k):
+    scores = vectors @ (query / np.linalg.norm(query))
+    order = np.argsort(-scores)[:top_k]
+    return [(int(ids[i]), float(scores[i])) for i in order]
+
+def assert_same_hits(actual, expected):
+    assert [doc_id for doc_id, _ in actual] == [doc_id for doc_id, _ in expected]
+    np.testing.assert_allclose([s for _, s in actual], [s for _, s in expected], rtol=1e-5, atol=1e-6)
+
+def test_search_matches_brute_force():
+    vectors = unit_vectors(300, dim=48, seed=11)
+    ids = np.arange(1000, 1300)
+    index = VectorIndex()
+    # Sin normalizar: el índice normaliza al construir y al consultar
+    index.build(ids, vectors * 3.0)
+
+    for query in unit_vectors(10, dim=48, seed=12) * 2.0:
+        assert_same_hits(index.search(query, top_k=7), brute_force(vectors, ids, query, 7))
+
+def test_add_replace_remove_and_candidates():
+    vectors = unit_vectors(120, dim=16, seed=13)
+    index = VectorIndex(initial_capacity=4)
+    for start in range(0, 100, 10):
+        index.add(range(start, start + 10), vectors[start:start + 10])
+    assert len(index) == 100
+
+    # Reemplazar conserva el tamaño; eliminar intercambia con la última fila
+    index.add([5], vectors[[100]])
+    index.remove([0, 99, 12345])
+    assert len(index) == 98
+
+    current = {doc_id: vectors[doc_id] for doc_id in range(1, 99)}
+    current[5] = vectors[100]
+    ids = np.array(sorted(current))
+    matrix = np.stack([current[doc_id] for doc_id in ids])
+    for query in unit_vectors(5, dim=16, seed=14):
+        assert_same_hits(index.search(query, top_k=98), brute_force(matrix, ids, query, 98))
+
+    candidates = np.array([3, 5, 7, 0, 500])
+    hits = index.search(vectors[100], top_k=10, candidate_ids=candidates)
+    assert [doc_id for doc_id, _ in hits][0] == 5
+    assert {doc_id for doc_id, _ in hits} == {3, 5, 7}
+
+def test_dimension_mismatch_is_rejected():
+    index = VectorIndex()
+    index.build([1, 2], unit_vectors(2, dim=8))
+    with pytest.raises(ValueError):
+        index.add([3], unit_vectors(1, dim=4))
+    with pytest.raises(ValueError):
+        index.search(unit_vectors(1, dim=4)[0])
+    assert index.search(unit_vectors(1, dim=8)[0], top_k=0) == []